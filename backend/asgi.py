@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Serve the hot public reads with the async views; e.g.
+#   uvicorn backend.asgi:application --workers 4
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,17 @@
+"""
+Root URLconf for the ASGI deployment: backend/urls.py with the hot public
+reads served by blog/async_views.py.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+from django.conf import settings
+from django.conf.urls.static import static
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('api/', include('blog.async_urls')),
+]
+
+if settings.DEBUG:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
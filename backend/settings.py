@@ -84,6 +84,12 @@ MIDDLEWARE = [
 ROOT_URLCONF = "backend.urls"
 WSGI_APPLICATION = "backend.wsgi.application"
 
+# Set by backend/asgi.py: under an ASGI server the hot public reads are served
+# by async views (blog/async_views.py).
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "False") == "True"
+if ASYNC_READ_VIEWS:
+    ROOT_URLCONF = "backend.asgi_urls"
+
 
 # =====================================================
 # TEMPLATES
@@ -131,6 +137,42 @@ else:
         }
     }
 
+# Read replicas, comma-separated, e.g. "postgresql://...,postgresql://...".
+# Locally two SQLite files work: copy db.sqlite3 and set
+# DATABASE_REPLICA_URLS=sqlite:////absolute/path/replica.sqlite3
+# GETs of the blog viewsets read from a replica (blog/db_router.py); a client
+# that wrote reads from the primary for REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.environ.get("DATABASE_REPLICA_URLS", "").split(","))):
+    alias = f"replica_{index}"
+    DATABASES[alias] = dj_database_url.parse(url.strip(), conn_max_age=600, conn_health_checks=True)
+    DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+    DATABASE_REPLICAS.append(alias)
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "10"))
+
+# DATABASE_POOL=True replaces the persistent connections above with a psycopg 3
+# connection pool per process and Postgres alias (needs psycopg[pool]); keep
+# max size x processes under the server's max_connections.
+DATABASE_POOL = os.environ.get("DATABASE_POOL", "False") == "True"
+DATABASE_POOL_OPTIONS = {
+    "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+    "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10")),
+    # Seconds a request waits for a free connection before failing
+    "timeout": float(os.environ.get("DATABASE_POOL_TIMEOUT", "10")),
+    "max_idle": float(os.environ.get("DATABASE_POOL_MAX_IDLE", "300")),
+    "max_lifetime": float(os.environ.get("DATABASE_POOL_MAX_LIFETIME", "3600")),
+}
+if DATABASE_POOL:
+    for config in DATABASES.values():
+        if config["ENGINE"] == "django.db.backends.postgresql":
+            config["CONN_MAX_AGE"] = 0  # required by the pool
+            config["CONN_HEALTH_CHECKS"] = False  # the pool checks connections itself
+            config.setdefault("OPTIONS", {})["pool"] = dict(DATABASE_POOL_OPTIONS)
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ["blog.db_router.ReplicaRouter"]
+    MIDDLEWARE.append("blog.middleware.ReplicaPinMiddleware")
+
 
 # =====================================================
 # I18N
@@ -166,6 +208,14 @@ DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
 MEDIA_URL = '/media/'
 
+# Image uploads are staged here and stored (with resized WebP variants) by the
+# upload worker: a thread in each web process, or, with
+# UPLOAD_WORKER_THREAD=False, `manage.py process_uploads --loop`.
+UPLOAD_STAGING_ROOT = os.environ.get("UPLOAD_STAGING_ROOT", str(BASE_DIR / "staging"))
+UPLOAD_WORKER_THREAD = os.environ.get("UPLOAD_WORKER_THREAD", "True") == "True"
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_QUALITY = int(os.environ.get("IMAGE_VARIANT_QUALITY", "80"))
+
 
 # =====================================================
 # REST
@@ -173,12 +223,98 @@ MEDIA_URL = '/media/'
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "blog.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
+    # JSONRenderer's output, encoded by orjson
+    "DEFAULT_RENDERER_CLASSES": (
+        "blog.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    # Client address for the throttles: the entry this many proxies from the
+    # end of X-Forwarded-For, or REMOTE_ADDR with 0. Unset, DRF would trust
+    # the whole client-supplied header. Render runs one proxy in front.
+    "NUM_PROXIES": int(os.environ.get("NUM_PROXIES", "1" if os.environ.get("RENDER") else "0")),
 }
 
+# Post and comment lists are serialized from .values() rows instead of model
+# instances (blog/fast_serializers.py); the output is the same.
+FAST_LIST_SERIALIZERS = os.environ.get("FAST_LIST_SERIALIZERS", "True") == "True"
+
+
+# =====================================================
+# CACHE
+# =====================================================
+
+# Local memory per process by default; set REDIS_URL to share it between workers.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "devscribe",
+        }
+    }
+
+# Authenticated requests take the user and profile role from the cache (see
+# blog/authentication.py); changes to them are picked up at once in this
+# process (and everywhere with REDIS_URL), elsewhere within this many seconds.
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get("AUTH_USER_CACHE_TIMEOUT", "60"))
+
+# Public read endpoints (posts, categories) are cached per user and query
+# string; writes invalidate through generation counters. Those counters live
+# in the cache, so with the per-process one other workers would keep serving
+# stale responses after a write: on by default with Redis only.
+RESPONSE_CACHE_ENABLED = os.environ.get(
+    "RESPONSE_CACHE_ENABLED", "True" if os.environ.get("REDIS_URL") else "False"
+) == "True"
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get("RESPONSE_CACHE_TIMEOUT", "60"))
+# ETag / Last-Modified on those endpoints come from the same counters, so
+# without a shared cache another worker would keep answering 304 with the
+# client's stale copy: also on by default with Redis only.
+CONDITIONAL_GET_ENABLED = os.environ.get(
+    "CONDITIONAL_GET_ENABLED", "True" if os.environ.get("REDIS_URL") else "False"
+) == "True"
+
+
+# =====================================================
+# VIEW COUNTS
+# =====================================================
+
+# Post views are buffered and written in batches. Set VIEW_COUNT_BACKEND to
+# "blog.view_counts.CacheViewCountBackend" to share the buffer through the cache.
+VIEW_COUNT_BACKEND = os.environ.get("VIEW_COUNT_BACKEND") or None
+VIEW_COUNT_FLUSH_INTERVAL = float(os.environ.get("VIEW_COUNT_FLUSH_INTERVAL", "10"))
+
+# Keeps views buffered during a test out of later tests and of db.sqlite3
+TEST_RUNNER = "blog.test_runner.TestRunner"
+
+
+# =====================================================
+# METRICS
+# =====================================================
+
+# Per-endpoint latency and query histograms, served at /api/metrics/ in the
+# Prometheus text format. "False" leaves the middleware out entirely.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+# /api/metrics/ requires "Authorization: Bearer <METRICS_TOKEN>"; without a
+# token it is served with DEBUG only, and 404s otherwise.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+# Log queries slower than this to the "blog.slow_queries" logger (off when
+# unset), with the calling stack for a sample of them.
+SLOW_QUERY_LOG_MS = float(os.environ["SLOW_QUERY_LOG_MS"]) if os.environ.get("SLOW_QUERY_LOG_MS") else None
+SLOW_QUERY_STACK_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_STACK_SAMPLE_RATE", "0.1"))
+
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "blog.middleware.RequestMetricsMiddleware")
+
 
 # =====================================================
 # JWT
@@ -191,6 +327,37 @@ SIMPLE_JWT = {
     "BLACKLIST_AFTER_ROTATION": True,
     "UPDATE_LAST_LOGIN": True,
     "AUTH_HEADER_TYPES": ("Bearer",),
+    "TOKEN_REFRESH_SERIALIZER": "blog.token_blacklist.IndexedTokenRefreshSerializer",
+}
+
+# Refresh token blacklist checks from an in-process set of blacklisted jtis
+# instead of a query per check (blog/token_blacklist.py). Needs a cache shared
+# by every process to learn about new entries, so on by default with Redis only.
+JWT_BLACKLIST_INDEX = os.environ.get(
+    "JWT_BLACKLIST_INDEX", "True" if os.environ.get("REDIS_URL") else "False"
+) == "True"
+# Reload the set this often, dropping tokens that have expired since
+JWT_BLACKLIST_REBUILD_SECONDS = int(os.environ.get("JWT_BLACKLIST_REBUILD_SECONDS", "3600"))
+# Expired tokens stay in the token_blacklist tables until
+# `manage.py prune_tokens` (e.g. daily from cron) deletes them.
+
+
+# =====================================================
+# THROTTLING
+# =====================================================
+
+# Token buckets for login, register and anonymous comments (blog/throttling.py),
+# checked before any password hashing or write. "n/period" allows bursts of n
+# and refills n per second, minute, hour or day. The buckets are per process;
+# set THROTTLE_BACKEND to "blog.throttling.CacheBucketBackend" to share them
+# through the cache (with REDIS_URL).
+THROTTLE_ENABLED = os.environ.get("THROTTLE_ENABLED", "True") == "True"
+THROTTLE_BACKEND = os.environ.get("THROTTLE_BACKEND") or None
+THROTTLE_RATES = {
+    "login-ip": os.environ.get("THROTTLE_LOGIN_IP", "20/min"),
+    "login-username": os.environ.get("THROTTLE_LOGIN_USERNAME", "5/min"),
+    "register-ip": os.environ.get("THROTTLE_REGISTER_IP", "10/hour"),
+    "comment-anon-ip": os.environ.get("THROTTLE_COMMENT_ANON_IP", "5/min"),
 }
 
 
@@ -6,6 +6,7 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'role', 'total_posts', 'total_views', 'created_at']
     list_filter = ['role', 'created_at']
     search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     name = 'blog'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import authentication, response_cache, trending  # noqa: F401 (connect signal receivers)
+        from .metrics import install_query_recorder
+        from .search import install_search_index
+        post_migrate.connect(install_search_index, sender=self)
+        if getattr(settings, 'METRICS_ENABLED', False):
+            connection_created.connect(install_query_recorder)
@@ -0,0 +1,254 @@
+"""
+Streaming export and import of blog content as NDJSON: a header line, then
+one JSON object per user (with the profile), category, post and comment, in
+that order. References are by natural key (username, category slug, post
+slug), so an archive can be imported next to existing content.
+
+Both directions hold at most one batch of rows in memory: the export reads
+with ``iterator()``, the import bulk-creates each batch of lines and looks
+up the rows it references with one query per batch. No model signals run;
+``import_blog`` refreshes the author stats and the response cache once at
+the end.
+"""
+import gzip
+import sys
+from collections import Counter
+from itertools import groupby, islice
+
+import orjson
+from django.contrib.auth.models import User
+
+from . import content as post_content
+from .corpus import explicit_timestamps
+from .models import Category, Comment, Post, UserProfile
+
+FORMAT = 'devscribe-blog'
+VERSION = 1
+
+PROFILE_FIELDS = ('role', 'bio', 'avatar', 'avatar_variants', 'website', 'location')
+# Record key -> .values() column, per record type, in export order
+USER_COLUMNS = {
+    **{name: name for name in (
+        'username', 'email', 'first_name', 'last_name', 'password', 'is_active', 'date_joined', 'last_login',
+    )},
+    **{name: f'profile__{name}' for name in PROFILE_FIELDS},
+}
+CATEGORY_COLUMNS = {name: name for name in ('name', 'slug', 'description', 'created_at')}
+POST_COLUMNS = {
+    'slug': 'slug',
+    'author': 'author__username',
+    'category': 'category__slug',
+    **{name: name for name in (
+        'title', 'content', 'excerpt', 'image', 'image_variants', 'created_at', 'updated_at',
+        'published', 'featured', 'views', *post_content.DERIVED_FIELDS,
+    )},
+}
+COMMENT_COLUMNS = {
+    'post': 'post__slug',
+    'user': 'user__username',
+    **{name: name for name in ('name', 'email', 'content', 'created_at', 'approved')},
+}
+SOURCES = (
+    ('user', User, USER_COLUMNS),
+    ('category', Category, CATEGORY_COLUMNS),
+    ('post', Post, POST_COLUMNS),
+    ('comment', Comment, COMMENT_COLUMNS),
+)
+SLUG_LENGTH = Post._meta.get_field('slug').max_length
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def describe(counts):
+    """'3 users, 1 category, ...' for a Counter of record types"""
+    return ', '.join(
+        f'{count} {name if count == 1 else name[:-1] + "ies" if name.endswith("y") else name + "s"}'
+        for name, count in counts.items() if count
+    )
+
+
+def open_archive(path, mode):
+    """``path`` for binary reading or writing, gzipped if it ends in .gz; '-' is stdin/stdout."""
+    if path == '-':
+        return open((sys.stdin if mode == 'r' else sys.stdout).fileno(), f'{mode}b', closefd=False)
+    if path.endswith('.gz'):
+        # gzip(1)'s default level: twice as fast as 9, under 1% larger
+        return gzip.open(path, f'{mode}b', compresslevel=6)
+    return open(path, f'{mode}b')
+
+
+def export_records(chunk_size=2000):
+    yield {'type': 'header', 'format': FORMAT, 'version': VERSION}
+    for record_type, model, columns in SOURCES:
+        rows = model.objects.order_by('pk').values(*columns.values()).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'type': record_type}
+            record.update((key, row[column]) for key, column in columns.items())
+            yield record
+
+
+def write_ndjson(records, file):
+    counts = Counter()
+    for record in records:
+        file.write(orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE))
+        counts[record['type']] += 1
+    del counts['header']
+    return counts
+
+
+def read_ndjson(file):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            raise ArchiveError(f'Line {number}: {e}')
+
+
+class Importer:
+    """
+    Creates the records of an archive in batches of ``batch_size``. Existing
+    users and categories with the same username / slug are reused; a post
+    whose slug is taken gets the first free ``<slug>-<n>``, and its comments
+    follow it there.
+    """
+
+    def __init__(self, batch_size=2000, log=None):
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.counts = Counter()
+        # Exported slug -> the slug it was imported under, for renamed posts only
+        self.renamed = {}
+
+    def run(self, records):
+        records = iter(records)
+        header = next(records, None)
+        if not header or header.get('type') != 'header' or header.get('format') != FORMAT:
+            raise ArchiveError(f'Not a {FORMAT} archive')
+        if header.get('version', 0) > VERSION:
+            raise ArchiveError(f'Archive version {header["version"]} is newer than this importer ({VERSION})')
+        handlers = {
+            'user': self.import_users,
+            'category': self.import_categories,
+            'post': self.import_posts,
+            'comment': self.import_comments,
+        }
+        for record_type, group in groupby(records, key=lambda record: record.get('type')):
+            handler = handlers.get(record_type)
+            if handler is None:
+                raise ArchiveError(f'Unknown record type: {record_type!r}')
+            while batch := list(islice(group, self.batch_size)):
+                handler(batch)
+                self.log(f'{record_type}: {self.counts[record_type]} imported')
+        return self.counts
+
+    def import_users(self, batch):
+        existing = set(
+            User.objects.filter(username__in=[record['username'] for record in batch])
+            .values_list('username', flat=True)
+        )
+        records = [record for record in batch if record['username'] not in existing]
+        self.counts['existing user'] += len(batch) - len(records)
+        users = User.objects.bulk_create([
+            User(**{name: record[name] for name in USER_COLUMNS if name not in PROFILE_FIELDS})
+            for record in records
+        ])
+        # What the create_user_profile signal would have done
+        UserProfile.objects.bulk_create([
+            UserProfile(
+                user_id=user.pk,
+                **{name: record[name] for name in PROFILE_FIELDS if record[name] is not None},
+            )
+            for user, record in zip(users, records)
+        ])
+        self.counts['user'] += len(users)
+
+    def import_categories(self, batch):
+        existing = set(
+            Category.objects.filter(slug__in=[record['slug'] for record in batch]).order_by().values_list('slug', flat=True)
+        )
+        records = [record for record in batch if record['slug'] not in existing]
+        self.counts['existing category'] += len(batch) - len(records)
+        with explicit_timestamps(Category._meta.get_field('created_at')):
+            created = Category.objects.bulk_create([
+                Category(**{name: record[name] for name in CATEGORY_COLUMNS}) for record in records
+            ])
+        self.counts['category'] += len(created)
+
+    def import_posts(self, batch):
+        authors = self.lookup(User, 'username', [record['author'] for record in batch])
+        categories = self.lookup(Category, 'slug', [record['category'] for record in batch if record['category']])
+        slugs = self.assign_slugs([record['slug'] for record in batch])
+        posts = []
+        for record in batch:
+            if record['author'] not in authors:
+                raise ArchiveError(f'Post {record["slug"]!r}: unknown author {record["author"]!r}')
+            post = Post(
+                author_id=authors[record['author']],
+                category_id=categories.get(record['category']),
+                **{name: record[name] for name in POST_COLUMNS if name not in ('author', 'category')},
+            )
+            post.slug = slugs[record['slug']]
+            # Keeps the exported HTML unless the content hash doesn't match
+            post_content.process(post)
+            posts.append(post)
+        fields = [Post._meta.get_field('created_at'), Post._meta.get_field('updated_at')]
+        with explicit_timestamps(*fields):
+            Post.objects.bulk_create(posts)
+        self.counts['post'] += len(posts)
+
+    def import_comments(self, batch):
+        post_slugs = [self.renamed.get(record['post'], record['post']) for record in batch]
+        posts = self.lookup(Post, 'slug', post_slugs)
+        users = self.lookup(User, 'username', [record['user'] for record in batch if record['user']])
+        comments = []
+        for record, slug in zip(batch, post_slugs):
+            if slug not in posts:
+                raise ArchiveError(f'Comment on unknown post {record["post"]!r}')
+            comments.append(Comment(
+                post_id=posts[slug],
+                user_id=users.get(record['user']),
+                **{name: record[name] for name in COMMENT_COLUMNS if name not in ('post', 'user')},
+            ))
+        with explicit_timestamps(Comment._meta.get_field('created_at')):
+            Comment.objects.bulk_create(comments)
+        self.counts['comment'] += len(comments)
+
+    def lookup(self, model, field, values):
+        """{value: pk} for the rows of ``model`` whose ``field`` is one of ``values``."""
+        return dict(model.objects.filter(**{f'{field}__in': set(values)}).order_by().values_list(field, 'pk'))
+
+    def assign_slugs(self, slugs):
+        """{exported slug: slug to import it under}, renaming the ones already taken."""
+        taken = set(Post.objects.filter(slug__in=slugs).order_by().values_list('slug', flat=True))
+        assigned = {slug: slug for slug in slugs if slug not in taken}
+        pending = [slug for slug in slugs if slug in taken]
+        start = 2
+        while pending:
+            # Ten candidates per slug, checked with one query
+            candidates = {
+                slug: [self.suffixed(slug, n) for n in range(start, start + 10)] for slug in pending
+            }
+            in_use = set(assigned.values()) | set(
+                Post.objects.filter(slug__in=[c for options in candidates.values() for c in options]).order_by()
+                .values_list('slug', flat=True)
+            )
+            still_pending = []
+            for slug in pending:
+                free = next((candidate for candidate in candidates[slug] if candidate not in in_use), None)
+                if free is None:
+                    still_pending.append(slug)
+                else:
+                    assigned[slug] = self.renamed[slug] = free
+                    in_use.add(free)
+            self.counts['renamed post'] += len(pending) - len(still_pending)
+            pending = still_pending
+            start += 10
+        return assigned
+
+    def suffixed(self, slug, n):
+        suffix = f'-{n}'
+        return slug[:SLUG_LENGTH - len(suffix)] + suffix
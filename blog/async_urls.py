@@ -0,0 +1,31 @@
+from django.urls import URLPattern, URLResolver
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'post-list': async_views.post_list,
+    'post-detail': async_views.post_detail,
+    'post-featured': async_views.post_featured,
+    'post-popular': async_views.post_popular,
+    'category-list': async_views.category_list,
+    'comment-list': async_views.comment_list,
+    'health_check': async_views.health_check,
+}
+
+
+def with_async_views(patterns):
+    """blog/urls.py with the views in ASYNC_VIEWS swapped in, keeping the routes and their order."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield URLResolver(
+                pattern.pattern, list(with_async_views(pattern.url_patterns)),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace,
+            )
+        elif pattern.name in ASYNC_VIEWS:
+            yield URLPattern(pattern.pattern, ASYNC_VIEWS[pattern.name], pattern.default_args, pattern.name)
+        else:
+            yield pattern
+
+
+urlpatterns = list(with_async_views(sync_urlpatterns))
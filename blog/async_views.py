@@ -0,0 +1,248 @@
+"""
+Async versions of the hot public read endpoints, for the ASGI deployment
+(backend/asgi.py swaps them in for the DRF views through
+blog/async_urls.py). Queries go through Django's async ORM, so a request
+waiting on the database doesn't hold a worker.
+
+Only anonymous JSON GETs with the query params an endpoint knows are served
+here; anything else (a token, the browsable API, search, ordering, cursor
+pagination, an invalid page, a 404) is handed to the sync view, so both
+paths return the same responses. Cache keys are shared with the sync views.
+"""
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.urls import URLPattern
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import response_cache
+from . import urls as sync_urls
+from .pagination import PageSizePagination
+from .renderers import FastJSONRenderer
+from .response_cache import CATEGORY_SCOPES, POST_SCOPES, RANKING_SCOPES
+from .serializers import PostDetailSerializer
+from .trending import POPULAR_WINDOW
+from .view_counts import view_counter
+from .views import CategoryViewSet, CommentViewSet, PostViewSet
+
+# URL name -> the sync view blog/urls.py routes it to
+SYNC_VIEWS = {}
+for _pattern in [*sync_urls.router.urls, *sync_urls.urlpatterns]:
+    if isinstance(_pattern, URLPattern) and _pattern.name:
+        SYNC_VIEWS.setdefault(_pattern.name, _pattern.callback)
+
+SPARSE_PARAMS = ('fields', 'expand')
+PAGE_PARAMS = ('page', 'page_size')
+
+
+def _can_serve(request, params):
+    if request.method != 'GET' or 'HTTP_AUTHORIZATION' in request.META:
+        return False
+    if 'text/html' in request.headers.get('Accept', ''):  # browsable API
+        return False
+    return set(request.GET) <= set(params)
+
+
+def async_read(name, params=()):
+    """
+    Serve ``name`` asynchronously when the request allows it. The handler
+    gets a DRF request for an anonymous user and returns a response, or
+    None to defer to the sync view.
+    """
+    def decorator(handler):
+        # Like the DRF views it stands in for, which also take the writes:
+        # DRF's SessionAuthentication does its own CSRF check
+        @csrf_exempt
+        @functools.wraps(handler)
+        async def view(request, **kwargs):
+            if 'format' not in kwargs and _can_serve(request, params):
+                response = await handler(Request(request, authenticators=()), **kwargs)
+                if response is not None:
+                    return response
+            return await sync_to_async(SYNC_VIEWS[name])(request, **kwargs)
+        return view
+    return decorator
+
+
+def _viewset(viewset_class, request, action, **kwargs):
+    """A viewset instance for its queryset, serializer and sparse-field helpers."""
+    view = viewset_class(request=request, action=action, args=(), kwargs=kwargs, format_kwarg=None)
+    view.action_map = {'get': action}
+    return view
+
+
+def _json(data):
+    response = HttpResponse(FastJSONRenderer().render(data), content_type='application/json')
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+async def _cached(request, name, scopes, compute, patch=None, mark=True):
+    """
+    Async counterpart of response_cache.cache_response: a 304, a cached
+    body or ``await compute()``, with validators and (if ``mark``) X-Cache.
+    ``compute`` returns data, or None to defer to the sync view; ``patch``
+    may edit the data after it is cached.
+    """
+    def lookup():
+        key = response_cache.make_key(request, name, scopes)
+        validators = response_cache.Validators(key, scopes)
+        if validators.not_modified(request) is not None:
+            return key, validators, None, True
+        data = response_cache.fetch(key) if response_cache.is_enabled() else None
+        return key, validators, data, False
+
+    key, validators, data, not_modified = await sync_to_async(lookup)()
+    if not_modified:
+        return validators.not_modified(request)
+    hit = data is not None
+    if not hit:
+        data = await compute()
+        if data is None:
+            return None
+        if response_cache.is_enabled():
+            await sync_to_async(response_cache.store)(key, data, scopes)
+    if patch is not None:
+        patch(data)
+    response = _json(data)
+    if mark and response_cache.is_enabled():
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return validators.apply(response)
+
+
+async def _paginate(request, queryset, paginator):
+    """
+    A page-number page like ``paginator`` (PageNumberPagination) returns,
+    counted and fetched with the async ORM. None for an invalid page.
+    """
+    page_size = paginator.get_page_size(request)
+    count = await queryset.acount()
+    num_pages = max(1, math.ceil(count / page_size))
+    page = request.query_params.get(paginator.page_query_param, 1)
+    if page in paginator.last_page_strings:
+        page = num_pages
+    try:
+        page = int(page)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= page <= num_pages:
+        return None
+
+    offset = (page - 1) * page_size
+    rows = [row async for row in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous = replace_query_param(url, paginator.page_query_param, page - 1)
+    return rows, {
+        'count': count,
+        'next': replace_query_param(url, paginator.page_query_param, page + 1) if page < num_pages else None,
+        'previous': previous,
+    }
+
+
+async def _list(view, queryset, paginator):
+    result = await _paginate(view.request, queryset, paginator)
+    if result is None:
+        return None
+    rows, links = result
+    return {**links, 'results': view.get_serializer(rows, many=True).data}
+
+
+@async_read('post-list', PAGE_PARAMS + SPARSE_PARAMS)
+async def post_list(request):
+    view = _viewset(PostViewSet, request, 'list')
+    name = response_cache.action_name('PostViewSet', 'list', {})
+    return await _cached(
+        request, name, POST_SCOPES,
+        lambda: _list(view, view.as_rows(view.filter_queryset(view.get_queryset())), PageSizePagination()),
+    )
+
+
+@async_read('post-detail', SPARSE_PARAMS)
+async def post_detail(request, slug):
+    view = _viewset(PostViewSet, request, 'retrieve', slug=slug)
+    instance = await view.filter_queryset(view.get_queryset()).filter(slug=slug).afirst()
+    if instance is None:
+        return None
+    # Anonymous, so always a view; see PostViewSet.retrieve
+    counted = await sync_to_async(view_counter.record)(instance.pk)
+
+    async def compute():
+        serializer = view.get_serializer(instance)
+        if 'comments' in serializer.fields or 'comments_next' in serializer.fields:
+            rows = [row async for row in PostDetailSerializer.first_comment_page_queryset(instance)]
+            PostDetailSerializer.set_first_comment_page(instance, rows)
+        return serializer.data
+
+    def patch(data):
+        # Only the body is cached, so views are still counted
+        if 'views' in data:  # not when left out by ?fields=
+            data['views'] = instance.views + counted
+
+    return await _cached(
+        request, f'post-detail:{instance.pk}', POST_SCOPES, compute, patch=patch, mark=False,
+    )
+
+
+@async_read('post-featured', SPARSE_PARAMS)
+async def post_featured(request):
+    view = _viewset(PostViewSet, request, 'featured')
+
+    async def compute():
+        posts = [post async for post in view.as_rows(view.published_posts().filter(featured=True))[:5]]
+        return view.get_serializer(posts, many=True).data
+
+    name = response_cache.action_name('PostViewSet', 'featured', {})
+    return await _cached(request, name, POST_SCOPES, compute)
+
+
+@async_read('post-popular', SPARSE_PARAMS)
+async def post_popular(request):
+    view = _viewset(PostViewSet, request, 'popular')
+
+    async def compute():
+        ranked, fallback = view.ranked_querysets(POPULAR_WINDOW)
+        posts = [post async for post in ranked[:5]]
+        if len(posts) < 5:
+            posts += [post async for post in fallback[:5 - len(posts)]]
+        return view.get_serializer(posts, many=True).data
+
+    name = response_cache.action_name('PostViewSet', 'popular', {})
+    return await _cached(request, name, RANKING_SCOPES, compute)
+
+
+@async_read('category-list', PAGE_PARAMS)
+async def category_list(request):
+    view = _viewset(CategoryViewSet, request, 'list')
+    name = response_cache.action_name('CategoryViewSet', 'list', {})
+    return await _cached(
+        request, name, CATEGORY_SCOPES,
+        lambda: _list(view, view.filter_queryset(view.get_queryset()), view.paginator),
+    )
+
+
+@async_read('comment-list', ('post',) + PAGE_PARAMS + SPARSE_PARAMS)
+async def comment_list(request):
+    view = _viewset(CommentViewSet, request, 'list')
+    data = await _list(view, view.as_rows(view.filter_queryset(view.get_queryset())), PageSizePagination())
+    return _json(data) if data is not None else None
+
+
+@async_read('health_check')
+async def health_check(request):
+    return _json({
+        'status': 'ok',
+        'message': 'DevScribe is alive',
+        'timestamp': str(timezone.now()),
+        'response_cache': response_cache.stats(),
+    })
@@ -0,0 +1,94 @@
+"""
+JWT authentication without the per-request user lookup. The user's fields
+(except the password hash) and profile role are cached for
+AUTH_USER_CACHE_TIMEOUT seconds and dropped whenever the user or the
+profile is saved or deleted. With the per-process cache (no REDIS_URL)
+other processes only see a change once their entry expires, hence the
+short timeout.
+"""
+import functools
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import UserProfile
+
+# Part of the key; change it when the cached fields change
+CACHE_VERSION = 1
+# The password hash stays out of the cache; it is loaded on first access
+CACHED_FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+
+
+def user_key(user_id):
+    return f'blog:auth-user:{CACHE_VERSION}:{user_id}'
+
+
+def timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60)
+
+
+def invalidate(user_id):
+    cache.delete(user_key(user_id))
+    # Again after commit: a concurrent request may have cached the
+    # pre-commit row in between
+    transaction.on_commit(functools.partial(cache.delete, user_key(user_id)))
+
+
+def user_role(user):
+    """The profile role of an authenticated user, without a query when it came from the auth cache."""
+    role = getattr(user, 'cached_role', None)
+    return role if role is not None else user.profile.role
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:  # compares the password hash
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = user_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = self.load_user(user_id)
+            cached = {
+                'fields': [getattr(user, name) for name in CACHED_FIELDS],
+                'role': user.profile.role,
+            }
+            cache.set(key, cached, timeout())
+        else:
+            # Deferred password, so saving this instance never writes it back
+            user = User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, cached['fields'])
+        user.cached_role = cached['role']
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+    def load_user(self, user_id):
+        try:
+            return User.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: user_id})
+        except User.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    invalidate(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_profile(sender, instance, **kwargs):
+    invalidate(instance.user_id)
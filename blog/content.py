@@ -0,0 +1,70 @@
+"""
+Derived post content, computed when a post is saved so that reads serve it
+as stored: the body rendered to HTML, an excerpt for posts without one, the
+word count, the reading time and a hash of the body. Rows written without
+``save()`` (bulk_create, queryset updates, rows from before this existed)
+are filled in by ``manage.py backfill_post_content``.
+"""
+import hashlib
+import math
+import re
+
+from django.utils.html import urlize
+
+WORDS_PER_MINUTE = 200
+EXCERPT_LENGTH = 300
+# Changes to these need the derived fields recomputed
+SOURCE_FIELDS = ('content', 'excerpt')
+DERIVED_FIELDS = ('content_html', 'summary', 'word_count', 'reading_time', 'content_hash')
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def render_html(content):
+    """
+    Plain text to HTML: blank lines separate paragraphs, single newlines
+    become <br>, URLs become nofollow links and everything else is escaped.
+    """
+    content = content.replace('\r\n', '\n').replace('\r', '\n').strip()
+    paragraphs = (
+        urlize(paragraph.strip(), nofollow=True, autoescape=True).replace('\n', '<br>')
+        for paragraph in _PARAGRAPH_BREAK.split(content) if paragraph.strip()
+    )
+    return '\n\n'.join(f'<p>{paragraph}</p>' for paragraph in paragraphs)
+
+
+def generate_excerpt(content, length=EXCERPT_LENGTH):
+    """The start of the body on one line, cut at a word to at most ``length`` characters."""
+    text = ' '.join(content.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length - 1]  # room for the ellipsis
+    if text[length - 1] != ' ' and ' ' in cut:
+        cut = cut.rsplit(' ', 1)[0]  # a partial last word
+    return cut.rstrip(' ,;:.') + '…'
+
+
+def reading_time(word_count):
+    """Minutes, rounded up; 0 only for an empty body."""
+    return math.ceil(word_count / WORDS_PER_MINUTE)
+
+
+def process(post, force=False):
+    """
+    Set ``post``'s DERIVED_FIELDS from its content and excerpt. The body is
+    only rendered again when its hash changed (or with ``force``). Returns
+    whether any derived field changed.
+    """
+    before = [getattr(post, name) for name in DERIVED_FIELDS]
+    digest = content_hash(post.content)
+    if force or digest != post.content_hash:
+        post.content_html = render_html(post.content)
+        post.word_count = len(post.content.split())
+        post.reading_time = reading_time(post.word_count)
+        post.content_hash = digest
+    post.summary = post.excerpt.strip() or generate_excerpt(post.content)
+    return [getattr(post, name) for name in DERIVED_FIELDS] != before
@@ -0,0 +1,217 @@
+"""
+Synthetic data for benchmarks: a Zipf-distributed vocabulary (so text has a
+realistic mix of common and rare words) and bulk generation of users,
+profiles, categories, posts and comments, and deleting a corpus again.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import models
+from django.utils import timezone
+
+from . import content as post_content
+from .models import Category, Comment, Post, UserProfile
+
+SYLLABLES = 'ka lo mi ne ru sa te vo zi ba de fu go hi ja'.split()
+CORPUS_PASSWORD = 'benchmark-password'
+
+
+class Vocabulary:
+    def __init__(self, rng, size=8000):
+        self.rng = rng
+        self.words = sorted({
+            ''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)
+        })
+        rng.shuffle(self.words)
+        self.cum_weights = list(accumulate(1 / rank for rank in range(1, len(self.words) + 1)))
+
+    def text(self, words):
+        return ' '.join(self.rng.choices(self.words, cum_weights=self.cum_weights, k=words))
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """Let bulk_create keep the given auto_now / auto_now_add values instead of stamping now()."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(count, batch_size):
+    for offset in range(0, count, batch_size):
+        yield range(offset, min(offset + batch_size, count))
+
+
+def delete_rows(queryset, chunk_size=2000):
+    """
+    ``queryset.delete()`` for bulk data: follows the CASCADE and SET_NULL
+    relations itself and deletes in primary-key chunks with SQL only. Unlike
+    the collector it never loads the rows and sends no signals, so callers
+    refresh author stats and the response cache afterwards. Returns the
+    number of rows deleted, dependents included.
+    """
+    model = queryset.model
+    deleted = 0
+    dependents = [
+        (rel.related_model, rel.field.name, rel.on_delete)
+        for rel in model._meta.related_objects if not rel.many_to_many
+    ] + [
+        # The tables behind ManyToManyFields such as User.groups
+        (field.remote_field.through, field.m2m_field_name(), models.CASCADE)
+        for field in model._meta.local_many_to_many if field.remote_field.through._meta.auto_created
+    ]
+    for related_model, name, on_delete in dependents:
+        related = related_model._base_manager.filter(**{f'{name}__in': queryset})
+        if on_delete is models.CASCADE:
+            deleted += delete_rows(related, chunk_size)
+        elif on_delete is models.SET_NULL:
+            related.update(**{name: None})
+        elif on_delete is not models.DO_NOTHING:
+            raise ValueError(f'{related_model.__name__}.{name}: on_delete={on_delete.__name__} is not supported')
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        chunk = list((pks if last_pk is None else pks.filter(pk__gt=last_pk))[:chunk_size])
+        if not chunk:
+            return deleted
+        deleted += model._base_manager.filter(pk__in=chunk)._raw_delete(queryset.db)
+        last_pk = chunk[-1]
+
+
+def delete_corpus(prefix, chunk_size=2000):
+    """Delete the users and categories of the ``prefix`` corpus with everything that references them."""
+    users = User.objects.filter(username__startswith=f'{prefix}-user-')
+    categories = Category.objects.filter(slug__startswith=f'{prefix}-category-')
+    return delete_rows(users, chunk_size) + delete_rows(categories, chunk_size)
+
+
+class CorpusGenerator:
+    """
+    Bulk-creates a corpus whose usernames and slugs all start with
+    ``prefix``. No model signals run: callers refresh author stats and the
+    response cache afterwards (see the generate_corpus command).
+    """
+
+    def __init__(self, prefix='corpus', seed=1, batch_size=2000, span=timedelta(days=365), log=None):
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.vocabulary = Vocabulary(self.rng)
+        self.batch_size = batch_size
+        self.now = timezone.now()
+        self.span = span
+        self.log = log or (lambda message: None)
+
+    def timestamp(self):
+        return self.now - self.span * self.rng.random()
+
+    def timed(self, label, count, function):
+        start = time.perf_counter()
+        result = function()
+        self.log(f'{label}: {count} in {time.perf_counter() - start:.1f}s')
+        return result
+
+    def generate(self, users=1000, authors=100, categories=12, posts=10_000, comments_per_post=5):
+        user_ids = self.timed('users', users, lambda: self.create_users(users, authors))
+        category_ids = self.timed('categories', categories, lambda: self.create_categories(categories))
+        post_ids = self.timed(
+            'posts', posts, lambda: self.create_posts(posts, user_ids[:max(authors, 1)], category_ids)
+        )
+        comments = self.timed(
+            'comments', f'~{posts * comments_per_post}',
+            lambda: self.create_comments(post_ids, user_ids, comments_per_post),
+        )
+        return {'users': len(user_ids), 'categories': len(category_ids), 'posts': len(post_ids), 'comments': comments}
+
+    def create_users(self, count, authors):
+        password = make_password(CORPUS_PASSWORD)  # hashed once, shared by every user
+        user_ids = []
+        for batch in _batches(count, self.batch_size):
+            created = User.objects.bulk_create([
+                User(
+                    username=f'{self.prefix}-user-{i}',
+                    email=f'{self.prefix}-user-{i}@example.com',
+                    first_name=self.vocabulary.text(1).title(),
+                    password=password,
+                )
+                for i in batch
+            ])
+            ids = [user.pk for user in created]
+            UserProfile.objects.bulk_create([
+                UserProfile(user_id=pk, role='author' if i < authors else 'reader', bio=self.vocabulary.text(20))
+                for i, pk in zip(batch, ids)
+            ])
+            user_ids += ids
+        return user_ids
+
+    def create_categories(self, count):
+        created = Category.objects.bulk_create([
+            Category(
+                name=f'{self.vocabulary.text(1).title()} {i}',
+                slug=f'{self.prefix}-category-{i}',
+                description=self.vocabulary.text(15),
+            )
+            for i in range(count)
+        ])
+        return [category.pk for category in created]
+
+    def create_posts(self, count, author_ids, category_ids):
+        rng = self.rng
+        post_ids = []
+        fields = [Post._meta.get_field('created_at'), Post._meta.get_field('updated_at')]
+        with explicit_timestamps(*fields):
+            for batch in _batches(count, self.batch_size):
+                posts = []
+                for i in batch:
+                    created_at = self.timestamp()
+                    posts.append(Post(
+                        title=self.vocabulary.text(rng.randint(3, 9)).title(),
+                        slug=f'{self.prefix}-post-{i}',
+                        author_id=rng.choice(author_ids),
+                        category_id=rng.choice(category_ids) if category_ids and rng.random() < 0.9 else None,
+                        excerpt=self.vocabulary.text(rng.randint(15, 40)),
+                        content='\n\n'.join(
+                            self.vocabulary.text(rng.randint(40, 120)) for _ in range(rng.randint(2, 12))
+                        ),
+                        published=rng.random() < 0.95,
+                        featured=rng.random() < 0.01,
+                        views=int(rng.paretovariate(1.2) * 10),
+                        created_at=created_at,
+                        updated_at=created_at,
+                    ))
+                    post_content.process(posts[-1])  # bulk_create skips save()
+                post_ids += [post.pk for post in Post.objects.bulk_create(posts)]
+        return post_ids
+
+    def create_comments(self, post_ids, user_ids, per_post):
+        rng = self.rng
+        created = 0
+        pending = []
+        with explicit_timestamps(Comment._meta.get_field('created_at')):
+            for post_id in post_ids:
+                for _ in range(int(rng.expovariate(1 / per_post)) if per_post else 0):
+                    user_id = rng.choice(user_ids) if user_ids and rng.random() < 0.6 else None
+                    pending.append(Comment(
+                        post_id=post_id,
+                        user_id=user_id,
+                        name=f'{self.prefix}-commenter-{rng.randrange(10_000)}',
+                        email='commenter@example.com',
+                        content=self.vocabulary.text(rng.randint(5, 60)),
+                        approved=rng.random() < 0.85,
+                        created_at=self.timestamp(),
+                    ))
+                if len(pending) >= self.batch_size:
+                    Comment.objects.bulk_create(pending)
+                    created += len(pending)
+                    pending = []
+            Comment.objects.bulk_create(pending)
+        return created + len(pending)
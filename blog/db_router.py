@@ -0,0 +1,106 @@
+"""
+Read replicas (DATABASE_REPLICA_URLS). ReplicaRouter sends the reads of
+the blog viewsets' GETs (and their async versions) to a replica and
+everything else to the primary. ReplicaPinMiddleware decides per request:
+after a successful write a client (its Authorization header, else its IP)
+reads from the primary for REPLICA_PIN_SECONDS, so authors see their own
+drafts while the replicas catch up.
+"""
+import contextvars
+import hashlib
+import random
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_VIEW_MODULES = ('blog.views', 'blog.async_views')
+
+_current = contextvars.ContextVar('blog_db_routing', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+def pin_key(request):
+    authorization = request.headers.get('Authorization')
+    if authorization:
+        client = hashlib.sha256(authorization.encode()).hexdigest()
+    else:
+        client = request.META.get('REMOTE_ADDR', '')
+    return f'blog:db-pin:{client}'
+
+
+class RequestRouting:
+    """Routing state of one request; reads use a replica only if ``use_replica``."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+        self.read_replica = False
+
+
+def start_request(pinned):
+    return _current.set(RequestRouting(pinned))
+
+
+def route_view(request, view_func):
+    """
+    Let the request read from a replica if it is a GET of a blog viewset
+    (or an async read view). Auth views read what they just wrote.
+    """
+    routing = _current.get()
+    if routing is None or routing.pinned or request.method not in SAFE_METHODS:
+        return
+    if view_func.__module__ in REPLICA_VIEW_MODULES:
+        routing.use_replica = hasattr(view_func, 'actions') or iscoroutinefunction(view_func)
+
+
+def end_request(request, response, token):
+    """Whether to pin the client to the primary (it wrote successfully)."""
+    routing = _current.get()
+    _current.reset(token)
+    return (
+        routing.wrote and request.method not in SAFE_METHODS
+        and response is not None and response.status_code < 400
+    )
+
+
+def used_replica():
+    """Whether the current request has read from a replica."""
+    routing = _current.get()
+    return routing is not None and routing.read_replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        aliases = replicas()
+        if routing is None or not routing.use_replica or routing.wrote or not aliases:
+            return None
+        # Inside a transaction the primary has rows the replicas don't
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        instance = hints.get('instance')
+        alias = instance._state.db if instance is not None and instance._state.db in aliases else random.choice(aliases)
+        routing.read_replica = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None:
+            routing.wrote = True  # the rest of the request reads from the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -0,0 +1,187 @@
+"""
+Read-only fast path for list endpoints: PostListSerializer and
+CommentSerializer output built straight from ``.values()`` rows, without
+model instances or per-field serializer dispatch. The output is the same,
+key order included, so responses don't change byte for byte (the tests
+compare both paths). Turned off with FAST_LIST_SERIALIZERS=False.
+"""
+from django.conf import settings
+from django.db.models.query import QuerySet, ValuesIterable
+from django.utils import timezone
+from rest_framework import serializers
+
+from .metrics import timed_serialization
+from .models import Post
+from .serializers import CommentSerializer, PostListSerializer, image_srcset
+
+USER_COLUMNS = ('id', 'username', 'first_name', 'last_name', 'email')
+CATEGORY_COLUMNS = ('id', 'name', 'slug', 'description')
+
+
+def is_rows(items):
+    """Whether a page or queryset holds ``.values()`` rows rather than instances."""
+    if isinstance(items, QuerySet):
+        return items._iterable_class is ValuesIterable
+    return isinstance(items, list) and bool(items) and isinstance(items[0], dict)
+
+
+def fast_enabled():
+    return getattr(settings, 'FAST_LIST_SERIALIZERS', True)
+
+
+class RowSerializer:
+    """
+    many=True stand-in for ``serializer_class`` over ``.values()`` rows.
+    Like SparseFieldsSerializerMixin, ``columns`` and ``expanded_columns``
+    map each output field to the values() names it reads (``required_columns``
+    are always read); ``field_<name>(row)`` (``expanded_<name>(row)`` when
+    expanded) builds a field, by default from the column of the same name.
+    """
+
+    serializer_class = None
+    columns = {}
+    expanded_columns = {}
+    required_columns = ('id',)
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+        self.request = self.context.get('request')
+        # DRF's own field, so dates are formatted exactly like the serializers
+        # do; with the timezone looked up once rather than per value
+        self.format_datetime = serializers.DateTimeField(
+            default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None
+        ).to_representation
+        selected, expand = self.context.get('sparse_fields'), self.context.get('sparse_expand') or set()
+        self.fields = [
+            (name, self.field_builder(name, name in expand))
+            for name in self.serializer_class.output_field_names(selected, expand)
+        ]
+
+    def field_builder(self, name, expanded):
+        # ?expand= of a field that has no expanded form leaves it as it is
+        build = getattr(self, f'expanded_{name}', None) if expanded else None
+        return build or getattr(self, f'field_{name}', None) or (lambda row: row[name])
+
+    @classmethod
+    def values(cls, queryset, selected=None, expand=None):
+        expand = expand or set()
+        names = dict.fromkeys(cls.required_columns)
+        for field in cls.serializer_class.output_field_names(selected, expand):
+            if field in expand and field in cls.expanded_columns:
+                names.update(dict.fromkeys(cls.expanded_columns[field]))
+            else:
+                names.update(dict.fromkeys(cls.columns.get(field, (field,))))
+        return queryset.values(*names)
+
+    def to_representation(self, row):
+        return {name: build(row) for name, build in self.fields}
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return [self.to_representation(row) for row in self.rows]
+
+
+class FastPostListSerializer(RowSerializer):
+    serializer_class = PostListSerializer
+    columns = {
+        'author': [f'author__{column}' for column in USER_COLUMNS],
+        'category': [f'category__{column}' for column in CATEGORY_COLUMNS + ('created_at',)] + ['category_post_count'],
+        'image': ('image', 'image_variants'),
+        'image_srcset': ('image', 'image_variants'),
+        'is_author': (),
+    }
+    # created_at and id for KeysetPagination's cursor
+    required_columns = ('id', 'author__id', 'created_at')
+    image_storage = Post._meta.get_field('image').storage
+
+    def field_author(self, row):
+        return {column: row[f'author__{column}'] for column in USER_COLUMNS}
+
+    def field_category(self, row):
+        if row['category__id'] is None:
+            return None
+        category = {column: row[f'category__{column}'] for column in CATEGORY_COLUMNS}
+        category['post_count'] = row['category_post_count']
+        category['created_at'] = self.format_datetime(row['category__created_at'])
+        return category
+
+    def field_image(self, row):
+        # Same choice as PostListSerializer.get_image
+        if not row['image']:
+            return None
+        variants = row['image_variants']
+        name = variants[min(variants, key=int)] if variants else row['image']
+        return self.request.build_absolute_uri(self.image_storage.url(name))
+
+    def field_image_srcset(self, row):
+        if not row['image']:
+            return None
+        return image_srcset(self.request, self.image_storage, row['image_variants'])
+
+    def field_created_at(self, row):
+        return self.format_datetime(row['created_at'])
+
+    def field_updated_at(self, row):
+        return self.format_datetime(row['updated_at'])
+
+    def field_is_author(self, row):
+        user = self.request.user if self.request else None
+        return bool(user and user.is_authenticated and row['author__id'] == user.id)
+
+
+class FastCommentSerializer(RowSerializer):
+    serializer_class = CommentSerializer
+    columns = {'user_name': ('user', 'user__username', 'name')}
+    expanded_columns = {'post': ('post__id', 'post__title', 'post__slug')}
+    required_columns = ('id', 'created_at')
+
+    def field_created_at(self, row):
+        return self.format_datetime(row['created_at'])
+
+    def field_user_name(self, row):
+        return row['user__username'] if row['user'] is not None else row['name']
+
+    def expanded_post(self, row):
+        return {'id': row['post__id'], 'title': row['post__title'], 'slug': row['post__slug']}
+
+
+FAST_SERIALIZERS = {
+    PostListSerializer: FastPostListSerializer,
+    CommentSerializer: FastCommentSerializer,
+}
+
+
+class FastListViewMixin:
+    """
+    Viewset side: GET list pages are loaded as ``.values()`` rows (through
+    ``paginate_queryset`` or ``as_rows``) and serialized by the fast path.
+    """
+
+    def fast_serializer_class(self, serializer_class=None):
+        if not fast_enabled() or self.request is None or self.request.method != 'GET':
+            return None
+        return FAST_SERIALIZERS.get(serializer_class or self.get_serializer_class())
+
+    def as_rows(self, queryset, serializer_class=None):
+        """``queryset`` as rows for the fast path when ``serializer_class`` has one, else unchanged."""
+        fast = self.fast_serializer_class(serializer_class)
+        if fast is None or is_rows(queryset):
+            return queryset
+        return fast.values(queryset, *self.get_sparse_selection())
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.as_rows(queryset))
+
+    def get_list_serializer(self, items, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        context = self.get_serializer_context()
+        if is_rows(items):
+            return FAST_SERIALIZERS[serializer_class](items, context=context)
+        return serializer_class(items, many=True, context=context)
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get('many') and args and is_rows(args[0]):
+            return self.get_list_serializer(args[0])
+        return super().get_serializer(*args, **kwargs)
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog import response_cache
+from blog.content import DERIVED_FIELDS, SOURCE_FIELDS, process
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute the derived post fields (rendered HTML, summary, word count, '
+        'reading time, content hash) for posts that were written without '
+        'save(), --batch-size rows per transaction. --force reprocesses every '
+        'post, e.g. after a change to blog/content.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Posts per transaction.')
+        parser.add_argument('--force', action='store_true', help='Reprocess posts that already have the fields.')
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.order_by('pk').only('pk', *SOURCE_FIELDS, *DERIVED_FIELDS)
+        if not options['force']:
+            queryset = queryset.filter(content_hash='')
+        processed = updated = 0
+        last_pk = 0
+        while True:
+            posts = list(queryset.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not posts:
+                break
+            # bulk_update: no signals, and updated_at keeps its value
+            changed = [post for post in posts if process(post, force=options['force'])]
+            with transaction.atomic():
+                Post.objects.bulk_update(changed, DERIVED_FIELDS)
+            processed += len(posts)
+            updated += len(changed)
+            last_pk = posts[-1].pk
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Processed {processed} posts ({updated} updated)')
+        if updated:
+            response_cache.bump(*response_cache.POST_SCOPES)
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} posts, updated {updated}'))
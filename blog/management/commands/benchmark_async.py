@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from blog.async_urls import ASYNC_VIEWS
+
+from .run_benchmark import Command as BenchmarkCommand
+from .run_benchmark import HttpRunner, Scenarios, summarize
+
+
+class WsgiClientRunner(HttpRunner):
+    """
+    WSGI in process: ``concurrency`` client threads sharing ``workers`` sync
+    workers, like `gunicorn -w <workers>` with the default sync worker class.
+    Time spent waiting for a free worker counts towards latency.
+    """
+
+    def __init__(self, concurrency, workers):
+        self.concurrency = max(1, concurrency)
+        self.workers = threading.BoundedSemaphore(max(1, workers))
+
+    def send(self, build, i):
+        method, path, _, _ = build(i)
+        start = time.perf_counter()
+        with self.workers:
+            response = Client(HTTP_HOST='localhost').generic(method, path, secure=True)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    def measure(self, build, warmup, iterations):
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            return super().measure(build, warmup, iterations)
+
+
+class AsgiClientRunner:
+    """ASGI in process: ``concurrency`` AsyncClient requests in flight on one event loop."""
+
+    def __init__(self, concurrency):
+        self.concurrency = max(1, concurrency)
+        self.client = AsyncClient()
+
+    async def send(self, build, i):
+        method, path, _, _ = build(i)
+        start = time.perf_counter()
+        response = await self.client.generic(method, path, secure=True)
+        return (time.perf_counter() - start) * 1000, response.status_code
+
+    async def run(self, build, warmup, iterations):
+        for i in range(warmup):
+            await self.send(build, i)
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def send_when_free(i):
+            async with slots:
+                return await self.send(build, i)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(send_when_free(i) for i in range(warmup, warmup + iterations)))
+        elapsed = time.perf_counter() - start
+        timings = [timing for timing, _ in results]
+        errors = sum(status >= 400 for _, status in results)
+        return summarize(build(0)[0], timings, [], errors, elapsed)
+
+    def measure(self, build, warmup, iterations):
+        # AsyncClient always sends Host: testserver
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ROOT_URLCONF='backend.asgi_urls', ALLOWED_HOSTS=allowed_hosts):
+            return async_to_sync(self.run)(build, warmup, iterations)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        'Compare the sync (WSGI) and async (ASGI) read paths at the same number '
+        'of concurrent clients and print p50/p95/p99 latency, throughput and '
+        'the ASGI speedup as JSON. In process by default, with --workers sync '
+        'workers for WSGI; --wsgi-url and --asgi-url target running servers '
+        'instead (e.g. `gunicorn backend.wsgi -w 4` and '
+        '`uvicorn backend.asgi:application --workers 4`). Detail reads count '
+        'views. Run generate_corpus first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=200, help='Concurrent clients.')
+        parser.add_argument('--iterations', type=int, default=1000, help='Requests per route and server.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route and server.')
+        parser.add_argument('--workers', type=int, default=4, help='WSGI sync workers (in process only).')
+        parser.add_argument('--routes', help=f'Comma-separated URL names (default: {",".join(sorted(ASYNC_VIEWS))}).')
+        parser.add_argument('--no-response-cache', action='store_true', help='Measure with the response cache off (in process only).')
+        parser.add_argument('--wsgi-url', help='Base URL of a running WSGI server.')
+        parser.add_argument('--asgi-url', help='Base URL of a running ASGI server.')
+        parser.add_argument('--username', help='User for the scenarios (default: the first corpus author).')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        if bool(options['wsgi_url']) != bool(options['asgi_url']):
+            raise CommandError('Pass both --wsgi-url and --asgi-url, or neither.')
+        user = self.get_user(options['username'])
+        available = Scenarios(user).reads()
+        selected = options['routes'].split(',') if options['routes'] else sorted(ASYNC_VIEWS)
+        unknown = set(selected) - (set(ASYNC_VIEWS) & set(available))
+        if unknown:
+            raise CommandError(f'Unknown or sync-only routes: {", ".join(sorted(unknown))}')
+
+        concurrency = options['concurrency']
+        if options['wsgi_url']:
+            runners = {
+                'wsgi': HttpRunner(options['wsgi_url'], user, concurrency),
+                'asgi': HttpRunner(options['asgi_url'], user, concurrency),
+            }
+        else:
+            runners = {
+                'wsgi': WsgiClientRunner(concurrency, options['workers']),
+                'asgi': AsgiClientRunner(concurrency),
+            }
+        report = {
+            'commit': self.git_commit(),
+            'mode': 'http' if options['wsgi_url'] else 'client',
+            'database': connection.vendor,
+            'response_cache': not options['no_response_cache'] and getattr(settings, 'RESPONSE_CACHE_ENABLED', False),
+            'concurrency': concurrency,
+            'workers': None if options['wsgi_url'] else options['workers'],
+            'iterations': options['iterations'],
+            'routes': {},
+        }
+        with override_settings(RESPONSE_CACHE_ENABLED=report['response_cache']):
+            for name in selected:
+                result = {
+                    server: runner.measure(available[name], options['warmup'], options['iterations'])
+                    for server, runner in runners.items()
+                }
+                wsgi_rps, asgi_rps = result['wsgi']['throughput_rps'], result['asgi']['throughput_rps']
+                result['speedup'] = round(asgi_rps / wsgi_rps, 2) if wsgi_rps and asgi_rps else None
+                report['routes'][name] = result
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
@@ -0,0 +1,108 @@
+import copy
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .run_benchmark import percentile
+
+MODES = ('per-request', 'persistent', 'pool')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request cost of getting a Postgres connection: a new '
+        'connection per request (CONN_MAX_AGE=0), persistent connections '
+        '(CONN_MAX_AGE=600) and the psycopg 3 pool (DATABASE_POOL). Each '
+        'simulated request runs the request_started/request_finished '
+        'signals around one query, from --threads threads. Prints JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode.')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent requests (e.g. gunicorn threads).')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'Comma-separated subset of {", ".join(MODES)}.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        base = connections.settings['default']
+        if base['ENGINE'] != 'django.db.backends.postgresql':
+            raise CommandError('Needs a Postgres DATABASE_URL.')
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f'Unknown modes: {", ".join(sorted(unknown))}')
+
+        report = {'requests': options['requests'], 'threads': options['threads'], 'modes': {}}
+        for mode in modes:
+            alias = f'benchmark_{mode.replace("-", "_")}'
+            connections.settings[alias] = self.mode_settings(base, mode)
+            try:
+                report['modes'][mode] = self.measure(alias, options['requests'], options['threads'])
+            finally:
+                self.tear_down(alias)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def mode_settings(self, base, mode):
+        config = copy.deepcopy(base)
+        config['OPTIONS'] = {key: value for key, value in config.get('OPTIONS', {}).items() if key != 'pool'}
+        config['CONN_MAX_AGE'] = 600 if mode == 'persistent' else 0
+        config['CONN_HEALTH_CHECKS'] = mode == 'persistent'
+        if mode == 'pool':
+            config['OPTIONS']['pool'] = dict(settings.DATABASE_POOL_OPTIONS)
+        return config
+
+    def measure(self, alias, requests, threads):
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            if connection.alias == alias:
+                opened.append(connection)
+
+        def simulated_request(_):
+            start = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            request_finished.send(sender=self.__class__)
+            return (time.perf_counter() - start) * 1000
+
+        connection_created.connect(count_connection)
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                timings = sorted(pool.map(simulated_request, range(requests)))
+            elapsed = time.perf_counter() - start
+            pool_stats = connections[alias].pool.get_stats() if connections.settings[alias]['OPTIONS'].get('pool') else None
+        finally:
+            connection_created.disconnect(count_connection)
+            # Persistent connections stay open in the finished threads' wrappers
+            for connection in {id(connection): connection for connection in opened}.values():
+                connection.inc_thread_sharing()
+                connection.close()
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            # The pool sends connection_created for every checkout
+            'connections_opened': pool_stats.get('connections_num', 0) if pool_stats is not None else len(opened),
+            'pool': pool_stats,
+        }
+
+    def tear_down(self, alias):
+        if connections.settings[alias]['OPTIONS'].get('pool'):
+            connections[alias].close_pool()
+        del connections[alias]
+        del connections.settings[alias]
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from blog import throttling, views
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate credential stuffing: --threads clients POST /api/auth/login/ '
+        'as fast as they can for --seconds, with wrong passwords for '
+        '--usernames accounts from --ips client addresses, once with the '
+        'throttles on and once off. Reports the status codes, the CPU time of '
+        'the whole process (the clients included) and the part of it spent '
+        'checking passwords, which is what the throttles bound. Nothing is '
+        'written: every login fails. Prints JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seconds', type=float, default=30, help='Flood duration per mode.')
+        parser.add_argument('--ips', type=int, default=2, help='Distinct client addresses.')
+        parser.add_argument('--usernames', type=int, default=3, help='Distinct usernames tried.')
+        parser.add_argument('--threads', type=int, default=4, help='Concurrent requests.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        report = {key: options[key] for key in ('seconds', 'ips', 'usernames', 'threads')}
+        report['modes'] = {}
+        for mode, enabled in (('throttled', True), ('unthrottled', False)):
+            throttling.backend.clear()
+            with override_settings(THROTTLE_ENABLED=enabled):
+                report['modes'][mode] = self.measure(options)
+        throttling.backend.clear()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def measure(self, options):
+        run = uuid.uuid4().hex[:8]
+        lock = threading.Lock()
+        checks = {'count': 0, 'cpu': 0.0}
+
+        def timed_authenticate(**credentials):
+            start = time.thread_time()
+            try:
+                return authenticate(**credentials)
+            finally:
+                with lock:
+                    checks['count'] += 1
+                    checks['cpu'] += time.thread_time() - start
+
+        deadline = time.perf_counter() + options['seconds']
+
+        def flood(thread):
+            statuses = Counter()
+            i = thread
+            while time.perf_counter() < deadline:
+                client = Client(HTTP_HOST='localhost', REMOTE_ADDR=f'10.0.{i % options["ips"]}.1')
+                response = client.post('/api/auth/login/', {
+                    'username': f'flood-{run}-{i % options["usernames"]}',
+                    'password': uuid.uuid4().hex,
+                }, secure=True)
+                statuses[response.status_code] += 1
+                i += options['threads']
+            return statuses
+
+        # process_time counts every thread of this process: the CPU a worker
+        # would spend on the flood
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        authenticate = views.authenticate
+        with mock.patch.object(views, 'authenticate', timed_authenticate), ThreadPoolExecutor(options['threads']) as pool:
+            statuses = sum(pool.map(flood, range(options['threads'])), Counter())
+        cpu = time.process_time() - cpu_start
+        wall = time.perf_counter() - wall_start
+        requests = sum(statuses.values())
+        return {
+            'requests': requests,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu, 3),
+            'cpu_ms_per_request': round(cpu / requests * 1000, 3),
+            'cpu_per_wall_second': round(cpu / wall, 3),
+            'password_checks': checks['count'],
+            'password_check_cpu_seconds': round(checks['cpu'], 3),
+            'password_check_cpu_per_wall_second': round(checks['cpu'] / wall, 3),
+        }
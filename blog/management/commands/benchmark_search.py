@@ -0,0 +1,88 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from blog.corpus import Vocabulary
+from blog.models import Post
+from blog.search import get_search_engine
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare full-text search with the old icontains SearchFilter on a '
+        'generated corpus. Runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=30)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        engine = get_search_engine(connection.alias)
+        if engine is None:
+            self.stderr.write('No full-text engine for this database; nothing to compare.')
+            return
+
+        rng = random.Random(options['seed'])
+        self.vocabulary = Vocabulary(rng)
+        with transaction.atomic():
+            self.generate(options['posts'], options['batch_size'])
+            terms = [
+                ' '.join(rng.sample(self.vocabulary.words[10:2000], rng.randint(1, 2)))
+                for _ in range(options['queries'])
+            ]
+
+            queryset = Post.objects.filter(published=True)
+            results = {
+                'icontains': self.measure(terms, lambda text: self.icontains(queryset, text)),
+                type(engine).__name__: self.measure(terms, lambda text: engine.search(queryset, text)),
+            }
+            transaction.set_rollback(True)
+
+        for name, timings in results.items():
+            self.stdout.write(
+                f'{name:>22}: mean {statistics.mean(timings):7.1f} ms  '
+                f'p50 {statistics.median(timings):7.1f} ms  '
+                f'p95 {statistics.quantiles(timings, n=20)[-1]:7.1f} ms'
+            )
+
+    def generate(self, count, batch_size):
+        author, _ = User.objects.get_or_create(username='benchmark-search')
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            Post.objects.bulk_create([
+                Post(
+                    title=self.vocabulary.text(6).title(),
+                    slug=f'benchmark-search-{i}',
+                    author=author,
+                    excerpt=self.vocabulary.text(25),
+                    content=self.vocabulary.text(400),
+                )
+                for i in range(offset, min(offset + batch_size, count))
+            ])
+        self.stdout.write(f'Generated {count} posts in {time.perf_counter() - start:.1f}s')
+
+    def icontains(self, queryset, text):
+        # What filters.SearchFilter builds for search_fields = title/content/excerpt
+        for term in text.split():
+            queryset = queryset.filter(
+                Q(title__icontains=term) | Q(content__icontains=term) | Q(excerpt__icontains=term)
+            )
+        return queryset
+
+    def measure(self, terms, search):
+        timings = []
+        for text in terms:
+            start = time.perf_counter()
+            queryset = search(text)
+            queryset.count()
+            list(queryset[:10])  # one page, as the list endpoint does
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
@@ -0,0 +1,114 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from blog.corpus import Vocabulary
+from blog.fast_serializers import FAST_SERIALIZERS
+from blog.models import Category, Comment, Post
+from blog.renderers import FastJSONRenderer
+from blog.views import CommentViewSet, PostViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the DRF list serializers (model instances + JSONRenderer) with '
+        'the .values() fast path (+ FastJSONRenderer) on one page of posts and '
+        'of comments, split into fetch / serialize / render time. Checks that '
+        'both produce the same bytes. Runs in a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Rows serialized per iteration.')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--query', default='', help='Query string of the list request, e.g. "fields=id,title".')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.vocabulary = Vocabulary(random.Random(options['seed']))
+        page_size = options['page_size']
+        with transaction.atomic():
+            self.generate(page_size)
+            for viewset_class in (PostViewSet, CommentViewSet):
+                view = self.list_view(viewset_class, options['query'])
+                queryset = view.filter_queryset(view.get_queryset())[:page_size]
+                paths = {
+                    'drf': lambda: self.drf(view, queryset),
+                    'fast': lambda: self.fast(view, queryset),
+                }
+                if paths['drf']()[1] != paths['fast']()[1]:
+                    raise CommandError(f'{viewset_class.__name__}: the fast path rendered different bytes')
+                self.stdout.write(f'{viewset_class.__name__}, {page_size} rows:')
+                for name, path in paths.items():
+                    self.report(name, [path()[0] for _ in range(options['iterations'])])
+            transaction.set_rollback(True)
+
+    def generate(self, count):
+        author, _ = User.objects.get_or_create(
+            username='benchmark-serializers', defaults={'first_name': 'Bench', 'email': 'bench@example.com'},
+        )
+        category = Category.objects.create(name='Benchmark serializers', description=self.vocabulary.text(12))
+        posts = Post.objects.bulk_create([
+            Post(
+                title=self.vocabulary.text(6).title(),
+                slug=f'benchmark-serializers-{i}',
+                author=author,
+                category=category if i % 2 else None,
+                excerpt=self.vocabulary.text(25),
+                content=self.vocabulary.text(400),
+                featured=i % 5 == 0,
+            )
+            for i in range(count)
+        ])
+        Comment.objects.bulk_create([
+            Comment(
+                post=post, user=author if i % 2 else None, name='Reader', email='reader@example.com',
+                content=self.vocabulary.text(30), approved=True,
+            )
+            for i, post in enumerate(posts)
+        ])
+
+    def list_view(self, viewset_class, query):
+        request = Request(APIRequestFactory().get(f'/api/?{query}'), authenticators=())
+        view = viewset_class(request=request, action='list', args=(), kwargs={}, format_kwarg=None)
+        view.action_map = {'get': 'list'}
+        return view
+
+    def drf(self, view, queryset):
+        timings = {}
+        start = time.perf_counter()
+        instances = list(queryset.all())
+        timings['fetch'] = time.perf_counter() - start
+        data = view.get_serializer_class()(instances, many=True, context=view.get_serializer_context()).data
+        timings['serialize'] = time.perf_counter() - start - timings['fetch']
+        body = JSONRenderer().render(data)
+        timings['render'] = time.perf_counter() - start - timings['fetch'] - timings['serialize']
+        return timings, body
+
+    def fast(self, view, queryset):
+        fast_serializer = FAST_SERIALIZERS[view.get_serializer_class()]
+        timings = {}
+        start = time.perf_counter()
+        rows = list(fast_serializer.values(queryset, *view.get_sparse_selection()))
+        timings['fetch'] = time.perf_counter() - start
+        data = fast_serializer(rows, context=view.get_serializer_context()).data
+        timings['serialize'] = time.perf_counter() - start - timings['fetch']
+        body = FastJSONRenderer().render(data)
+        timings['render'] = time.perf_counter() - start - timings['fetch'] - timings['serialize']
+        return timings, body
+
+    def report(self, name, runs):
+        phases = {
+            phase: statistics.median(run[phase] * 1000 for run in runs)
+            for phase in ('fetch', 'serialize', 'render')
+        }
+        self.stdout.write(
+            f'{name:>6}: ' + '  '.join(f'{phase} {ms:7.2f} ms' for phase, ms in phases.items())
+            + f'  total {sum(phases.values()):7.2f} ms (medians)'
+        )
@@ -0,0 +1,91 @@
+import json
+import time
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from blog.token_blacklist import index
+
+from .run_benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure POST /api/auth/token/refresh/ (rotation + blacklisting) as the '
+        'token_blacklist tables grow, with the blacklist check in SQL and from '
+        'the in-process index (JWT_BLACKLIST_INDEX). Half the generated tokens '
+        'are blacklisted, a quarter expired. Runs in a transaction that is '
+        'rolled back. Prints JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help='Comma-separated outstanding token counts.')
+        parser.add_argument('--refreshes', type=int, default=200, help='Refreshes per size and mode.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        report = {'refreshes': options['refreshes'], 'sizes': {}}
+        with transaction.atomic():
+            user, _ = User.objects.get_or_create(username='benchmark-token-refresh')
+            for size in sizes:
+                self.grow(user, size, options['batch_size'])
+                report['sizes'][size] = {
+                    'sql': self.measure(user, options['refreshes'], use_index=False),
+                    'index': self.measure(user, options['refreshes'], use_index=True),
+                }
+            transaction.set_rollback(True)
+        index.clear()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def grow(self, user, size, batch_size):
+        now = timezone.now()
+        for start in range(OutstandingToken.objects.count(), size, batch_size):
+            tokens = OutstandingToken.objects.bulk_create([
+                OutstandingToken(
+                    user=user, jti=uuid.uuid4().hex, token='', created_at=now,
+                    expires_at=now + (timedelta(days=-1) if i % 4 == 0 else timedelta(days=7)),
+                )
+                for i in range(start, min(start + batch_size, size))
+            ])
+            BlacklistedToken.objects.bulk_create([BlacklistedToken(token=token) for token in tokens[::2]])
+
+    def measure(self, user, refreshes, use_index):
+        client = Client(HTTP_HOST='localhost')
+        refresh = str(RefreshToken.for_user(user))
+        timings, queries = [], []
+        with override_settings(JWT_BLACKLIST_INDEX=use_index):
+            index.clear()
+            start = time.perf_counter()
+            if use_index:
+                index.contains('')  # the initial load
+            load_ms = (time.perf_counter() - start) * 1000
+            for _ in range(refreshes):
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    response = client.post('/api/auth/token/refresh/', {'refresh': refresh}, secure=True)
+                    timings.append((time.perf_counter() - start) * 1000)
+                queries.append(len(captured))
+                refresh = response.json()['refresh']
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries_per_refresh': round(sum(queries) / len(queries), 2),
+            'index_load_ms': round(load_ms, 3) if use_index else None,
+        }
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.view_counts import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Write buffered post view counts to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Drain counters for every post, not only the ones this process touched '
+                 '(needed with a shared VIEW_COUNT_BACKEND).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['all']:
+            counts = view_counter.flush()
+            self.stdout.write(self.style.SUCCESS(
+                f'Flushed {sum(counts.values())} views across {len(counts)} posts'
+            ))
+            return
+
+        views = posts = 0
+        chunk = []
+        for pk in Post.objects.values_list('pk', flat=True).order_by('pk').iterator():
+            chunk.append(pk)
+            if len(chunk) >= options['chunk_size']:
+                counts = view_counter.flush(post_ids=chunk)
+                views, posts, chunk = views + sum(counts.values()), posts + len(counts), []
+        if chunk:
+            counts = view_counter.flush(post_ids=chunk)
+            views, posts = views + sum(counts.values()), posts + len(counts)
+        self.stdout.write(self.style.SUCCESS(f'Flushed {views} views across {posts} posts'))
@@ -0,0 +1,56 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from blog import response_cache
+from blog.corpus import CORPUS_PASSWORD, CorpusGenerator, delete_corpus
+from blog.models import refresh_author_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-create a synthetic corpus of users, profiles, categories, posts '
+        f'and comments for benchmarks. Every user\'s password is "{CORPUS_PASSWORD}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors', type=int, default=100, help='How many of the users are authors.')
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--comments-per-post', type=float, default=5, help='Average; exponentially distributed.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='corpus', help='Prefix of every generated username and slug.')
+        parser.add_argument('--clear', action='store_true', help='Delete a previous corpus with this prefix first.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        users = User.objects.filter(username__startswith=f'{prefix}-user-')
+        if options['clear']:
+            # Posts and comments go with their users, in chunks and without
+            # signals; stats and the response cache are refreshed at the end
+            deleted = delete_corpus(prefix, options['batch_size'])
+            self.stdout.write(f'Deleted {deleted} rows of the previous "{prefix}" corpus')
+        elif users.exists():
+            raise CommandError(f'A "{prefix}" corpus already exists; pass --clear or another --prefix.')
+
+        generator = CorpusGenerator(
+            prefix=prefix, seed=options['seed'], batch_size=options['batch_size'], log=self.stdout.write,
+        )
+        with transaction.atomic():
+            counts = generator.generate(
+                users=options['users'],
+                authors=min(options['authors'], options['users']),
+                categories=options['categories'],
+                posts=options['posts'],
+                comments_per_post=options['comments_per_post'],
+            )
+            # bulk_create skips the signals that maintain these; the search
+            # index is kept in sync by the database itself.
+            # --clear may have removed comments on other authors' posts
+            refresh_author_stats(None if options['clear'] else users.values('pk'))
+        response_cache.bump(*response_cache.RANKING_SCOPES)
+        self.stdout.write(self.style.SUCCESS(
+            'Generated ' + ', '.join(f'{count} {name}' for name, count in counts.items())
+        ))
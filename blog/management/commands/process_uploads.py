@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from blog.uploads import process_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Store staged image uploads and make their WebP variants. Run with '
+        '--loop as the upload worker process (instead of UPLOAD_WORKER_THREAD).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new uploads.')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls with --loop.')
+        parser.add_argument('--limit', type=int, help='Uploads per run.')
+
+    def handle(self, *args, **options):
+        while True:
+            done, failed = process_pending(limit=options['limit'])
+            if done or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Processed {done} uploads, {failed} failed'))
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
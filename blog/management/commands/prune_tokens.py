@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from blog.token_blacklist import prune_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired refresh tokens from the token_blacklist outstanding and '
+        'blacklisted tables in short transactions of --chunk-size rows. A '
+        'chunked replacement for flushexpiredtokens, which deletes everything '
+        'in one statement.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Tokens deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks.')
+
+    def handle(self, *args, **options):
+        outstanding = blacklisted = 0
+        for chunk_outstanding, chunk_blacklisted in prune_expired(options['chunk_size'], options['pause']):
+            outstanding += chunk_outstanding
+            blacklisted += chunk_blacklisted
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Deleted {chunk_outstanding} tokens ({chunk_blacklisted} blacklisted)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {outstanding} expired tokens ({blacklisted} blacklisted)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import refresh_author_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized UserProfile post/view/comment totals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user_ids', nargs='*', type=int, help='Only these users (default: everyone).')
+
+    def handle(self, *args, **options):
+        updated = refresh_author_stats(options['user_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled stats for {updated} profiles'))
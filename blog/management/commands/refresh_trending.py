@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.trending import refresh_rankings
+from blog.view_counts import view_counter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the time-decayed popular/trending rankings from hourly view buckets. Run periodically.'
+
+    def handle(self, *args, **options):
+        view_counter.flush()
+        ranked = refresh_rankings()
+        summary = ', '.join(f'{window}: {count}' for window, count in ranked.items())
+        self.stdout.write(self.style.SUCCESS(f'Ranked posts ({summary})'))
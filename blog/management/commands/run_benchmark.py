@@ -0,0 +1,258 @@
+import itertools
+import json
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from blog.corpus import CORPUS_PASSWORD
+from blog.models import Category, Comment, Post
+from blog.view_counts import view_counter
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def route_names(patterns=None, prefix='blog'):
+    """URL names of every route the blog app serves."""
+    names = set()
+    for pattern in patterns if patterns is not None else get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            module = getattr(pattern.urlconf_module, '__name__', '')
+            if patterns is None and not module.startswith(prefix):
+                continue
+            names |= route_names(pattern.url_patterns, prefix)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+class Scenarios:
+    """
+    One request factory per blog URL name: ``build(i)`` returns
+    (method, path, json body or None, authenticated) for iteration ``i``.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        posts = Post.objects.filter(published=True).order_by('-views')
+        self.slugs = list(posts.values_list('slug', flat=True)[:50]) or ['missing']
+        self.category = Category.objects.filter(posts__published=True).values_list('slug', flat=True).first()
+        self.comment = Comment.objects.filter(approved=True).values_list('pk', flat=True).first()
+        self.run = int(time.time())
+
+    def slug(self, i):
+        return self.slugs[i % len(self.slugs)]
+
+    def reads(self):
+        return {
+            'api-root': lambda i: ('GET', '/api/', None, False),
+            'home': lambda i: ('GET', '/api/home/', None, False),
+            'post-list': lambda i: ('GET', f'/api/posts/?page={1 + i % 5}', None, False),
+            'post-detail': lambda i: ('GET', f'/api/posts/{self.slug(i)}/', None, False),
+            'post-comments': lambda i: ('GET', f'/api/posts/{self.slug(i)}/comments/', None, False),
+            'post-my-posts': lambda i: ('GET', '/api/posts/my_posts/', None, True),
+            'post-featured': lambda i: ('GET', '/api/posts/featured/', None, False),
+            'post-by-category': lambda i: ('GET', f'/api/posts/by_category/?category={self.category}', None, False),
+            'post-popular': lambda i: ('GET', '/api/posts/popular/', None, False),
+            'post-trending': lambda i: ('GET', '/api/posts/trending/', None, False),
+            'category-list': lambda i: ('GET', '/api/categories/', None, False),
+            'category-detail': lambda i: ('GET', f'/api/categories/{self.category}/', None, False),
+            'comment-list': lambda i: ('GET', f'/api/comments/?post={self.slug(i)}', None, False),
+            'comment-detail': lambda i: ('GET', f'/api/comments/{self.comment}/', None, False),
+            'profile': lambda i: ('GET', '/api/profile/', None, True),
+            'health_check': lambda i: ('GET', '/api/health/', None, False),
+            'metrics': lambda i: ('GET', '/api/metrics/', None, False),
+        }
+
+    def writes(self):
+        password = CORPUS_PASSWORD
+        return {
+            'login': lambda i: ('POST', '/api/auth/login/', {'username': self.user.username, 'password': password}, False),
+            'register': lambda i: ('POST', '/api/auth/register/', {
+                'username': f'bench-{self.run}-{i}', 'email': f'bench-{self.run}-{i}@example.com',
+                'password': password, 'password2': password,
+            }, False),
+            'logout': lambda i: ('POST', '/api/auth/logout/', {'refresh_token': str(RefreshToken.for_user(self.user))}, True),
+            'token_refresh': lambda i: ('POST', '/api/auth/token/refresh/', {'refresh': str(RefreshToken.for_user(self.user))}, False),
+            'change_password': lambda i: ('PUT', '/api/auth/change-password/', {
+                'old_password': password, 'new_password': password,
+            }, True),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every blog route and print p50/p95/p99 latency, throughput and '
+        'queries per request as JSON. Uses the Django test client inside a '
+        'rolled-back transaction by default; --base-url targets a running '
+        'server instead (e.g. `gunicorn backend.wsgi -w 4`), where writes persist '
+        'and the server\'s throttles apply (start it with THROTTLE_ENABLED=False '
+        'for --writes). Run generate_corpus first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Requests per route.')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per route.')
+        parser.add_argument('--routes', help='Comma-separated URL names (default: all).')
+        parser.add_argument('--writes', action='store_true', help='Include login, register, logout, ...')
+        parser.add_argument('--no-response-cache', action='store_true', help='Measure with the response cache off (client mode only).')
+        parser.add_argument('--base-url', help='Benchmark a running server over HTTP.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Parallel requests (--base-url only).')
+        parser.add_argument('--username', help='User for authenticated routes (default: the first corpus author).')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        scenarios = Scenarios(user)
+        available = scenarios.reads()
+        if options['writes']:
+            available.update(scenarios.writes())
+        selected = options['routes'].split(',') if options['routes'] else sorted(available)
+        unknown = set(selected) - set(available)
+        if unknown:
+            raise CommandError(f'Unknown or excluded routes: {", ".join(sorted(unknown))}')
+
+        report = {
+            'commit': self.git_commit(),
+            'mode': 'http' if options['base_url'] else 'client',
+            'database': connection.vendor,
+            'response_cache': not options['no_response_cache'] and getattr(settings, 'RESPONSE_CACHE_ENABLED', False),
+            'corpus': {'posts': Post.objects.count(), 'comments': Comment.objects.count(), 'users': User.objects.count()},
+            'iterations': options['iterations'],
+            'routes': {},
+            'not_benchmarked': sorted(route_names() - set(selected)),
+        }
+        with override_settings(RESPONSE_CACHE_ENABLED=report['response_cache']):
+            if options['base_url']:
+                runner = HttpRunner(options['base_url'], user, options['concurrency'])
+                for name in selected:
+                    report['routes'][name] = runner.measure(available[name], options['warmup'], options['iterations'])
+            else:
+                runner = ClientRunner(user)
+                # Repeated logins and registrations would be throttled
+                with override_settings(THROTTLE_ENABLED=False), transaction.atomic():
+                    for name in selected:
+                        report['routes'][name] = runner.measure(available[name], options['warmup'], options['iterations'])
+                    # Buffered views would otherwise be written after the rollback
+                    view_counter.flush()
+                    transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.filter(profile__role='author', username__endswith='-user-0').first()
+        if user is None:
+            raise CommandError('No benchmark user; run generate_corpus or pass --username.')
+        return user
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+
+def summarize(method, timings, queries, errors, elapsed):
+    ordered = sorted(timings)
+    return {
+        'method': method,
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(ordered, 50), 2),
+        'p95_ms': round(percentile(ordered, 95), 2),
+        'p99_ms': round(percentile(ordered, 99), 2),
+        'mean_ms': round(sum(ordered) / len(ordered), 2),
+        'throughput_rps': round(len(timings) / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+class ClientRunner:
+    """In-process and sequential; counts queries per request."""
+
+    def __init__(self, user):
+        self.client = Client(HTTP_HOST='localhost')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def send(self, build, i):
+        method, path, body, authenticated = build(i)
+        extra = self.auth if authenticated else {}
+        kwargs = {'data': json.dumps(body), 'content_type': 'application/json'} if body is not None else {}
+        return getattr(self.client, method.lower())(path, secure=True, **kwargs, **extra)
+
+    def measure(self, build, warmup, iterations):
+        for i in range(warmup):
+            self.send(build, i)
+        timings, queries, errors = [], [], 0
+        for i in range(warmup, warmup + iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = self.send(build, i)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        return summarize(build(0)[0], timings, queries, errors, sum(timings) / 1000)
+
+
+class HttpRunner:
+    """Against a running server, ``concurrency`` requests at a time; query counts are not visible."""
+
+    def __init__(self, base_url, user, concurrency):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = max(1, concurrency)
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def send(self, build, i):
+        method, path, body, authenticated = build(i)
+        headers = dict(self.auth) if authenticated else {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as error:
+            status = error.code
+        return (time.perf_counter() - start) * 1000, status
+
+    def measure(self, build, warmup, iterations):
+        for i in range(warmup):
+            self.send(build, i)
+        counter = itertools.count(warmup)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            results = list(pool.map(lambda _: self.send(build, next(counter)), range(iterations)))
+        elapsed = time.perf_counter() - start
+        timings = [timing for timing, _ in results]
+        errors = sum(status >= 400 for _, status in results)
+        return summarize(build(0)[0], timings, [], errors, elapsed)
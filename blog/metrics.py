@@ -0,0 +1,238 @@
+"""
+In-process request metrics: per endpoint histograms of wall time, database
+queries, database time and serializer time, filled by
+RequestMetricsMiddleware and served by /api/metrics/ in the Prometheus text
+format along with connection pool stats. Every worker process keeps its own
+numbers.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.db import connections
+
+logger = logging.getLogger('blog.slow_queries')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# name, help, buckets, RequestStats attribute (or 'wall')
+HISTOGRAMS = (
+    ('devscribe_request_duration_seconds', 'Request wall time.', DURATION_BUCKETS, 'wall'),
+    ('devscribe_request_db_queries', 'Database queries per request.', QUERY_BUCKETS, 'queries'),
+    ('devscribe_request_db_duration_seconds', 'Database time per request.', DURATION_BUCKETS, 'db_time'),
+    ('devscribe_request_serializer_duration_seconds', 'Serializer time per request.', DURATION_BUCKETS, 'serializer_time'),
+)
+
+# name, type, help, value from psycopg_pool's ConnectionPool.get_stats()
+# (which leaves out zero counters)
+POOL_SERIES = (
+    ('devscribe_db_pool_connections', 'gauge', 'Connections open in the pool.',
+     lambda stats: stats.get('pool_size', 0)),
+    ('devscribe_db_pool_connections_in_use', 'gauge', 'Pooled connections lent to requests.',
+     lambda stats: stats.get('pool_size', 0) - stats.get('pool_available', 0)),
+    ('devscribe_db_pool_requests_waiting', 'gauge', 'Requests waiting for a connection.',
+     lambda stats: stats.get('requests_waiting', 0)),
+    ('devscribe_db_pool_requests_total', 'counter', 'Connections requested from the pool.',
+     lambda stats: stats.get('requests_num', 0)),
+    ('devscribe_db_pool_wait_seconds_total', 'counter', 'Time requests waited for a connection.',
+     lambda stats: stats.get('requests_wait_ms', 0) / 1000),
+    ('devscribe_db_pool_timeouts_total', 'counter', 'Requests that got no connection in time.',
+     lambda stats: stats.get('requests_errors', 0)),
+)
+
+_current = contextvars.ContextVar('blog_request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """
+    What one request spent. Optionally logs queries slower than
+    ``slow_query_threshold`` seconds, with the calling stack for a
+    ``stack_sample_rate`` share of them.
+    """
+
+    def __init__(self, path, slow_query_threshold=None, stack_sample_rate=0.0):
+        self.path = path
+        self.slow_query_threshold = slow_query_threshold
+        self.stack_sample_rate = stack_sample_rate
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+
+    def record_query(self, sql, elapsed):
+        self.queries += 1
+        self.db_time += elapsed
+        if self.slow_query_threshold is not None and elapsed >= self.slow_query_threshold:
+            self.log_slow_query(sql, elapsed)
+
+    def log_slow_query(self, sql, elapsed):
+        stack = ''
+        if random.random() < self.stack_sample_rate:
+            # Drop the ORM/driver frames below the caller
+            frames = [
+                frame for frame in traceback.extract_stack()[:-3]
+                if 'site-packages' not in frame.filename and '/django/' not in frame.filename
+            ]
+            stack = '\n' + ''.join(traceback.format_list(frames))
+        logger.warning('Slow query (%.1f ms) on %s: %s%s', elapsed * 1000, self.path, sql, stack)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    execute_wrapper installed on every connection: adds to the current
+    request's stats. The request is found through a context variable, so
+    queries run by the async ORM in worker threads are counted too.
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver, connected by BlogConfig.ready when METRICS_ENABLED."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def start_request(stats):
+    return _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+@contextmanager
+def timed_serialization():
+    """Adds the time spent inside to the request's serializer time, unless nested in another."""
+    stats = _current.get()
+    if stats is None or stats.serializing:
+        yield
+        return
+    stats.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+        stats.serializing = False
+
+
+class TimedSerializerMixin:
+    """Adds time spent in the outermost to_representation() to the request's serializer time."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = {}
+
+    def observe(self, endpoint, method, status, wall, stats):
+        with self._lock:
+            key = (endpoint, method)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    attribute: Histogram(buckets) for _, _, buckets, attribute in HISTOGRAMS
+                }
+            for attribute, histogram in series.items():
+                histogram.observe(wall if attribute == 'wall' else getattr(stats, attribute))
+            status_key = (endpoint, method, status)
+            self._requests[status_key] = self._requests.get(status_key, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._requests.clear()
+
+    def render(self):
+        lines = [
+            '# HELP devscribe_requests_total Requests by endpoint, method and status.',
+            '# TYPE devscribe_requests_total counter',
+        ]
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                labels = _labels(endpoint=endpoint, method=method, status=status)
+                lines.append(f'devscribe_requests_total{{{labels}}} {count}')
+
+            for name, help_text, buckets, attribute in HISTOGRAMS:
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (endpoint, method), series in sorted(self._series.items()):
+                    histogram = series[attribute]
+                    labels = _labels(endpoint=endpoint, method=method)
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else _number(float(bound))
+                        lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {_number(histogram.sum)}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def render_counter(name, help_text, value):
+    return f'# HELP {name} {help_text}\n# TYPE {name} counter\n{name} {_number(value)}\n'
+
+
+def pool_stats():
+    """{alias: stats} of this process's connection pools (DATABASE_POOL)."""
+    return {
+        alias: connections[alias].pool.get_stats()
+        for alias in connections
+        if connections.settings[alias].get('OPTIONS', {}).get('pool')
+    }
+
+
+def render_pool_stats(stats):
+    if not stats:
+        return ''
+    lines = []
+    for name, kind, help_text, value in POOL_SERIES:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for alias, pool in sorted(stats.items()):
+            lines.append(f'{name}{{{_labels(alias=alias)}}} {_number(value(pool))}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,109 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+from . import db_router, metrics
+
+
+def endpoint_name(request):
+    """The resolved URL name (post-list, post-detail, login, ...), bounded for unmatched paths."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.url_name or match.route or 'unnamed'
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, query count, database time and serializer time of
+    each request into ``metrics.registry``. Only installed when
+    METRICS_ENABLED is on, so turning it off costs nothing. Works in both
+    the WSGI and the ASGI handler.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        threshold_ms = getattr(settings, 'SLOW_QUERY_LOG_MS', None)
+        self.slow_query_threshold = threshold_ms / 1000 if threshold_ms is not None else None
+        self.stack_sample_rate = getattr(settings, 'SLOW_QUERY_STACK_SAMPLE_RATE', 0.1)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = metrics.RequestStats(request.path, self.slow_query_threshold, self.stack_sample_rate)
+        token = metrics.start_request(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.observe(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats(request.path, self.slow_query_threshold, self.stack_sample_rate)
+        token = metrics.start_request(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self.observe(request, response, stats, start)
+
+    def observe(self, request, response, stats, start):
+        metrics.registry.observe(
+            endpoint_name(request), request.method, response.status_code,
+            time.perf_counter() - start, stats,
+        )
+        return response
+
+
+class ReplicaPinMiddleware:
+    """
+    Tracks each request's database routing for db_router.ReplicaRouter:
+    whether it may read from a replica and whether it wrote (which pins the
+    client to the primary). Only installed when DATABASE_REPLICA_URLS is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        key = db_router.pin_key(request)
+        token = db_router.start_request(pinned=cache.get(key) is not None)
+        response = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if db_router.end_request(request, response, token):
+                cache.set(key, 1, db_router.pin_seconds())
+        return response
+
+    async def __acall__(self, request):
+        key = db_router.pin_key(request)
+        token = db_router.start_request(pinned=await cache.aget(key) is not None)
+        response = None
+        try:
+            response = await self.get_response(request)
+        finally:
+            if db_router.end_request(request, response, token):
+                await cache.aset(key, 1, db_router.pin_seconds())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        db_router.route_view(request, view_func)
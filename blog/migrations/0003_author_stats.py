@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_author_stats(apps, schema_editor):
+    UserProfile = apps.get_model('blog', 'UserProfile')
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+
+    published = Post.objects.filter(author=OuterRef('user'), published=True).order_by().values('author')
+    comments = (
+        Comment.objects.filter(post__author=OuterRef('user'), post__published=True, approved=True)
+        .order_by().values('post__author')
+    )
+    UserProfile.objects.update(
+        total_posts=Coalesce(Subquery(published.annotate(n=Count('pk')).values('n')), 0),
+        total_views=Coalesce(Subquery(published.annotate(n=Sum('views')).values('n')), 0),
+        total_comments=Coalesce(Subquery(comments.annotate(n=Count('pk')).values('n')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_comment_user_userprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_comments',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_posts',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='total_views',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_author_stats, migrations.RunPython.noop),
+    ]
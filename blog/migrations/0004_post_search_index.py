@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:03
+
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from blog.search import get_search_engine
+    engine = get_search_engine(schema_editor.connection.alias)
+    if engine is not None:
+        engine.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from blog.search import get_search_engine
+    engine = get_search_engine(schema_editor.connection.alias)
+    if engine is not None:
+        engine.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_author_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 hours'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')], max_length=3)),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='blog.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', '-score'], name='blog_ranking_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'window'), name='unique_post_ranking')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blog.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='blog_viewbucket_hour_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'hour'), name='unique_post_view_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_trending'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # RegisterSerializer.validate looks users up by email, which
+        # django.contrib.auth leaves unindexed.
+        migrations.RunSQL(
+            'CREATE INDEX blog_auth_user_email_idx ON auth_user (email)',
+            'DROP INDEX blog_auth_user_email_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['post', '-created_at', '-id'], name='blog_comment_post_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['-created_at', '-id'], name='blog_comment_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('published', True)), fields=['-created_at', '-id'], name='blog_post_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='blog_post_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('published', True)), fields=['category', '-created_at'], name='blog_post_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('featured', True), ('published', True)), fields=['-created_at'], name='blog_post_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('published', True)), fields=['-views'], name='blog_post_views_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.CreateModel(
+            name='PendingUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(max_length=30)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('staged_name', models.CharField(max_length=255)),
+                ('original_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='blog_upload_status_idx')],
+            },
+        ),
+    ]
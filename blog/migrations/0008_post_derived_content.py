@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_image_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='reading_time',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='summary',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,14 @@
-from django.db import models
+from collections import defaultdict
+from functools import partial
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils.text import slugify
-from django.db.models.signals import post_save
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from . import content as post_content
+from .signals import views_flushed
 
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -14,28 +20,33 @@ class UserProfile(models.Model):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='reader')
     bio = models.TextField(blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # {width: storage name} of the WebP copies made by the upload worker
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     website = models.URLField(blank=True)
     location = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    def __str__(self):
-        return f"{self.user.username} - {self.role}"
+    # Denormalized author statistics, kept up to date by the signals below.
+    # `manage.py reconcile_author_stats` recomputes them from scratch.
+    total_posts = models.PositiveIntegerField(default=0, editable=False)
+    total_views = models.PositiveBigIntegerField(default=0, editable=False)
+    total_comments = models.PositiveIntegerField(default=0, editable=False)
     
-    @property
-    def total_posts(self):
-        return self.user.posts.filter(published=True).count()
+    STAT_FIELDS = ('total_posts', 'total_views', 'total_comments')
     
-    @property
-    def total_views(self):
-        return sum(post.views for post in self.user.posts.filter(published=True))
+    def __str__(self):
+        return f"{self.user.username} - {self.role}"
     
-    @property
-    def total_comments(self):
-        total = 0
-        for post in self.user.posts.filter(published=True):
-            total += post.comments.filter(approved=True).count()
-        return total
+    def save(self, *args, **kwargs):
+        # Never write back stale counters loaded with the instance; they are
+        # only changed through queryset updates.
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.STAT_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
 # Signal to create profile automatically
 @receiver(post_save, sender=User)
@@ -65,6 +76,26 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class PostQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Join author/category and precompute the counts list serializers need."""
+        # Correlated subqueries rather than a JOIN + GROUP BY, so the row set
+        # and the default ordering are left untouched.
+        comment_count = (
+            Comment.objects.filter(post=OuterRef('pk'), approved=True)
+            .order_by().values('post')
+            .annotate(count=Count('pk')).values('count')
+        )
+        category_post_count = (
+            Post.objects.filter(category=OuterRef('category'), published=True)
+            .order_by().values('category')
+            .annotate(count=Count('pk')).values('count')
+        )
+        return self.select_related('author', 'category').annotate(
+            comment_count=Coalesce(Subquery(comment_count), 0),
+            category_post_count=Coalesce(Subquery(category_post_count), 0),
+        )
+
 class Post(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
@@ -73,18 +104,57 @@ class Post(models.Model):
     excerpt = models.TextField(max_length=300, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='posts')
     image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # {width: storage name} of the WebP copies made by the upload worker
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     published = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     views = models.IntegerField(default=0)
+    # Derived from content and excerpt on save (blog/content.py)
+    content_html = models.TextField(blank=True, editable=False)
+    summary = models.TextField(blank=True, editable=False)  # the excerpt, or one made from the content
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    reading_time = models.PositiveSmallIntegerField(default=0, editable=False)  # minutes
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+    
+    objects = PostQuerySet.as_manager()
     
     class Meta:
         ordering = ['-created_at']
+        # Partial indexes on the boolean flags: Django filters booleans as
+        # bare `WHERE published`, which matches a partial index predicate but
+        # can't seek on a leading boolean column in SQLite.
+        indexes = [
+            # list / keyset pages: WHERE published ORDER BY created_at DESC, id DESC
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(published=True),
+                name='blog_post_published_idx',
+            ),
+            # my_posts, author stats
+            models.Index(fields=['author', '-created_at', '-id'], name='blog_post_author_idx'),
+            models.Index(
+                fields=['category', '-created_at'], condition=Q(published=True),
+                name='blog_post_category_idx',
+            ),
+            models.Index(
+                fields=['-created_at'], condition=Q(featured=True, published=True),
+                name='blog_post_featured_idx',
+            ),
+            models.Index(fields=['-views'], condition=Q(published=True), name='blog_post_views_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # A partial instance (.only()) saves its loaded fields only
+            if not set(post_content.SOURCE_FIELDS) & self.get_deferred_fields():
+                post_content.process(self)
+        elif set(post_content.SOURCE_FIELDS) & set(update_fields):
+            post_content.process(self)
+            kwargs['update_fields'] = {*update_fields, *post_content.DERIVED_FIELDS}
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -101,6 +171,130 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['post', '-created_at', '-id'], condition=Q(approved=True),
+                name='blog_comment_post_idx',
+            ),
+            models.Index(
+                fields=['-created_at', '-id'], condition=Q(approved=True),
+                name='blog_comment_approved_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f'Comment by {self.name} on {self.post.title}'
+
+
+# Author statistics
+def refresh_author_stats(user_ids=None):
+    """
+    Recompute UserProfile.total_* with a single UPDATE. ``user_ids`` may be a
+    list or a queryset of user ids; ``None`` refreshes every profile.
+    """
+    published = Post.objects.filter(author=OuterRef('user'), published=True).order_by().values('author')
+    comments = (
+        Comment.objects.filter(post__author=OuterRef('user'), post__published=True, approved=True)
+        .order_by().values('post__author')
+    )
+    profiles = UserProfile.objects.all()
+    if user_ids is not None:
+        profiles = profiles.filter(user__in=user_ids)
+    return profiles.update(
+        total_posts=Coalesce(Subquery(published.annotate(n=Count('pk')).values('n')), 0),
+        total_views=Coalesce(Subquery(published.annotate(n=Sum('views')).values('n')), 0),
+        total_comments=Coalesce(Subquery(comments.annotate(n=Count('pk')).values('n')), 0),
+    )
+
+def _refresh_after_commit(user_ids):
+    transaction.on_commit(partial(refresh_author_stats, user_ids))
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def update_author_stats_for_post(sender, instance, **kwargs):
+    _refresh_after_commit([instance.author_id])
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def update_author_stats_for_comment(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Post):
+        return  # cascade from a post delete; that post's signal covers it
+    _refresh_after_commit(Post.objects.filter(pk=instance.post_id).values('author'))
+
+@receiver(views_flushed)
+def add_flushed_views_to_author_stats(sender, counts, **kwargs):
+    per_author = defaultdict(int)
+    for pk, author_id in Post.objects.filter(pk__in=counts, published=True).order_by().values_list('pk', 'author_id'):
+        per_author[author_id] += counts[pk]
+    by_increment = defaultdict(list)
+    for author_id, n in per_author.items():
+        by_increment[n].append(author_id)
+    for n, author_ids in by_increment.items():
+        UserProfile.objects.filter(user__in=author_ids).update(total_views=F('total_views') + n)
+
+
+# Trending
+class PostViewBucket(models.Model):
+    """Views per post per hour, written by the view-count flush."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_buckets')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='unique_post_view_bucket'),
+        ]
+        indexes = [models.Index(fields=['hour'], name='blog_viewbucket_hour_idx')]
+    
+    def __str__(self):
+        return f'{self.post_id} @ {self.hour:%Y-%m-%d %H}:00 - {self.views}'
+
+class PostRanking(models.Model):
+    """Time-decayed view score per post and window, rebuilt by `manage.py refresh_trending`."""
+    WINDOW_CHOICES = [
+        ('24h', 'Last 24 hours'),
+        ('7d', 'Last 7 days'),
+        ('30d', 'Last 30 days'),
+    ]
+    
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='rankings')
+    window = models.CharField(max_length=3, choices=WINDOW_CHOICES)
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'window'], name='unique_post_ranking'),
+        ]
+        indexes = [models.Index(fields=['window', '-score'], name='blog_ranking_top_idx')]
+    
+    def __str__(self):
+        return f'{self.post_id} {self.window}: {self.score:.2f}'
+
+
+# Uploads
+class PendingUpload(models.Model):
+    """An image staged on local disk, waiting for the upload worker (blog/uploads.py)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    target = models.CharField(max_length=30)  # a key of uploads.TARGETS, e.g. 'post.image'
+    object_id = models.PositiveBigIntegerField()
+    staged_name = models.CharField(max_length=255)
+    original_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='blog_upload_status_idx')]
     
     def __str__(self):
-        return f'Comment by {self.name} on {self.post.title}'
\ No newline at end of file
+        return f'{self.target} {self.object_id}: {self.status}'
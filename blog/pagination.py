@@ -0,0 +1,112 @@
+import base64
+from datetime import datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PageSizePagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first cursor pagination on (created_at, id).
+
+    Each page is an index range scan from the previous page's last row, so
+    deep pages cost the same as the first one and no COUNT is run. Forward
+    only; any other ordering on the queryset is replaced.
+    """
+
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-created_at', '-pk')
+        position = self.decode_cursor(request)
+        if position is not None:
+            created_at, pk = position
+            # created_at <= X is the index range to seek on; the exclude
+            # drops the rows of the previous page that share that timestamp.
+            queryset = queryset.filter(created_at__lte=created_at).exclude(
+                created_at=created_at, pk__gte=pk
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        page = rows[:self.page_size]
+        self.next_position = self.position(page[-1]) if len(rows) > self.page_size else None
+        return page
+
+    def position(self, row):
+        # Instances, or .values() rows for the fast list serializers
+        if isinstance(row, dict):
+            return row['created_at'], row['id']
+        return row.created_at, row.pk
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            decoded = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            created_at, pk = decoded.rsplit('|', 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        created_at, pk = position
+        raw = f'{created_at.isoformat()}|{pk}'
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'pagination')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class PostPagination(BasePagination):
+    """
+    Page numbers by default (``count``/``next``/``previous``) so existing
+    clients keep working; ``?pagination=cursor`` or a ``?cursor=`` switches
+    to KeysetPagination.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        wants_cursor = (
+            request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+        self.paginator = KeysetPagination() if wants_cursor else PageSizePagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return PageSizePagination().get_paginated_response_schema(schema)
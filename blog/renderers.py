@@ -0,0 +1,31 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional: JSONRenderer's output, just slower
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer's output (compact, UTF-8, U+2028/U+2029 escaped for
+    JavaScript) encoded by orjson when it is installed. Anything orjson
+    doesn't handle natively goes through the same encoder as JSONRenderer;
+    indented output and non-default JSON settings fall back to JSONRenderer.
+    Only floats may be written differently (1e16 vs. 1e+16); the API
+    doesn't return any.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact or not self.strict
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except TypeError:  # e.g. non-string keys
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,233 @@
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from . import db_router
+from .models import Category, Comment, Post
+
+# Everything a public post payload embeds: the post itself, its category,
+# approved comment counts and the author's user fields.
+POST_SCOPES = ('post', 'category', 'comment', 'user')
+CATEGORY_SCOPES = ('category', 'post')
+RANKING_SCOPES = POST_SCOPES + ('ranking',)
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def is_enabled():
+    return getattr(settings, 'RESPONSE_CACHE_ENABLED', False)
+
+
+def conditional_get_enabled():
+    return getattr(settings, 'CONDITIONAL_GET_ENABLED', False)
+
+
+def _generation_key(scope):
+    return f'blog:gen:{scope}'
+
+
+def _modified_key(scope):
+    return f'blog:mtime:{scope}'
+
+
+def _get_or_seed(keys, seed):
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, seed(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def get_generations(scopes):
+    # Seeded from the clock so a counter that was evicted never comes back
+    # with a value an old cache entry was stored under.
+    return _get_or_seed([_generation_key(scope) for scope in scopes], time.time_ns)
+
+
+def get_last_modified(scopes):
+    """Unix time of the latest write to any of ``scopes``."""
+    # Unknown (never bumped, or evicted) counts as "just now", which only
+    # costs clients a full response.
+    return max(_get_or_seed([_modified_key(scope) for scope in scopes], time.time))
+
+
+def _bump(scopes):
+    now = time.time()
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+        cache.set(_modified_key(scope), now, timeout=None)
+
+
+def bump(*scopes):
+    """Invalidate every cached response that depends on any of ``scopes``."""
+    _bump(scopes)
+    # Again after commit: a concurrent request may have cached the pre-commit
+    # rows under the new generation in between.
+    transaction.on_commit(functools.partial(_bump, scopes))
+
+
+def make_key(request, name, scopes):
+    user = request.user
+    variance = f'u{user.pk}' if user.is_authenticated else 'anon'
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(f'{request.get_host()}|{params}'.encode()).hexdigest()
+    generations = '.'.join(str(g) for g in get_generations(scopes))
+    return f'blog:resp:{name}:{variance}:{generations}:{digest}'
+
+
+class Validators:
+    """
+    ETag and Last-Modified for one response variant, known before anything
+    is serialized: the ETag hashes the cache key (so the scope generations,
+    user and query params), Last-Modified is the scopes' latest write.
+    Both are left out unless CONDITIONAL_GET_ENABLED.
+    """
+
+    def __init__(self, key, scopes):
+        self.enabled = conditional_get_enabled()
+        if self.enabled:
+            self.etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+            self.last_modified = int(get_last_modified(scopes))
+
+    def not_modified(self, request):
+        """A 304 if the request's If-None-Match / If-Modified-Since still match, else None."""
+        if not self.enabled:
+            return None
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        if self.enabled:
+            response['ETag'] = self.etag
+            response['Last-Modified'] = http_date(self.last_modified)
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+def fetch(key):
+    """The data cached under ``key``, or None; counted in stats()."""
+    data = cache.get(key)
+    _record('hits' if data is not None else 'misses')
+    return data
+
+
+def store(key, data, scopes):
+    # A replica may not have applied a write made in the last few seconds
+    # yet; rows read from it mustn't be cached under the new generation.
+    if db_router.used_replica() and time.time() - get_last_modified(scopes) < db_router.pin_seconds():
+        return
+    cache.set(key, data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60))
+
+
+def get_or_set(request, name, scopes, compute, key=None):
+    """Cached ``compute()`` for this request's variant of ``name``."""
+    if not is_enabled():
+        return compute()
+    key = key or make_key(request, name, scopes)
+    data = fetch(key)
+    if data is None:
+        data = compute()
+        store(key, data, scopes)
+    return data
+
+
+def action_name(view_class_name, action, kwargs):
+    """The cache name of a viewset action; shared by the sync and async views."""
+    return f'{view_class_name}.{action}:{sorted(kwargs.items())}'
+
+
+def cache_response(*scopes):
+    """
+    Cache a viewset action's successful GET response data. Keyed by the
+    action, URL kwargs, query params, host and user (anonymous vs. each user,
+    since ``is_author`` and drafts depend on it), plus the generation of each
+    scope so writes invalidate immediately.
+
+    With CONDITIONAL_GET_ENABLED, successful responses carry an ETag and
+    Last-Modified, and a conditional request that still matches gets a 304
+    without running the action.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method != 'GET':
+                return method(view, request, *args, **kwargs)
+
+            name = action_name(type(view).__name__, method.__name__, kwargs)
+            key = make_key(request, name, scopes)
+            validators = Validators(key, scopes)
+            response = validators.not_modified(request)
+            if response is not None:
+                return response
+
+            if not is_enabled():
+                response = method(view, request, *args, **kwargs)
+            elif (data := fetch(key)) is not None:
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+            else:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code == 200:
+                    store(key, response.data, scopes)
+                response['X-Cache'] = 'MISS'
+            if response.status_code == 200:
+                validators.apply(response)
+            patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_posts(sender, **kwargs):
+    bump('post')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, **kwargs):
+    bump('category')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, **kwargs):
+    bump('comment')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_users(sender, **kwargs):
+    bump('user')
@@ -0,0 +1,182 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+
+class SearchEngine:
+    """
+    Full-text search over Post title / excerpt / content.
+
+    ``search()`` filters a Post queryset to the matches and annotates
+    ``search_rank`` (higher is better).
+    """
+
+    def install(self, connection):
+        """Create the index structures if they are missing."""
+
+    def uninstall(self, connection):
+        """Drop the index structures."""
+
+    def rebuild(self, connection):
+        """Re-index every post."""
+
+    def search(self, queryset, text):
+        raise NotImplementedError
+
+
+class PostgresSearchEngine(SearchEngine):
+    """Stored, weighted tsvector column (title A, excerpt B, content C) with a GIN index."""
+
+    def search(self, queryset, text):
+        return queryset.extra(
+            select={'search_rank': "ts_rank(blog_post.search_vector, websearch_to_tsquery('english', %s))"},
+            select_params=[text],
+            where=["blog_post.search_vector @@ websearch_to_tsquery('english', %s)"],
+            params=[text],
+        ).order_by('-search_rank', '-created_at')
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                ALTER TABLE blog_post ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(excerpt, '')), 'B') ||
+                    setweight(to_tsvector('english', coalesce(content, '')), 'C')
+                ) STORED
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS blog_post_search_idx ON blog_post USING GIN (search_vector)"
+            )
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS blog_post_search_idx")
+            cursor.execute("ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector")
+
+    def rebuild(self, connection):
+        pass  # generated column, always in sync
+
+
+class SQLiteSearchEngine(SearchEngine):
+    """
+    External-content FTS5 table kept in sync by triggers. bm25 weights
+    title > excerpt > content.
+    """
+
+    def search(self, queryset, text):
+        query = self.prepare_query(text)
+        if not query:
+            return queryset.none()
+        # A join rather than pk__in/correlated subqueries: MATCH runs once and
+        # bm25() is computed only for the matching rows.
+        return queryset.extra(
+            select={'search_rank': '-bm25(blog_post_fts, 10.0, 4.0, 1.0)'},
+            tables=['blog_post_fts'],
+            where=['blog_post_fts.rowid = blog_post.id', 'blog_post_fts MATCH %s'],
+            params=[query],
+        ).order_by('-search_rank', '-created_at')
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'blog_post_fts'"
+            )
+            created = cursor.fetchone() is None
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5(
+                    title, excerpt, content,
+                    content='blog_post', content_rowid='id', tokenize='porter unicode61'
+                )
+            """)
+            # Table rebuilds done by SQLite schema changes drop these, so they
+            # are re-created after every migrate (see BlogConfig.ready).
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS blog_post_fts_ai AFTER INSERT ON blog_post BEGIN
+                    INSERT INTO blog_post_fts(rowid, title, excerpt, content)
+                    VALUES (new.id, new.title, new.excerpt, new.content);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS blog_post_fts_ad AFTER DELETE ON blog_post BEGIN
+                    INSERT INTO blog_post_fts(blog_post_fts, rowid, title, excerpt, content)
+                    VALUES ('delete', old.id, old.title, old.excerpt, old.content);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS blog_post_fts_au
+                AFTER UPDATE OF title, excerpt, content ON blog_post BEGIN
+                    INSERT INTO blog_post_fts(blog_post_fts, rowid, title, excerpt, content)
+                    VALUES ('delete', old.id, old.title, old.excerpt, old.content);
+                    INSERT INTO blog_post_fts(rowid, title, excerpt, content)
+                    VALUES (new.id, new.title, new.excerpt, new.content);
+                END
+            """)
+        if created:
+            self.rebuild(connection)
+
+    def uninstall(self, connection):
+        with connection.cursor() as cursor:
+            for trigger in ('blog_post_fts_ai', 'blog_post_fts_ad', 'blog_post_fts_au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            cursor.execute("DROP TABLE IF EXISTS blog_post_fts")
+
+    def rebuild(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO blog_post_fts(blog_post_fts) VALUES ('rebuild')")
+
+    def prepare_query(self, text):
+        # Quote every token so user input can't use FTS5 query syntax; the
+        # last one is a prefix match for search-as-you-type.
+        tokens = re.findall(r'\w+', text)
+        if not tokens:
+            return ''
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+
+ENGINES = {
+    'postgresql': PostgresSearchEngine,
+    'sqlite': SQLiteSearchEngine,
+}
+
+
+def get_search_engine(using='default'):
+    """The engine for a database alias, or None to fall back to icontains."""
+    path = getattr(settings, 'POST_SEARCH_ENGINE', None)
+    if path == '':
+        return None
+    if path:
+        return import_string(path)()
+    engine_class = ENGINES.get(connections[using].vendor)
+    return engine_class() if engine_class else None
+
+
+def install_search_index(using='default', **kwargs):
+    """post_migrate hook: (re)create the index once its migration is applied."""
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    engine = get_search_engine(using)
+    if engine is not None and ('blog', '0004_post_search_index') in applied:
+        engine.install(connection)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ``?search=`` backed by the database's full-text index, ranked by relevance
+    unless ``?ordering=`` is given. Falls back to SearchFilter's icontains.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        engine = get_search_engine(queryset.db)
+        if engine is None:
+            return super().filter_queryset(request, queryset, view)
+        return engine.search(queryset, text)
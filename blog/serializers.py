@@ -1,33 +1,69 @@
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.utils.urls import replace_query_param
 from .models import Post, Category, Comment, UserProfile
+from . import uploads
+from .metrics import TimedSerializerMixin
+from .pagination import KeysetPagination
+from .sparse_fields import SparseFieldsSerializerMixin
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 
 
+def image_srcset(request, storage, variants):
+    """``<url> 320w, <url> 640w, ...`` for the WebP variants the upload worker made, or None."""
+    if not variants:
+        return None
+    return ', '.join(
+        f'{request.build_absolute_uri(storage.url(name))} {width}w'
+        for width, name in sorted(variants.items(), key=lambda item: int(item[0]))
+    )
+
+
+def pop_upload(validated_data, field_name):
+    """
+    Take a new image out of ``validated_data``; the caller stages it for the
+    upload worker once the instance is saved. Clearing the image also drops
+    its variants; the caller cancels its pending upload.
+    """
+    image = validated_data.get(field_name)
+    if image:
+        del validated_data[field_name]
+    elif field_name in validated_data:
+        validated_data[f'{field_name}_variants'] = {}
+    return image
+
+
 # ================= USER =================
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     first_name = serializers.CharField(source='user.first_name')
     last_name = serializers.CharField(source='user.last_name')
+    avatar_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = UserProfile
         fields = [
             'id','username','email','first_name','last_name','role',
-            'bio','avatar','website','location',
+            'bio','avatar','avatar_srcset','website','location',
             'total_posts','total_views','total_comments','created_at'
         ]
         read_only_fields = ['role','total_posts','total_views','total_comments']
 
+    def get_avatar_srcset(self, obj):
+        request = self.context.get('request')
+        return image_srcset(request, obj.avatar.storage, obj.avatar_variants) if request and obj.avatar else None
+
     def update(self, instance, validated_data):
+        avatar = pop_upload(validated_data, 'avatar')
         user_data = validated_data.pop('user', {})
 
         if user_data:
@@ -36,7 +72,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
             user.last_name = user_data.get('last_name', user.last_name)
             user.save()
 
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        if avatar:
+            uploads.stage(instance, 'avatar', avatar)
+        elif 'avatar' in validated_data:
+            uploads.cancel(instance, 'avatar')
+        return instance
 
 
 # ================= AUTH =================
@@ -77,7 +118,7 @@ class ChangePasswordSerializer(serializers.Serializer):
 
 # ================= CATEGORY =================
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     post_count = serializers.SerializerMethodField()
 
     class Meta:
@@ -85,15 +126,30 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ['id','name','slug','description','post_count','created_at']
 
     def get_post_count(self, obj):
-        # SAFE: no assumptions about fields
-        return obj.posts.count()
+        # Annotated by CategoryViewSet / Post.objects.with_counts()
+        count = getattr(obj, 'post_count', None)
+        if count is None:
+            count = obj.posts.filter(published=True).count()
+        return count
 
 
 # ================= COMMENTS =================
 
-class CommentSerializer(serializers.ModelSerializer):
+class PostSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Post
+        fields = ['id','title','slug']
+
+
+class CommentSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     user_name = serializers.SerializerMethodField()
 
+    # ?expand=post nests the post summary instead of its id
+    expandable_fields = {'post': lambda: PostSummarySerializer(read_only=True)}
+    field_columns = {'user_name': ('user__username', 'name')}
+    expanded_columns = {'post': ('post__id', 'post__title', 'post__slug')}
+    required_columns = ('id', 'created_at')
+
     class Meta:
         model = Comment
         fields = [
@@ -108,39 +164,81 @@ class CommentSerializer(serializers.ModelSerializer):
 
 # ================= POSTS =================
 
-class PostListSerializer(serializers.ModelSerializer):
+# Model columns read by each post serializer field, for ?fields= trimming
+POST_FIELD_COLUMNS = {
+    'author': ('author__id', 'author__username', 'author__first_name', 'author__last_name', 'author__email'),
+    'category': ('category__id', 'category__name', 'category__slug', 'category__description', 'category__created_at'),
+    'image': ('image', 'image_variants'),
+    'image_srcset': ('image', 'image_variants'),
+    'comment_count': (),
+    'comments': (),
+    'comments_next': (),
+    'is_author': (),
+}
+POST_REQUIRED_COLUMNS = ('id', 'slug', 'author', 'created_at')
+
+
+class PostListSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     comment_count = serializers.SerializerMethodField()
     is_author = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = [
-            'id','title','slug','author','excerpt','category',
-            'image','created_at','updated_at',
-            'featured','views','comment_count','is_author'
+            'id','title','slug','author','excerpt','summary','reading_time',
+            'word_count','category','image','image_srcset','created_at',
+            'updated_at','featured','views','comment_count','is_author'
         ]
 
+    # The article body is left out of lists unless asked for with ?expand=content
+    expandable_fields = {'content': lambda: serializers.CharField(read_only=True)}
+    field_columns = POST_FIELD_COLUMNS
+    required_columns = POST_REQUIRED_COLUMNS
+
     def get_image(self, obj):
+        # Lists show the smallest WebP variant once the upload worker made them
         request = self.context.get('request')
         if obj.image:
-            return request.build_absolute_uri(obj.image.url)
+            variants = obj.image_variants
+            name = variants[min(variants, key=int)] if variants else obj.image.name
+            return request.build_absolute_uri(obj.image.storage.url(name))
         return None
 
+    def get_image_srcset(self, obj):
+        if not obj.image:
+            return None
+        return image_srcset(self.context.get('request'), obj.image.storage, obj.image_variants)
+
+    def to_representation(self, instance):
+        if 'category' in self.fields and instance.category is not None and hasattr(instance, 'category_post_count'):
+            instance.category.post_count = instance.category_post_count
+        return super().to_representation(instance)
+
     def get_comment_count(self, obj):
-        return obj.comments.filter(approved=True).count()
+        # Annotated by Post.objects.with_counts()
+        count = getattr(obj, 'comment_count', None)
+        if count is None:
+            count = obj.comments.filter(approved=True).count()
+        return count
 
     def get_is_author(self, obj):
         request = self.context.get('request')
-        return bool(request and request.user.is_authenticated and obj.author == request.user)
+        return bool(request and request.user.is_authenticated and obj.author_id == request.user.id)
+
 
+class PostDetailSerializer(TimedSerializerMixin, SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    # Only the first page of approved comments is embedded; `comments_next`
+    # links to /posts/<slug>/comments/ for the rest.
+    COMMENTS_PAGE_SIZE = 10
 
-class PostDetailSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments = serializers.SerializerMethodField()
+    comments_next = serializers.SerializerMethodField()
     comment_count = serializers.SerializerMethodField()
     is_author = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
@@ -148,23 +246,70 @@ class PostDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = [
-            'id','title','slug','author','content','excerpt','category',
+            'id','title','slug','author','content','content_html','content_hash',
+            'excerpt','summary','reading_time','word_count','category',
             'image','created_at','updated_at','featured','views',
-            'comments','comment_count','is_author'
+            'comments','comments_next','comment_count','is_author'
         ]
 
+    field_columns = POST_FIELD_COLUMNS
+    required_columns = POST_REQUIRED_COLUMNS
+
     def get_image(self, obj):
         request = self.context.get('request')
         if obj.image:
             return request.build_absolute_uri(obj.image.url)
         return None
 
+    def to_representation(self, instance):
+        if 'category' in self.fields and instance.category is not None and hasattr(instance, 'category_post_count'):
+            instance.category.post_count = instance.category_post_count
+        return super().to_representation(instance)
+
+    @classmethod
+    def first_comment_page_queryset(cls, obj):
+        # One row past the page tells whether there is a next one
+        return (
+            obj.comments.filter(approved=True).select_related('user')
+            .order_by('-created_at', '-id')[:cls.COMMENTS_PAGE_SIZE + 1]
+        )
+
+    @classmethod
+    def set_first_comment_page(cls, obj, rows):
+        """Attach already fetched first_comment_page_queryset() rows (the async views load them)."""
+        obj._first_comment_page = (rows[:cls.COMMENTS_PAGE_SIZE], len(rows) > cls.COMMENTS_PAGE_SIZE)
+
+    def first_comment_page(self, obj):
+        if not hasattr(obj, '_first_comment_page'):
+            self.set_first_comment_page(obj, list(self.first_comment_page_queryset(obj)))
+        return obj._first_comment_page
+
+    def get_comments(self, obj):
+        page, _ = self.first_comment_page(obj)
+        return CommentSerializer(page, many=True, context={'request': self.context.get('request')}).data
+
+    def get_comments_next(self, obj):
+        page, has_more = self.first_comment_page(obj)
+        if not has_more:
+            return None
+        paginator = KeysetPagination()
+        url = reverse('post-comments', kwargs={'slug': obj.slug})
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        last = page[-1]
+        return replace_query_param(url, paginator.cursor_query_param, paginator.encode_cursor((last.created_at, last.pk)))
+
     def get_comment_count(self, obj):
-        return obj.comments.filter(approved=True).count()
+        # Annotated by Post.objects.with_counts()
+        count = getattr(obj, 'comment_count', None)
+        if count is None:
+            count = obj.comments.filter(approved=True).count()
+        return count
 
     def get_is_author(self, obj):
         request = self.context.get('request')
-        return bool(request and request.user.is_authenticated and obj.author == request.user)
+        return bool(request and request.user.is_authenticated and obj.author_id == request.user.id)
 
 
 class PostCreateUpdateSerializer(serializers.ModelSerializer):
@@ -176,6 +321,20 @@ class PostCreateUpdateSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['slug']
 
+    # The image is stored by the upload worker, so it reads null until then
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
-        return super().create(validated_data)
+        image = pop_upload(validated_data, 'image')
+        post = super().create(validated_data)
+        if image:
+            uploads.stage(post, 'image', image)
+        return post
+
+    def update(self, instance, validated_data):
+        image = pop_upload(validated_data, 'image')
+        post = super().update(instance, validated_data)
+        if image:
+            uploads.stage(post, 'image', image)
+        elif 'image' in validated_data:
+            uploads.cancel(post, 'image')
+        return post
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after buffered view counts have been written to the database.
+# ``counts`` maps post id -> number of views added by this flush.
+views_flushed = Signal()
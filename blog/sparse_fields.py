@@ -0,0 +1,86 @@
+"""
+Sparse fieldsets: ``?fields=id,title,slug`` limits a read response to the
+listed fields and ``?expand=content`` opts into fields left out by default.
+The viewset loads only the columns (and joins) the chosen fields read.
+"""
+
+
+def parse_field_list(request, param):
+    if request is None or request.method != 'GET':
+        return None
+    value = request.query_params.get(param)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer side. ``expandable_fields`` maps a name to a factory for a
+    field that is only included (or replaced) when expanded; ``field_columns``
+    maps each output field to the model columns it reads (default: a column of
+    the same name), ``expanded_columns`` does the same for expanded fields;
+    ``required_columns`` are always loaded.
+    """
+
+    expandable_fields = {}
+    field_columns = {}
+    expanded_columns = {}
+    required_columns = ('id',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the serializer the view builds gets the selection in context
+        selected = self.context.get('sparse_fields')
+        expand = self.context.get('sparse_expand') or set()
+        for name, factory in self.expandable_fields.items():
+            if name in expand:
+                self.fields[name] = factory()
+        if selected:
+            for name in list(self.fields):
+                if name not in selected:
+                    self.fields.pop(name)
+
+    @classmethod
+    def output_field_names(cls, selected, expand):
+        expand = expand or set()
+        names = list(cls.Meta.fields)
+        names += [name for name in cls.expandable_fields if name in expand and name not in names]
+        if selected:
+            names = [name for name in names if name in selected]
+        return names
+
+    @classmethod
+    def columns_for(cls, selected, expand):
+        """(columns for .only(), relations for .select_related())"""
+        columns = set(cls.required_columns)
+        for name in cls.output_field_names(selected, expand):
+            if expand and name in expand and name in cls.expanded_columns:
+                columns.update(cls.expanded_columns[name])
+            else:
+                columns.update(cls.field_columns.get(name, (name,)))
+        relations = {column.split('__')[0] for column in columns if '__' in column}
+        return sorted(columns | relations), sorted(relations)
+
+
+class SparseFieldsViewMixin:
+    """Viewset side: puts the selection in the serializer context and trims querysets."""
+
+    def get_sparse_selection(self):
+        request = getattr(self, 'request', None)
+        return parse_field_list(request, 'fields'), parse_field_list(request, 'expand')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['sparse_fields'], context['sparse_expand'] = self.get_sparse_selection()
+        return context
+
+    def sparse_queryset(self, queryset, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        if not hasattr(serializer_class, 'columns_for'):
+            return queryset
+        columns, relations = serializer_class.columns_for(*self.get_sparse_selection())
+        queryset = queryset.select_related(None)
+        if relations:  # select_related() without arguments would follow every FK
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
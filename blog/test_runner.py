@@ -0,0 +1,29 @@
+"""
+The test runner (settings.TEST_RUNNER): keeps the process-wide view counter
+of blog/view_counts.py inside each test. Views a test buffered are dropped
+when it ends, instead of being added to a later test's post with the same
+pk, and nothing is flushed at exit, when the test database is gone and
+the connection points at the development one again.
+"""
+import atexit
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import iter_test_cases
+
+from . import view_counts
+
+
+def discard_buffered_views():
+    view_counts.view_counter.backend.drain()
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        atexit.unregister(view_counts.flush_at_exit)
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        for test in iter_test_cases(suite):
+            test.addCleanup(discard_buffered_views)
+        return suite
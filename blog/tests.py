@@ -1,3 +1,1638 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import traceback
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.test import APIClient
+from PIL import Image
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from unittest import mock
+
+from . import metrics as request_metrics
+from . import content as post_content
+from . import response_cache, throttling, token_blacklist, uploads
+from .db_router import ReplicaRouter
+from .middleware import ReplicaPinMiddleware
+from .corpus import CORPUS_PASSWORD
+from .models import Category, Comment, PendingUpload, Post, PostRanking, PostViewBucket, UserProfile
+from .signals import views_flushed
+from .test_runner import discard_buffered_views
+from .trending import current_hour, refresh_rankings
+from .views import ChangePasswordView, PostViewSet
+from .view_counts import LocalViewCountBackend, ViewCounter
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='World', author=self.author)
+
+    def test_no_increments_lost_under_concurrency(self):
+        counter = ViewCounter()
+        threads, per_thread = 16, 250
+        drained = []
+        done = threading.Event()
+
+        def reader():
+            for _ in range(per_thread):
+                counter.record(self.post.pk)
+
+        def drainer():
+            while not done.is_set():
+                drained.append(counter.backend.drain())
+
+        workers = [threading.Thread(target=reader) for _ in range(threads)]
+        draining = threading.Thread(target=drainer)
+        draining.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        done.set()
+        draining.join()
+
+        # Whatever the drainer took plus what is left must add up exactly.
+        for counts in drained:
+            for pk, n in counts.items():
+                counter.backend.add(pk, n)
+        counter.flush()
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, threads * per_thread)
+
+    def test_flush_is_one_update_per_increment(self):
+        other = Post.objects.create(title='Other', content='x', author=self.author)
+        counter = ViewCounter()
+        counter.record(self.post.pk, 3)
+        counter.record(other.pk, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counter.flush(), {self.post.pk: 3, other.pk: 3})
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "blog_post"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(counter.flush(), {})
+
+        other.refresh_from_db()
+        self.assertEqual(other.views, 3)
+
+    def test_failed_flush_keeps_counts(self):
+        counter = ViewCounter()
+        counter.record(self.post.pk, 2)
+        with mock.patch('blog.view_counts.Post.objects.filter', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                counter.flush()
+        self.assertEqual(counter.flush(), {self.post.pk: 2})
+
+    def test_global_counter_is_emptied_after_each_test(self):
+        cleanups = [function for function, args, kwargs in self._cleanups]
+        self.assertIn(discard_buffered_views, cleanups)
+
+    def test_interval_triggers_flush(self):
+        counter = ViewCounter(LocalViewCountBackend(), flush_interval=0)
+        counter.record(self.post.pk)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 1)
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_failed_flush_does_not_fail_the_read(self):
+        counter = ViewCounter(LocalViewCountBackend(), flush_interval=0)
+
+        def failing_receiver(**kwargs):
+            raise RuntimeError('receiver')
+
+        views_flushed.connect(failing_receiver)
+        self.addCleanup(views_flushed.disconnect, failing_receiver)
+        with mock.patch('blog.views.view_counter', counter), self.assertLogs('blog.view_counts', 'ERROR'):
+            self.assertEqual(self.client.get(f'/api/posts/{self.post.slug}/').status_code, 200)
+            self.post.refresh_from_db()
+            self.assertEqual(self.post.views, 1)  # written, not put back
+
+            with mock.patch('blog.view_counts.Post.objects.filter', side_effect=RuntimeError('database is locked')):
+                self.assertEqual(self.client.get(f'/api/posts/{self.post.slug}/').status_code, 200)
+        self.assertEqual(counter.backend.drain(), {self.post.pk: 1})  # kept for the next flush
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostRetrieveViewCountTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='World', author=self.author)
+        self.counter = ViewCounter()
+        patcher = mock.patch('blog.views.view_counter', self.counter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retrieve_buffers_views(self):
+        for expected in (1, 2):
+            response = self.client.get(f'/api/posts/{self.post.slug}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['views'], expected)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        self.counter.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 2)
+
+    def test_sparse_fields_leave_views_out(self):
+        response = self.client.get(f'/api/posts/{self.post.slug}/?fields=title')
+        self.assertEqual(response.json(), {'title': 'Hello'})
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.slug}/?fields=title,views').json()['views'], 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostListQueryCountTests(TestCase):
+    """List endpoints must cost the same number of queries for 1 post or a full page."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.category = Category.objects.create(name='Django')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def create_posts(self, n):
+        start = Post.objects.count()
+        for i in range(start, start + n):
+            post = Post.objects.create(
+                title=f'Post {i}', content='Body', author=self.author,
+                category=self.category, featured=True,
+            )
+            Comment.objects.create(post=post, name='a', email='a@example.com', content='c', approved=True)
+            Comment.objects.create(post=post, name='b', email='b@example.com', content='c')
+
+    def assertFixedQueries(self, url, expected):
+        self.create_posts(1)
+        with self.assertNumQueries(expected):
+            first = self.client.get(url)
+        self.create_posts(11)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list(self):
+        data = self.assertFixedQueries('/api/posts/', 2)
+        post = data['results'][0]
+        self.assertEqual(post['comment_count'], 1)
+        self.assertEqual(post['category']['post_count'], 12)
+        self.assertTrue(post['is_author'])
+
+    def test_featured(self):
+        self.assertFixedQueries('/api/posts/featured/', 1)
+
+    def test_popular(self):
+        # Nothing ranked in this test: the ranking read plus the fallback
+        self.assertFixedQueries('/api/posts/popular/', 2)
+
+    def test_by_category(self):
+        self.assertFixedQueries(f'/api/posts/by_category/?category={self.category.slug}', 2)
+
+    def test_my_posts(self):
+        data = self.assertFixedQueries('/api/posts/my_posts/', 2)
+        self.assertEqual(data['results'][0]['comment_count'], 1)
+
+    def test_categories(self):
+        data = self.assertFixedQueries('/api/categories/', 2)
+        self.assertEqual(data['results'][0]['post_count'], 12)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class AuthorStatsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+
+    def stats(self):
+        profile = UserProfile.objects.get(user=self.author)
+        return profile.total_posts, profile.total_views, profile.total_comments
+
+    def create_post(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(title=f'Post {Post.objects.count()}', content='x', author=self.author, **kwargs)
+
+    def test_signals_maintain_stats(self):
+        post = self.create_post(views=5)
+        self.create_post(published=False, views=100)
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, name='a', email='a@example.com', content='c', approved=True)
+            Comment.objects.create(post=post, name='b', email='b@example.com', content='c')
+        self.assertEqual(self.stats(), (1, 5, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.stats(), (0, 0, 0))
+
+    def test_view_flush_adds_to_author_views(self):
+        post = self.create_post()
+        counter = ViewCounter()
+        counter.record(post.pk, 4)
+        counter.flush()
+        self.assertEqual(self.stats(), (1, 4, 0))
+
+    def test_profile_save_does_not_overwrite_counters(self):
+        self.create_post(views=7)
+        profile = self.author.profile  # loaded before the counters changed
+        UserProfile.objects.filter(pk=profile.pk).update(total_views=9)
+        profile.bio = 'Hi'
+        profile.save()
+        self.assertEqual(self.stats(), (1, 9, 0))
+
+    def test_reconcile_command(self):
+        self.create_post(views=3)
+        UserProfile.objects.update(total_posts=0, total_views=0, total_comments=42)
+        call_command('reconcile_author_stats', stdout=mock.Mock())
+        self.assertEqual(self.stats(), (1, 3, 0))
+
+    def test_profile_queries_do_not_grow_with_posts(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        for expected_posts in (1, 20):
+            while Post.objects.count() < expected_posts:
+                self.create_post(views=1)
+            self.author.refresh_from_db()
+            with self.assertNumQueries(1):
+                response = client.get('/api/profile/')
+            self.assertEqual(response.json()['total_posts'], expected_posts)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostSearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.in_content = Post.objects.create(title='Notes', content='Tuning postgres indexes', author=self.author)
+        self.in_title = Post.objects.create(title='Postgres tips', content='Assorted', author=self.author)
+
+    def search(self, text):
+        response = self.client.get('/api/posts/', {'search': text})
+        return [post['slug'] for post in response.json()['results']]
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('postgres'), [self.in_title.slug, self.in_content.slug])
+        self.assertEqual(self.search('postgre'), [self.in_title.slug, self.in_content.slug])
+        self.assertEqual(self.search('index'), [self.in_content.slug])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.in_title.title = 'SQLite tips'
+        self.in_title.save()
+        self.in_content.delete()
+        self.assertEqual(self.search('postgres'), [])
+        self.assertEqual(self.search('sqlite'), [self.in_title.slug])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"postgres ('), [self.in_title.slug, self.in_content.slug])
+        self.assertEqual(self.search('!!'), [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        posts = [
+            Post.objects.create(title=f'Post {i}', content='x', author=self.author)
+            for i in range(7)
+        ]
+        # Ties on created_at must be broken by id, not skipped or repeated.
+        Post.objects.filter(pk__in=[p.pk for p in posts[2:5]]).update(created_at=posts[2].created_at)
+        self.expected = list(Post.objects.order_by('-created_at', '-pk').values_list('slug', flat=True))
+
+    def test_walks_every_post_once_without_count(self):
+        url, seen = '/api/posts/?pagination=cursor&page_size=3', []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertEqual(len(queries), 1)  # just the page, no COUNT(*)
+            self.assertNotIn('count', data)
+            seen += [post['slug'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(seen, self.expected)
+
+    def test_page_numbers_remain_the_default(self):
+        data = self.client.get('/api/posts/?page_size=3').json()
+        self.assertEqual(data['count'], 7)
+        self.assertEqual(len(data['results']), 3)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/comments/?cursor=bogus').status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=True)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='World', author=self.author)
+
+    def test_anonymous_hit_skips_the_database(self):
+        first = self.client.get('/api/posts/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.json(), second.json())
+
+    def test_query_params_and_users_are_separate_entries(self):
+        self.client.get('/api/posts/')
+        self.assertEqual(self.client.get('/api/posts/?page_size=5')['X-Cache'], 'MISS')
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertTrue(response.json()['results'][0]['is_author'])
+
+    def test_writes_invalidate(self):
+        self.client.get('/api/posts/')
+        self.post.title = 'Changed'
+        self.post.save()
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['title'], 'Changed')
+
+        self.client.get('/api/categories/')
+        Category.objects.create(name='New')
+        self.assertEqual(self.client.get('/api/categories/')['X-Cache'], 'MISS')
+
+    def test_cached_detail_still_counts_views(self):
+        counter = ViewCounter()
+        with mock.patch('blog.views.view_counter', counter):
+            self.client.get(f'/api/posts/{self.post.slug}/')
+            data = self.client.get(f'/api/posts/{self.post.slug}/').json()
+        self.assertEqual(data['views'], 2)
+        self.assertEqual(counter.flush(), {self.post.pk: 2})
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=True, CONDITIONAL_GET_ENABLED=True)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='World', author=self.author)
+
+    def test_list_not_modified_until_a_write(self):
+        first = self.client.get('/api/posts/')
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(
+            self.client.get('/api/posts/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code,
+            304,
+        )
+
+        Comment.objects.create(post=self.post, name='n', email='n@example.com', content='c')
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_variants_have_their_own_etag(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        self.assertEqual(self.client.get('/api/posts/?page_size=5', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        client = APIClient()
+        client.force_authenticate(self.author)
+        self.assertEqual(client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_304_counts_the_view_and_keeps_the_etag(self):
+        url = f'/api/posts/{self.post.slug}/'
+        counter = ViewCounter()
+        with mock.patch('blog.views.view_counter', counter):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(self.client.get(url)['ETag'], etag)
+        self.assertEqual(counter.flush(), {self.post.pk: 3})
+
+        self.post.title = 'Changed'
+        self.post.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_works_without_the_response_cache(self):
+        etag = self.client.get('/api/categories/')['ETag']
+        self.assertEqual(self.client.get('/api/categories/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_off_without_a_shared_cache(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        with override_settings(CONDITIONAL_GET_ENABLED=False):
+            for url in ('/api/posts/', f'/api/posts/{self.post.slug}/', '/api/categories/'):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200, url)
+                self.assertNotIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.old_hit = Post.objects.create(title='Old hit', content='x', author=author, views=1000)
+        self.fresh = Post.objects.create(title='Fresh', content='x', author=author)
+        self.steady = Post.objects.create(title='Steady', content='x', author=author)
+
+    def slugs(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [post['slug'] for post in response.json()]
+
+    def test_falls_back_to_lifetime_views_before_first_refresh(self):
+        self.assertEqual(self.slugs('/api/posts/popular/')[0], self.old_hit.slug)
+
+    def test_tops_up_a_short_ranking_with_lifetime_views(self):
+        PostViewBucket.objects.create(post=self.steady, hour=current_hour(), views=1)
+        refresh_rankings()
+        self.assertEqual(
+            self.slugs('/api/posts/popular/'),
+            [self.steady.slug, self.old_hit.slug, self.fresh.slug],
+        )
+
+    def test_flush_skips_posts_deleted_since(self):
+        counter = ViewCounter()
+        counter.record(self.fresh.pk, 2)
+        counter.record(self.steady.pk, 3)
+        self.steady.delete()
+        counter.flush()
+        self.assertEqual(
+            list(PostViewBucket.objects.values_list('post_id', 'views')), [(self.fresh.pk, 2)],
+        )
+        connection.check_constraints()
+
+    def test_recent_views_outrank_old_ones(self):
+        now = timezone.now()
+        PostViewBucket.objects.create(post=self.old_hit, hour=current_hour(now - timedelta(days=5)), views=50)
+        PostViewBucket.objects.create(post=self.steady, hour=current_hour(now - timedelta(hours=12)), views=10)
+        counter = ViewCounter()
+        counter.record(self.fresh.pk, 8)
+        counter.flush()
+
+        self.assertEqual(refresh_rankings(now), {'24h': 2, '7d': 3, '30d': 3})
+        # Hours since the bucket, halving every 6
+        steady = PostRanking.objects.get(post=self.steady, window='24h')
+        age = now - current_hour(now - timedelta(hours=12))
+        self.assertAlmostEqual(steady.score, 10 * 0.5 ** (age / timedelta(hours=6)))
+        # The unranked post fills up the list
+        self.assertEqual(
+            self.slugs('/api/posts/trending/'),
+            [self.fresh.slug, self.steady.slug, self.old_hit.slug],
+        )
+        self.assertEqual(
+            self.slugs('/api/posts/popular/'),
+            [self.fresh.slug, self.steady.slug, self.old_hit.slug],
+        )
+        self.assertEqual(self.client.get('/api/posts/trending/?window=1y').status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class QueryPlanTests(TestCase):
+    """Each endpoint's queries must be served by an index, not a full scan or a sort."""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.category = Category.objects.create(name='Django')
+        self.post = Post.objects.create(title='Hello', content='x', author=self.author, category=self.category)
+        Comment.objects.create(post=self.post, name='a', email='a@example.com', content='c', approved=True)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Tiny test tables would otherwise always be seq-scanned.
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedPlan(self, sql):
+        plan = self.explain(sql)
+        for line in plan:
+            if connection.vendor == 'postgresql':
+                self.assertNotRegex(line, r'Seq Scan on (blog_|auth_user)', '\n'.join(plan))
+            else:
+                self.assertNotRegex(line, r'^SCAN \w+$', f'{sql}\n' + '\n'.join(plan))
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', line, f'{sql}\n' + '\n'.join(plan))
+
+    def assertEndpointIndexed(self, url, client=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertIndexedPlan(sql)
+        return response
+
+    def test_post_endpoints(self):
+        for url in (
+            '/api/posts/',
+            '/api/posts/featured/',
+            '/api/posts/popular/',
+            '/api/posts/trending/',
+            f'/api/posts/by_category/?category={self.category.slug}',
+            f'/api/posts/{self.post.slug}/',
+            f'/api/posts/{self.post.slug}/comments/',
+        ):
+            with self.subTest(url=url):
+                self.assertEndpointIndexed(url)
+
+    def test_keyset_page(self):
+        Post.objects.create(title='Second', content='x', author=self.author)
+        first = self.client.get('/api/posts/?pagination=cursor&page_size=1').json()
+        self.assertEndpointIndexed(first['next'])
+
+    def test_my_posts(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        self.assertEndpointIndexed('/api/posts/my_posts/', client)
+
+    def test_comments(self):
+        self.assertEndpointIndexed('/api/comments/')
+        self.assertEndpointIndexed(f'/api/comments/?post={self.post.slug}')
+
+    def test_register_email_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            User.objects.filter(email='new@example.com').exists()  # RegisterSerializer.validate
+        self.assertIndexedPlan(queries[0]['sql'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class PostDetailCommentsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='x', author=self.author)
+        for i in range(13):
+            Comment.objects.create(
+                post=self.post, user=self.author, name='a', email='a@example.com',
+                content=f'Comment {i}', approved=True,
+            )
+        Comment.objects.create(post=self.post, name='spam', email='s@example.com', content='spam')
+        # The shared counter flushes whenever its interval is up, adding queries
+        patcher = mock.patch('blog.views.view_counter', ViewCounter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detail_embeds_first_page_and_links_the_rest(self):
+        with self.assertNumQueries(2):  # post + first comment page (users joined)
+            data = self.client.get(f'/api/posts/{self.post.slug}/').json()
+        self.assertEqual(data['comment_count'], 13)
+        self.assertEqual(len(data['comments']), 10)
+        self.assertEqual(data['comments'][0]['content'], 'Comment 12')
+
+        rest = self.client.get(data['comments_next']).json()
+        self.assertEqual([c['content'] for c in rest['results']], ['Comment 2', 'Comment 1', 'Comment 0'])
+        self.assertIsNone(rest['next'])
+
+    def test_unapproved_comments_are_never_embedded(self):
+        self.post.comments.filter(approved=True).delete()
+        data = self.client.get(f'/api/posts/{self.post.slug}/').json()
+        self.assertEqual(data['comments'], [])
+        self.assertIsNone(data['comments_next'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        category = Category.objects.create(name='Django')
+        self.post = Post.objects.create(title='Hello', content='Long body', author=author, category=category)
+        Comment.objects.create(post=self.post, user=author, name='a', email='a@example.com', content='c', approved=True)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), queries[-1]['sql']
+
+    def test_list_never_loads_content_by_default(self):
+        data, sql = self.get('/api/posts/')
+        self.assertNotIn('"blog_post"."content"', sql)
+        self.assertNotIn('content', data['results'][0])
+
+    def test_fields_trim_output_and_columns(self):
+        data, sql = self.get('/api/posts/?fields=title,slug')
+        self.assertEqual(data['results'], [{'title': 'Hello', 'slug': 'hello'}])
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('blog_category', sql)
+        self.assertNotIn('"blog_post"."excerpt"', sql)
+
+    def test_expand_content(self):
+        data, _ = self.get('/api/posts/?fields=slug,content&expand=content')
+        self.assertEqual(data['results'], [{'slug': 'hello', 'content': 'Long body'}])
+
+    def test_detail_fields(self):
+        data, _ = self.get(f'/api/posts/{self.post.slug}/?fields=title,comments')
+        self.assertEqual(set(data), {'title', 'comments'})
+        self.assertEqual(data['comments'][0]['user_name'], 'author')
+
+    def test_comments_expand_post(self):
+        data, sql = self.get('/api/comments/?fields=content,post&expand=post')
+        self.assertEqual(data['results'], [
+            {'post': {'id': self.post.pk, 'title': 'Hello', 'slug': 'hello'}, 'content': 'c'},
+        ])
+        self.assertNotIn('"blog_post"."content"', sql)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class FastListSerializerTests(TestCase):
+    """The .values() fast path must render exactly what the DRF serializers do."""
+
+    URLS = [
+        '/api/posts/', '/api/posts/?page=2&page_size=1', '/api/posts/?pagination=cursor&page_size=2',
+        '/api/posts/?fields=title,image,category&expand=content', '/api/posts/?search=caf%C3%A9',
+        '/api/posts/featured/', '/api/posts/popular/', '/api/posts/trending/', '/api/posts/my_posts/',
+        '/api/posts/by_category/?category=django', '/api/posts/hello/comments/?page_size=1',
+        '/api/posts/hello/comments/?fields=user_name,post&expand=post',
+        '/api/comments/', '/api/comments/?post=hello&fields=id,user,user_name,created_at',
+        # Not expandable: ignored, as by the DRF serializers
+        '/api/posts/?expand=author', '/api/posts/featured/?expand=category,created_at',
+        '/api/comments/?expand=user_name,created_at',
+    ]
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass', first_name='Zoë')
+        category = Category.objects.create(name='Django', description='Ünïcode')
+        post = Post.objects.create(
+            title='Hello', content='Body \u2028 \u2029', excerpt='Café \u2028 crème', author=self.author,
+            category=category, featured=True,
+        )
+        Post.objects.filter(pk=post.pk).update(
+            image='posts/hello.jpg', image_variants={'640': 'posts/hello-640w.webp', '320': 'posts/hello-320w.webp'},
+        )
+        Post.objects.create(title='No category', content='x', author=self.author, excerpt='café')
+        Post.objects.create(title='Draft', content='x', author=self.author, published=False)
+        Comment.objects.create(post=post, user=self.author, name='ignored', email='a@example.com', content='c', approved=True)
+        Comment.objects.create(post=post, name='Anna \u2028', email='b@example.com', content='ç', approved=True)
+        # A filesystem stand-in for Cloudinary
+        settings = override_settings(STORAGES={
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def responses(self, client):
+        results = []
+        for fast in (True, False):
+            with override_settings(FAST_LIST_SERIALIZERS=fast):
+                results.append([(response.status_code, response.content) for response in map(client.get, self.URLS)])
+        return results
+
+    def test_same_bytes_as_drf_serializers(self):
+        client = APIClient()
+        for authenticated in (False, True):
+            if authenticated:
+                client.force_authenticate(self.author)
+            fast, slow = self.responses(client)
+            for url, fast_response, slow_response in zip(self.URLS, fast, slow):
+                with self.subTest(url=url, authenticated=authenticated):
+                    self.assertEqual(fast_response, slow_response)
+                    # 401 for /my_posts/ without a token
+                    self.assertEqual(fast_response[0], 401 if 'my_posts' in url and not authenticated else 200)
+                    self.assertNotIn('\u2028'.encode(), fast_response[1])
+        data = json.loads(fast[0][1])['results']
+        self.assertEqual([post['title'] for post in data], ['Draft', 'No category', 'Hello'])
+        self.assertTrue(data[2]['image'].endswith('/posts/hello-320w.webp'))
+        self.assertIsNone(data[1]['category'])
+
+    def test_lists_load_no_model_instances(self):
+        with mock.patch.object(Post, 'from_db', side_effect=AssertionError), \
+                mock.patch.object(Comment, 'from_db', side_effect=AssertionError):
+            for url in self.URLS[:3] + ['/api/comments/']:
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_renderer_matches_json_renderer(self):
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {
+            'text': 'naïve \u2028 \u2029 "quoted" \\ \n', 'when': timezone.now(), 'amount': Decimal('1.50'),
+            'nested': [{'a': None, 'b': True}, 3, 'ü'], 'empty': {},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=True)
+class HomeViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        other = User.objects.create_user('other', 'other@example.com', 'pass')
+        self.category = Category.objects.create(name='Django')
+        for i, author in enumerate([self.author, other, self.author]):
+            Post.objects.create(
+                title=f'Post {i}', content='Body', author=author, category=self.category if i else None, featured=i < 2,
+            )
+        Post.objects.create(title='Draft', content='Body', author=self.author, published=False)
+        Category.objects.create(name='Empty')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sections_match_the_separate_endpoints(self):
+        home = self.get('/api/home/?page_size=2')
+        included = home['included']
+        self.assertEqual(sorted(included['authors']), sorted(str(pk) for pk in User.objects.values_list('pk', flat=True)))
+
+        def expand(post):
+            category = included['categories'][str(post['category'])] if post['category'] is not None else None
+            return {**post, 'author': included['authors'][str(post['author'])], 'category': category}
+
+        self.assertEqual([expand(post) for post in home['featured']], self.get('/api/posts/featured/'))
+        self.assertEqual([expand(post) for post in home['popular']], self.get('/api/posts/popular/'))
+        latest = self.get('/api/posts/?page_size=2')
+        self.assertEqual([expand(post) for post in home['latest']['results']], latest['results'])
+        self.assertEqual(home['latest']['next'], latest['next'])
+        categories = self.get('/api/categories/')['results']
+        self.assertEqual(home['categories'], [category['id'] for category in categories])
+        self.assertEqual([included['categories'][str(c['id'])] for c in categories], categories)
+
+    def test_cached_as_one_response(self):
+        self.assertEqual(self.client.get('/api/home/')['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/home/')['X-Cache'], 'HIT')
+        Post.objects.filter(featured=True).first().save()
+        self.assertEqual(self.client.get('/api/home/')['X-Cache'], 'MISS')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.password = 'Cached-pass-123'
+        self.user = User.objects.create_user('reader', 'reader@example.com', self.password)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def create_post(self):
+        title = f'Post {Post.objects.count()}'
+        return self.client.post('/api/posts/', {'title': title, 'content': 'Body'}, format='json').status_code
+
+    def test_authenticated_reads_make_no_auth_queries(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+        with self.assertNumQueries(len(first) - 1):  # the user (and role) came from the cache
+            self.assertEqual(self.client.get('/api/categories/').status_code, 200)
+
+    def test_role_and_deactivation_apply_immediately(self):
+        self.assertEqual(self.create_post(), 403)
+        self.user.profile.role = 'author'
+        self.user.profile.save()
+        self.assertEqual(self.create_post(), 201)
+        self.assertEqual(self.create_post(), 201)  # from the cache
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/categories/').status_code, 401)
+
+    def test_cached_user_keeps_its_password(self):
+        self.client.get('/api/categories/')  # cache the user
+        response = self.client.patch('/api/profile/', {'first_name': 'Rea'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password(self.password))
+
+        response = self.client.put('/api/auth/change-password/', {
+            'old_password': self.password, 'new_password': 'Changed-pass-456',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).check_password('Changed-pass-456'))
+        self.assertEqual(self.client.get('/api/profile/').data['first_name'], 'Rea')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, JWT_BLACKLIST_INDEX=True)
+class TokenBlacklistIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_blacklist.index.clear()
+        self.addCleanup(token_blacklist.index.clear)
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pass')
+
+    def refresh(self, token):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/auth/token/refresh/', {'refresh': token})
+
+    def test_rotated_and_logged_out_tokens_are_rejected(self):
+        first = str(RefreshToken.for_user(self.user))
+        response = self.refresh(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh(first).status_code, 401)
+
+        second = response.json()['refresh']
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/api/auth/logout/', {'refresh_token': second}).status_code, 200)
+        self.assertEqual(self.refresh(second).status_code, 401)
+        self.assertEqual(token_blacklist.index.rebuilds, 1)
+
+    def test_checks_skip_sql_and_follow_other_processes(self):
+        token = RefreshToken.for_user(self.user)
+        token_blacklist.index.contains('warm-up')
+        with self.assertNumQueries(0):
+            self.assertFalse(token_blacklist.index.contains(token['jti']))
+
+        # Blacklisted by another process: published through the cache only
+        token_blacklist.IndexedRefreshToken(str(token)).blacklist()
+        generation = cache.incr(token_blacklist.GENERATION_KEY)
+        cache.set(f'blog:jwt-blacklist:{generation}', token['jti'])
+        with self.assertNumQueries(0):
+            self.assertTrue(token_blacklist.index.contains(token['jti']))
+
+        # An entry that can't be read any more means a reload from the database
+        other = RefreshToken.for_user(self.user)
+        token_blacklist.IndexedRefreshToken(str(other)).blacklist()
+        cache.incr(token_blacklist.GENERATION_KEY)
+        self.assertTrue(token_blacklist.index.contains(other['jti']))
+        self.assertEqual(token_blacklist.index.rebuilds, 2)
+
+    def test_prune_tokens_in_chunks(self):
+        for _ in range(5):
+            token_blacklist.IndexedRefreshToken(str(RefreshToken.for_user(self.user))).blacklist()
+        live = RefreshToken.for_user(self.user)
+        OutstandingToken.objects.exclude(jti=live['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        out = io.StringIO()
+        call_command('prune_tokens', chunk_size=2, verbosity=2, stdout=out)
+        self.assertEqual(out.getvalue().count('Deleted 2 tokens'), 2)
+        self.assertIn('Deleted 5 expired tokens (5 blacklisted)', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [live['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class PostContentTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+
+    def test_derived_fields_are_computed_on_save(self):
+        content = 'First <b>line</b>\nsecond line\n\nSee https://example.com ' + 'word ' * 400
+        post = Post.objects.create(title='Hello', content=content, author=self.author)
+        self.assertEqual(post.content_html.split('\n\n')[0], '<p>First &lt;b&gt;line&lt;/b&gt;<br>second line</p>')
+        self.assertIn('<a href="https://example.com" rel="nofollow">https://example.com</a>', post.content_html)
+        self.assertEqual(post.word_count, 406)
+        self.assertEqual(post.reading_time, 3)
+        self.assertEqual(post.content_hash, post_content.content_hash(content))
+        self.assertTrue(post.summary.startswith('First <b>line</b> second line See'))
+        self.assertTrue(post.summary.endswith('word…'))
+        self.assertLessEqual(len(post.summary), post_content.EXCERPT_LENGTH)
+
+        post.excerpt = 'Hand written'
+        with mock.patch('blog.content.render_html') as render_html:
+            post.save(update_fields=['excerpt'])
+        render_html.assert_not_called()  # same content hash
+        post.content = 'Short'
+        post.save(update_fields=['content'])
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.summary, post.content_html, post.word_count, post.reading_time),
+            ('Hand written', '<p>Short</p>', 1, 1),
+        )
+
+    def test_api_serves_stored_values(self):
+        post = Post.objects.create(title='Hello', content='One two three', author=self.author)
+        with mock.patch('blog.content.process') as process:
+            listed = self.client.get('/api/posts/').json()['results'][0]
+            detail = self.client.get(f'/api/posts/{post.slug}/').json()
+        process.assert_not_called()
+        self.assertEqual(
+            {key: listed[key] for key in ('summary', 'word_count', 'reading_time')},
+            {'summary': 'One two three', 'word_count': 3, 'reading_time': 1},
+        )
+        self.assertEqual(detail['content_html'], '<p>One two three</p>')
+        self.assertEqual(detail['content_hash'], post.content_hash)
+
+    def test_backfill(self):
+        Post.objects.bulk_create([
+            Post(title=f'Post {i}', slug=f'post-{i}', content=f'Body {i}', author=self.author) for i in range(5)
+        ])
+        out = io.StringIO()
+        call_command('backfill_post_content', batch_size=2, stdout=out)
+        self.assertIn('Processed 5 posts, updated 5', out.getvalue())
+        self.assertEqual(
+            set(Post.objects.values_list('summary', 'content_html')),
+            {(f'Body {i}', f'<p>Body {i}</p>') for i in range(5)},
+        )
+        call_command('backfill_post_content', stdout=out)
+        self.assertIn('Processed 0 posts, updated 0', out.getvalue())
+        call_command('backfill_post_content', force=True, stdout=out)
+        self.assertIn('Processed 5 posts, updated 0', out.getvalue())
+
+
+class BlogArchiveTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass', first_name='Ann')
+        self.author.profile.role = 'author'
+        self.author.profile.save()
+        self.reader = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        self.category = Category.objects.create(name='Django')
+        for i in range(3):
+            post = Post.objects.create(
+                title=f'Post {i}', content=f'Body {i}', author=self.author, category=self.category if i else None,
+            )
+            Comment.objects.create(post=post, user=self.reader, name='reader', email='r@example.com', content='Hi', approved=True)
+        Comment.objects.create(post=post, name='Anon', email='a@example.com', content='Hello')
+        self.path = Path(tempfile.mkdtemp()) / 'blog.ndjson.gz'
+        self.addCleanup(shutil.rmtree, self.path.parent)
+
+    def snapshot(self):
+        return {
+            'users': list(User.objects.order_by('username').values_list('username', 'first_name', 'password', 'profile__role')),
+            'posts': list(Post.objects.order_by('slug').values_list(
+                'slug', 'author__username', 'category__slug', 'content_html', 'created_at', 'updated_at',
+            )),
+            'comments': sorted(Comment.objects.values_list('post__slug', 'user__username', 'name', 'approved', 'created_at'), key=str),
+        }
+
+    def test_round_trip(self):
+        call_command('export_blog', str(self.path), chunk_size=2, stderr=io.StringIO())
+        before = self.snapshot()
+        User.objects.all().delete()
+        Category.objects.all().delete()
+
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_blog', str(self.path), batch_size=2, stdout=out)
+        self.assertIn('Imported 2 users, 1 category, 3 posts, 4 comments', out.getvalue())
+        self.assertEqual(self.snapshot(), before)
+        self.assertEqual(UserProfile.objects.get(user__username='author').total_posts, 3)
+        self.assertEqual(UserProfile.objects.get(user__username='author').total_comments, 3)
+
+    def test_import_next_to_existing_content(self):
+        call_command('export_blog', str(self.path), stderr=io.StringIO())
+        out = io.StringIO()
+        with self.assertNumQueries(13):
+            call_command('import_blog', str(self.path), stdout=out)
+        self.assertIn('2 existing users, 1 existing category, 3 renamed posts, 3 posts, 4 comments', out.getvalue())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(
+            list(Post.objects.filter(slug__in=['post-0-2', 'post-1-2', 'post-2-2']).order_by('slug', 'comments__name').values_list('slug', 'comments__name')),
+            [('post-0-2', 'reader'), ('post-1-2', 'reader'), ('post-2-2', 'Anon'), ('post-2-2', 'reader')],
+        )
+
+    def test_rejects_other_files(self):
+        self.path.with_suffix('').write_text('{"type": "post"}\n')
+        with self.assertRaisesMessage(CommandError, 'Not a devscribe-blog archive'):
+            call_command('import_blog', str(self.path.with_suffix('')))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, THROTTLE_RATES={
+    'login-ip': '3/min', 'login-username': '2/min', 'register-ip': '1/hour', 'comment-anon-ip': '2/min',
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        throttling.backend.clear()
+        self.addCleanup(throttling.backend.clear)
+        self.user = User.objects.create_user('reader', 'reader@example.com', 'pass')
+        self.post = Post.objects.create(title='Hello', content='World', author=self.user)
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_login_flood_is_rejected_before_hashing(self):
+        self.assertEqual([self.login(f'user{i}').status_code for i in range(3)], [401] * 3)
+        with mock.patch('blog.views.authenticate') as authenticate, self.assertNumQueries(0):
+            response = self.login('user3')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        authenticate.assert_not_called()
+        # Other clients are unaffected
+        self.assertEqual(self.login('user3', ip='10.0.0.2').status_code, 401)
+
+    def test_forwarded_for_header_does_not_pick_the_bucket(self):
+        statuses = [
+            self.client.post('/api/auth/login/', {'username': f'user{i}', 'password': 'wrong'},
+                             REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+        throttling.backend.clear()
+        # Behind one proxy only the address it appended counts
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            statuses = [
+                self.client.post('/api/auth/register/', {'username': f'new{i}'},
+                                 HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 198.51.100.7').status_code
+                for i in range(2)
+            ]
+            self.assertEqual(statuses, [400, 429])
+            response = self.client.post('/api/auth/register/', {'username': 'new'},
+                                        HTTP_X_FORWARDED_FOR='198.51.100.8')
+            self.assertEqual(response.status_code, 400)
+
+    def test_login_username_limit_spans_addresses(self):
+        self.assertEqual(self.login('reader', ip='10.0.0.1').status_code, 401)
+        self.assertEqual(self.login(' Reader ', ip='10.0.0.2').status_code, 401)
+        self.assertEqual(self.login('reader', ip='10.0.0.3').status_code, 429)
+
+    def test_register_is_throttled(self):
+        data = {'username': 'new', 'email': 'new@example.com', 'password': 'Str0ng-pass!', 'password2': 'Str0ng-pass!'}
+        self.assertEqual(self.client.post('/api/auth/register/', data).status_code, 201)
+        self.assertEqual(self.client.post('/api/auth/register/', dict(data, username='other')).status_code, 429)
+
+    def test_only_anonymous_comments_are_throttled(self):
+        data = {'post': self.post.id, 'name': 'Anon', 'email': 'anon@example.com', 'content': 'Hi'}
+        statuses = [self.client.post('/api/comments/', data).status_code for _ in range(3)]
+        self.assertEqual(statuses, [201, 201, 429])
+        self.assertEqual(Comment.objects.count(), 2)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual([client.post('/api/comments/', data).status_code for _ in range(3)], [201] * 3)
+
+    def test_bucket_refills_over_time(self):
+        bucket = throttling.LocalBucketBackend()
+        with mock.patch('blog.throttling.time.monotonic', return_value=100.0) as monotonic:
+            self.assertEqual([bucket.take('k', 2, 0.5)[0] for _ in range(3)], [True, True, False])
+            self.assertEqual(bucket.take('k', 2, 0.5), (False, 2.0))
+            monotonic.return_value = 102.0
+            self.assertEqual([bucket.take('k', 2, 0.5)[0] for _ in range(2)], [True, False])
+
+    def test_bucket_pruning_is_amortised_above_max_keys(self):
+        bucket = throttling.LocalBucketBackend(max_keys=1000)
+        # A flood of distinct usernames: every bucket stays live
+        with mock.patch.object(bucket, '_prune', wraps=bucket._prune) as prune:
+            for i in range(3000):
+                bucket.take(f'user-{i}', 1, 0.001)
+                self.assertLessEqual(len(bucket._buckets), 1000)
+        self.assertLessEqual(prune.call_count, 20)
+        # The most recently used buckets are the ones kept
+        self.assertFalse(bucket.take('user-2999', 1, 0.001)[0])
+
+    def test_disabled(self):
+        with override_settings(THROTTLE_ENABLED=False):
+            self.assertEqual([self.login('reader').status_code for _ in range(4)], [401] * 4)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, METRICS_TOKEN='secret', RESPONSE_CACHE_ENABLED=True)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        request_metrics.registry.reset()
+        author = User.objects.create_user('author', 'author@example.com', 'pass')
+        Post.objects.create(title='Hello', content='World', author=author)
+
+    def scrape(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_records_per_endpoint_histograms(self):
+        self.client.get('/api/posts/')
+        self.client.get('/api/posts/')
+        self.client.get('/api/nowhere/')
+        body = self.scrape()
+        self.assertIn('devscribe_requests_total{endpoint="post-list",method="GET",status="200"} 2', body)
+        self.assertIn('devscribe_requests_total{endpoint="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('devscribe_request_duration_seconds_count{endpoint="post-list",method="GET"} 2', body)
+        # Second request was a cache hit: one request with 0 queries
+        self.assertIn('devscribe_request_db_queries_bucket{endpoint="post-list",method="GET",le="0.0"} 1', body)
+        self.assertIn('devscribe_request_db_queries_sum{endpoint="post-list",method="GET"} 2', body)
+        self.assertIn('devscribe_request_serializer_duration_seconds_count{endpoint="post-list",method="GET"} 2', body)
+        self.assertIn('devscribe_response_cache_hits_total', body)
+
+    def test_slow_query_log(self):
+        with override_settings(SLOW_QUERY_LOG_MS=0, SLOW_QUERY_STACK_SAMPLE_RATE=1.0):
+            client = APIClient()
+            with self.assertLogs('blog.slow_queries', 'WARNING') as logs:
+                client.get('/api/posts/')
+        self.assertIn('/api/posts/', logs.output[0])
+        self.assertIn('blog/views.py', '\n'.join(logs.output))
+
+    def test_connection_pool_stats(self):
+        self.assertNotIn('devscribe_db_pool', self.scrape())  # no pool on SQLite
+        stats = {'pool_size': 4, 'pool_available': 1, 'requests_num': 120, 'requests_wait_ms': 1500}
+        with mock.patch('blog.metrics.pool_stats', return_value={'default': stats}):
+            body = self.scrape()
+        self.assertIn('devscribe_db_pool_connections_in_use{alias="default"} 3', body)
+        self.assertIn('devscribe_db_pool_requests_waiting{alias="default"} 0', body)
+        self.assertIn('devscribe_db_pool_wait_seconds_total{alias="default"} 1.5', body)
+        self.assertIn('# TYPE devscribe_db_pool_timeouts_total counter', body)
+
+    def test_token(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer other').status_code, 403)
+
+    def test_no_token_only_in_development(self):
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get('/api/metrics/').status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/api/metrics/').status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BenchmarkCommandTests(TestCase):
+    def test_generate_corpus_and_run_benchmark(self):
+        cache.clear()
+        call_command(
+            'generate_corpus', users=4, authors=2, categories=2, posts=6, comments_per_post=2, stdout=io.StringIO()
+        )
+        self.assertEqual(Post.objects.filter(slug__startswith='corpus-post-').count(), 6)
+        stats = UserProfile.objects.filter(role='author').aggregate(total=Sum('total_posts'))
+        self.assertEqual(stats['total'], Post.objects.filter(published=True).count())
+        self.assertTrue(self.client.login(username='corpus-user-0', password=CORPUS_PASSWORD))
+
+        out = io.StringIO()
+        call_command('run_benchmark', routes='post-list,post-detail,login', writes=True, iterations=3, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(set(report['routes']), {'post-list', 'post-detail', 'login'})
+        self.assertEqual(report['routes']['post-detail']['errors'], 0)
+        self.assertEqual(report['routes']['post-detail']['queries_per_request'], 2)
+        self.assertIn('category-list', report['not_benchmarked'])
+
+    def test_clear_deletes_the_corpus_in_bulk(self):
+        call_command('generate_corpus', users=4, authors=2, categories=2, posts=6, comments_per_post=2, stdout=io.StringIO())
+        corpus_user = User.objects.get(username='corpus-user-3')
+        author = User.objects.create_user('keeper', password='pass12345')
+        kept = Post.objects.create(title='Kept', content='Body', author=author, published=True, category=Category.objects.get(slug='corpus-category-0'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=kept, user=corpus_user, name='c', email='c@example.com', content='Hi', approved=True)
+        PostViewBucket.objects.create(post=Post.objects.get(slug='corpus-post-0'), hour=current_hour(), views=3)
+        token = RefreshToken.for_user(corpus_user)
+        author.profile.refresh_from_db()
+        self.assertEqual(author.profile.total_comments, 1)
+
+        with mock.patch.object(response_cache, '_bump') as bump:
+            call_command(
+                'generate_corpus', users=2, authors=1, categories=1, posts=1, comments_per_post=0,
+                clear=True, stdout=io.StringIO(),
+            )
+        # One bump at the end instead of one per deleted row
+        bump.assert_called_once_with(response_cache.RANKING_SCOPES)
+        self.assertEqual(User.objects.filter(username__startswith='corpus-user-').count(), 2)
+        self.assertEqual(list(Post.objects.values_list('slug', flat=True).order_by('slug')), ['corpus-post-0', kept.slug])
+        self.assertFalse(Comment.objects.filter(post=kept).exists())
+        self.assertFalse(PostViewBucket.objects.exists())
+        self.assertFalse(UserProfile.objects.filter(user_id=corpus_user.pk).exists())
+        self.assertIsNone(OutstandingToken.objects.get(jti=token['jti']).user)
+        kept.refresh_from_db()
+        self.assertIsNone(kept.category)
+        author.profile.refresh_from_db()
+        self.assertEqual(author.profile.total_comments, 0)
+
+
+def blog_call_site():
+    """
+    The innermost app frame (outside the tests and instrumentation) that ran
+    a query, else the innermost library frame outside Django.
+    """
+    fallback = None
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        path = Path(frame.filename)
+        site = f'{path.parent.name}/{path.name}:{frame.lineno} in {frame.name}'
+        if path.parent.name == 'blog':
+            if path.name not in ('tests.py', 'metrics.py', 'middleware.py'):
+                return site
+        elif fallback is None and 'django' not in path.parts:
+            fallback = site
+    return fallback or '(unknown)'
+
+
+class QueryRecorder:
+    """execute_wrapper that keeps each query with its call site."""
+
+    def __init__(self):
+        self.queries = []
+        self.response = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((blog_call_site(), sql))
+        return execute(sql, params, many, context)
+
+    def by_call_site(self):
+        grouped = defaultdict(list)
+        for site, sql in self.queries:
+            grouped[site].append(sql)
+        return grouped
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, RESPONSE_CACHE_ENABLED=False)
+class QueryBudgetTests(TestCase):
+    """
+    Every API route has a query budget. Read routes are run against 1 and
+    then 50 items (posts, categories, comments per post) with
+    ``page_size=50`` and must not cost more on the larger page. Failures list
+    the SQL grouped by the code that ran it.
+    """
+
+    SMALL, LARGE = 1, 50
+
+    # route: (url, max queries); {post} and {category} are slugs, {comment} a pk
+    READ_BUDGETS = {
+        'post-list': ('/api/posts/?page_size=50', 2),
+        'post-detail': ('/api/posts/{post}/', 2),
+        'post-comments': ('/api/posts/{post}/comments/?page_size=50', 2),
+        'post-featured': ('/api/posts/featured/', 1),
+        'post-popular': ('/api/posts/popular/', 2),  # ranking read + fallback
+        'post-trending': ('/api/posts/trending/', 2),
+        'post-by-category': ('/api/posts/by_category/?category={category}&page_size=50', 2),
+        'post-my-posts': ('/api/posts/my_posts/?page_size=50', 2),
+        'category-list': ('/api/categories/?page_size=50', 2),
+        'category-detail': ('/api/categories/{category}/', 1),
+        'comment-list': ('/api/comments/?page_size=50', 2),
+        'comment-detail': ('/api/comments/{comment}/', 1),
+        'profile': ('/api/profile/', 1),
+        'home': ('/api/home/?page_size=50', 5),  # featured, ranking + fallback, latest, categories
+    }
+    # Read routes whose page must hold all LARGE items, so the budget is for the page asked for
+    FULL_PAGES = ('post-list', 'post-comments', 'post-my-posts', 'category-list', 'comment-list')
+
+    # route: max queries, including savepoints
+    AUTH_BUDGETS = {
+        'register': 7,
+        'login': 3,
+        'token_refresh': 14,
+        'logout': 9,
+        'change_password': 4,
+    }
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.author.profile.role = 'author'
+        self.author.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        patcher = mock.patch('blog.views.view_counter', ViewCounter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fill(self, n):
+        """Grow the data set to n posts, n categories and n approved comments on the first post."""
+        for i in range(Category.objects.count(), n):
+            category = Category.objects.create(name=f'Category {i}')
+            post = Post.objects.create(
+                title=f'Post {i}', content='Body', author=self.author, category=category, featured=True,
+            )
+            Comment.objects.create(post=post, name='a', email='a@example.com', content='c', approved=True)
+        first = Post.objects.earliest('created_at')
+        for _ in range(first.comments.count(), n):
+            Comment.objects.create(post=first, name='b', email='b@example.com', content='c', approved=True)
+        return {
+            'post': first.slug,
+            'category': first.category.slug,
+            'comment': first.comments.values_list('pk', flat=True).first(),
+        }
+
+    def measure(self, client, method, url, data=None):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = getattr(client, method)(url, data, format='json') if data else getattr(client, method)(url)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {url}: {response.content[:200]!r}')
+        recorder.response = response
+        return recorder
+
+    def report(self, route, budget, small, large=None):
+        lines = [f'{route}: budget {budget}, {len(small.queries)} queries for {self.SMALL} item(s)']
+        if large is not None:
+            lines[0] += f', {len(large.queries)} for {self.LARGE}'
+        small_sites = small.by_call_site()
+        for site, queries in (large or small).by_call_site().items():
+            growth = f' (was {len(small_sites.get(site, []))})' if large is not None else ''
+            lines.append(f'  {len(queries)}x{growth} {site}')
+            lines.extend(f'      {sql}' for sql in queries[:3])
+        return '\n'.join(lines)
+
+    def test_read_routes_within_budget_and_independent_of_page_size(self):
+        small = {}
+        keys = self.fill(self.SMALL)
+        for route, (url, budget) in self.READ_BUDGETS.items():
+            small[route] = self.measure(self.client, 'get', url.format(**keys))
+
+        keys = self.fill(self.LARGE)
+        for route, (url, budget) in self.READ_BUDGETS.items():
+            with self.subTest(route=route):
+                large = self.measure(self.client, 'get', url.format(**keys))
+                message = self.report(route, budget, small[route], large)
+                self.assertLessEqual(len(large.queries), len(small[route].queries), message)
+                self.assertLessEqual(len(large.queries), budget, message)
+                if route in self.FULL_PAGES:
+                    self.assertEqual(len(large.response.json()['results']), self.LARGE, route)
+
+    def test_auth_routes_within_budget(self):
+        password = 'Budget-pass-123'
+        user = User.objects.create_user('reader', 'reader@example.com', password)
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(user)
+        requests = {
+            'register': (anonymous, 'post', '/api/auth/register/', {
+                'username': 'new', 'email': 'new@example.com', 'password': password, 'password2': password,
+            }),
+            'login': (anonymous, 'post', '/api/auth/login/', {'username': 'reader', 'password': password}),
+            'token_refresh': (anonymous, 'post', '/api/auth/token/refresh/', {
+                'refresh': str(RefreshToken.for_user(user)),
+            }),
+            'logout': (authenticated, 'post', '/api/auth/logout/', {
+                'refresh_token': str(RefreshToken.for_user(user)),
+            }),
+            'change_password': (authenticated, 'put', '/api/auth/change-password/', {
+                'old_password': password, 'new_password': password,
+            }),
+        }
+        for route, budget in self.AUTH_BUDGETS.items():
+            with self.subTest(route=route):
+                recorder = self.measure(*requests[route])
+                self.assertLessEqual(len(recorder.queries), budget, self.report(route, budget, recorder))
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False, ROOT_URLCONF='backend.asgi_urls', RESPONSE_CACHE_ENABLED=False,
+    CONDITIONAL_GET_ENABLED=True,
+)
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        category = Category.objects.create(name='Django')
+        for i in range(3):
+            post = Post.objects.create(
+                title=f'Post {i}', content='Body', author=self.author, category=category, featured=True,
+            )
+            for _ in range(i * 6):
+                Comment.objects.create(post=post, name='a', email='a@example.com', content='c', approved=True)
+        self.post = post
+        patcher = mock.patch('blog.views.view_counter', ViewCounter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('blog.async_views.view_counter', ViewCounter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_async(self, url, headers=None):
+        return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def get_sync(self, url, **extra):
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            return self.client.get(url, **extra)
+
+    def test_routes_use_async_views(self):
+        for url in ('/api/posts/', '/api/posts/featured/', f'/api/posts/{self.post.slug}/', '/api/health/'):
+            self.assertTrue(iscoroutinefunction(resolve(url).func), url)
+        self.assertFalse(iscoroutinefunction(resolve('/api/posts/trending/').func))
+
+    def test_same_responses_as_sync_views(self):
+        urls = [
+            '/api/posts/', '/api/posts/?page=2&page_size=1', '/api/posts/?fields=slug,title&page_size=1',
+            '/api/posts/featured/', '/api/posts/popular/', f'/api/posts/{self.post.slug}/',
+            f'/api/posts/{self.post.slug}/?fields=slug,comments', '/api/categories/',
+            f'/api/comments/?post={self.post.slug}&page_size=5', '/api/posts/?search=post',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                expected, actual = self.get_sync(url), self.get_async(url)
+                self.assertEqual(actual.status_code, 200)
+                self.assertEqual(actual['Content-Type'], 'application/json')
+                expected, actual = expected.json(), actual.json()
+                if 'views' in expected:
+                    expected.pop('views'), actual.pop('views')
+                self.assertEqual(actual, expected)
+        self.assertEqual(self.get_async(f'/api/posts/{self.post.slug}/?fields=title').json(), {'title': 'Post 2'})
+
+    def test_falls_back_to_sync_views(self):
+        self.assertEqual(self.get_async('/api/posts/?page=9').status_code, 404)
+        self.assertEqual(self.get_async('/api/posts/missing/').status_code, 404)
+        token = RefreshToken.for_user(self.author).access_token
+        data = self.get_async('/api/posts/', {'Authorization': f'Bearer {token}'}).json()
+        self.assertTrue(data['results'][0]['is_author'])
+
+    def test_writes_fall_through_to_sync_views(self):
+        client = APIClient(enforce_csrf_checks=True)
+        response = client.post('/api/comments/', {
+            'post': self.post.pk, 'name': 'a', 'email': 'a@example.com', 'content': 'Hi',
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.author.profile.role = 'author'
+        self.author.profile.save()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.author).access_token}')
+        response = client.post('/api/posts/', {'title': 'New', 'content': 'Body'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        response = client.patch(f'/api/posts/{response.data["slug"]}/', {'title': 'Renamed'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_detail_counts_views_and_conditional_get(self):
+        counter = ViewCounter()
+        with mock.patch('blog.async_views.view_counter', counter):
+            first = self.get_async(f'/api/posts/{self.post.slug}/')
+            response = self.get_async(f'/api/posts/{self.post.slug}/', {'If-None-Match': first['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(counter.flush(), {self.post.pk: 2})
+        # Same validators as the sync view
+        self.assertEqual(self.get_sync(f'/api/posts/{self.post.slug}/')['ETag'], first['ETag'])
+
+    def test_metrics_count_async_queries(self):
+        request_metrics.registry.reset()
+        self.get_async('/api/posts/')
+        body = request_metrics.registry.render()
+        self.assertIn('devscribe_request_db_queries_sum{endpoint="post-list",method="GET"} 2', body)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTests(SimpleTestCase):
+    post_list = staticmethod(PostViewSet.as_view({'get': 'list', 'post': 'create'}))
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def request(self, method, view, token='a', status=200, write=False):
+        """(read alias before, read alias after a possible write) inside one request."""
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+            seen.append(self.router.db_for_read(Post))
+            return HttpResponse(status=status)
+
+        middleware = ReplicaPinMiddleware(get_response)
+        middleware(self.factory.generic(method, '/api/posts/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        return seen
+
+    def test_viewset_reads_use_replicas(self):
+        self.assertIn(self.request('GET', self.post_list)[0], {'replica_0', 'replica_1'})
+        # Auth views, and reads outside a request, use the primary
+        self.assertEqual(self.request('GET', ChangePasswordView.as_view()), [None, None])
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    def test_reads_after_a_write_stick_to_the_primary(self):
+        self.assertEqual(self.request('POST', self.post_list, write=True), [None, None])
+        self.assertEqual(self.request('GET', self.post_list), [None, None])
+        # Other clients are not pinned, and the pin expires
+        self.assertIsNotNone(self.request('GET', self.post_list, token='b')[0])
+        cache.clear()
+        self.assertIsNotNone(self.request('GET', self.post_list)[0])
+
+    def test_failed_writes_do_not_pin(self):
+        self.request('POST', self.post_list, status=400, write=True)
+        self.assertIsNotNone(self.request('GET', self.post_list)[0])
+        # A write within a GET still moves the rest of that request to the primary
+        before, after = self.request('GET', self.post_list, write=True)
+        self.assertIsNotNone(before)
+        self.assertIsNone(after)
+
+    def test_replica_reads_are_not_cached_right_after_a_write(self):
+        def get_response(request):
+            middleware.process_view(request, self.post_list, (), {})
+            self.router.db_for_read(Post)
+            response_cache.store('blog:test:replica', {'stale': True}, ('post',))
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(get_response)
+        response_cache.get_last_modified(('post',))  # unknown counts as just written
+        middleware(self.factory.get('/api/posts/'))
+        self.assertIsNone(cache.get('blog:test:replica'))
+        with mock.patch('blog.response_cache.time.time', return_value=response_cache.get_last_modified(('post',)) + 60):
+            middleware(self.factory.get('/api/posts/'))
+        self.assertEqual(cache.get('blog:test:replica'), {'stale': True})
+
+
+def uploaded_image(name='photo.jpg', size=(800, 600), format='JPEG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{format.lower()}')
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, UPLOAD_WORKER_THREAD=False)
+class UploadPipelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media, staging = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.addCleanup(shutil.rmtree, staging)
+        # A filesystem stand-in for Cloudinary
+        settings = override_settings(
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            MEDIA_ROOT=media, UPLOAD_STAGING_ROOT=staging,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.media, self.staging = Path(media), Path(staging)
+        self.author = User.objects.create_user('author', 'author@example.com', 'pass')
+        self.author.profile.role = 'author'
+        self.author.profile.save()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_post_image_is_stored_by_the_worker(self):
+        response = self.client.post('/api/posts/', {
+            'title': 'With image', 'content': 'Body', 'image': uploaded_image(),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.data['image'])  # not stored yet
+        upload = PendingUpload.objects.get()
+        self.assertEqual((upload.target, upload.status), ('post.image', 'pending'))
+        self.assertTrue((self.staging / upload.staged_name).exists())
+
+        call_command('process_uploads', stdout=io.StringIO())
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'done')
+        self.assertFalse((self.staging / upload.staged_name).exists())
+        post = Post.objects.get()
+        self.assertTrue((self.media / post.image.name).exists())
+        self.assertEqual(sorted(post.image_variants, key=int), ['320', '640', '800'])
+        with Image.open(self.media / post.image_variants['320']) as variant:
+            self.assertEqual((variant.format, variant.size), ('WEBP', (320, 240)))
+
+        item = self.client.get('/api/posts/').data['results'][0]
+        self.assertTrue(item['image'].endswith('-320w.webp'))
+        self.assertEqual(
+            [entry.split()[1] for entry in item['image_srcset'].split(', ')], ['320w', '640w', '800w']
+        )
+        detail = self.client.get(f'/api/posts/{post.slug}/').data
+        self.assertTrue(detail['image'].endswith(post.image.name))
+
+    def test_replacing_and_clearing(self):
+        post = Post.objects.create(title='Post', content='Body', author=self.author)
+        url = f'/api/posts/{post.slug}/'
+        self.client.patch(url, {'image': uploaded_image('a.png', format='PNG')}, format='multipart')
+        self.client.patch(url, {'image': uploaded_image('b.png', size=(200, 100), format='PNG')}, format='multipart')
+        self.assertEqual(PendingUpload.objects.count(), 1)  # the first one never gets stored
+        call_command('process_uploads', stdout=io.StringIO())
+        post.refresh_from_db()
+        self.assertEqual(list(post.image_variants), ['200'])
+        old_files = [post.image.name, post.image_variants['200']]
+
+        self.client.patch(url, {'image': ''}, format='multipart')
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertEqual(post.image_variants, {})
+        self.assertTrue(all((self.media / name).exists() for name in old_files))
+
+    def test_clearing_cancels_the_upload(self):
+        post = Post.objects.create(title='Post', content='Body', author=self.author)
+        url = f'/api/posts/{post.slug}/'
+        self.client.patch(url, {'image': uploaded_image()}, format='multipart')
+        staged = PendingUpload.objects.get().staged_name
+        self.client.patch(url, {'image': ''}, format='multipart')
+        self.assertFalse(PendingUpload.objects.exists())
+        self.assertFalse((self.staging / staged).exists())
+
+        # Cleared while the worker is storing it
+        self.client.patch(url, {'image': uploaded_image()}, format='multipart')
+        upload = uploads.claim_next()
+        self.client.patch(url, {'image': ''}, format='multipart')
+        uploads.process(upload)
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertEqual(post.image_variants, {})
+        self.assertEqual(list(self.media.rglob('*.*')), [])
+        self.assertFalse((self.staging / upload.staged_name).exists())
+
+    def test_failed_uploads_are_retried_then_given_up(self):
+        profile = self.author.profile
+        self.client.patch('/api/profile/', {'avatar': uploaded_image('me.gif', format='GIF')}, format='multipart')
+        upload = PendingUpload.objects.get(target='profile.avatar', object_id=profile.pk)
+        (self.staging / upload.staged_name).write_bytes(b'not an image')
+        with self.assertLogs('blog.uploads', 'ERROR'):
+            for _ in range(2):
+                call_command('process_uploads', stdout=io.StringIO())
+            self.assertTrue((self.staging / upload.staged_name).exists())
+            call_command('process_uploads', stdout=io.StringIO())
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts), ('failed', 3))
+        self.assertFalse((self.staging / upload.staged_name).exists())
+        self.assertIn('UnidentifiedImageError', upload.error)
+        profile.refresh_from_db()
+        self.assertFalse(profile.avatar)
+
+    def test_avatar_srcset(self):
+        self.client.patch('/api/profile/', {'avatar': uploaded_image(size=(400, 400))}, format='multipart')
+        call_command('process_uploads', stdout=io.StringIO())
+        self.author.profile.refresh_from_db()  # force_authenticate keeps this user object
+        data = self.client.get('/api/profile/').data
+        self.assertTrue(data['avatar'].endswith('.jpg'))
+        self.assertEqual(len(data['avatar_srcset'].split(', ')), 2)
@@ -0,0 +1,161 @@
+"""
+Token-bucket throttles for the endpoints that are expensive on purpose
+(login and register hash passwords) or write for anonymous clients
+(comments). They run in DRF's ``initial()``, before the view, so a
+rejected request costs no hashing and no query.
+
+Buckets hold ``n`` tokens and refill at ``n`` per period (THROTTLE_RATES,
+e.g. "5/min"), keyed per client IP and, for login, per username too. They
+live in this process (LocalBucketBackend) unless THROTTLE_BACKEND names a
+shared one such as CacheBucketBackend.
+"""
+import hashlib
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'5/min' -> (capacity 5, refill 5/60 tokens per second)"""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period[0]]
+
+
+class LocalBucketBackend:
+    """
+    Buckets in a dict of this process, without a lock: each update replaces
+    one tuple, which is atomic under the GIL. Two threads taking the last
+    token at the same moment may both get it; a flood still can't. Once
+    there are more than ``max_keys``, full buckets are dropped and, if that
+    isn't enough, the least recently used ones, down to 90% of ``max_keys``:
+    a pass over the dict at most once per ``max_keys / 10`` new keys.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = {}
+
+    def take(self, key, capacity, refill):
+        """Take a token; returns (allowed, seconds until the next token)."""
+        now = time.monotonic()
+        # Popped and put back, so the dict stays in least recently used order
+        tokens, stamp, _ = self._buckets.pop(key, (capacity, now, now))
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill)
+        if len(self._buckets) > self.max_keys:
+            self._prune(now)
+        return allowed, 0 if allowed else (1 - tokens) / refill
+
+    def _prune(self, now):
+        # A bucket that has refilled completely is the same as no bucket
+        buckets = {key: bucket for key, bucket in list(self._buckets.items()) if bucket[2] > now}
+        excess = len(buckets) - (self.max_keys - max(1, self.max_keys // 10))
+        for key in list(islice(buckets, max(0, excess))):
+            del buckets[key]
+        self._buckets = buckets
+
+    def clear(self):
+        self._buckets = {}
+
+
+class CacheBucketBackend:
+    """
+    Buckets in a shared Django cache (Redis), so every worker draws from
+    the same ones. Read-then-write without a lock: concurrent requests of
+    one client can each take the same token, which over-admits by at most
+    the number of requests in flight.
+    """
+
+    key_prefix = 'blog:throttle:'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, refill):
+        now = time.time()
+        key = f'{self.key_prefix}{key}'
+        tokens, stamp = self.cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0, now - stamp) * refill)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        # Gone once it would have refilled anyway
+        self.cache.set(key, (tokens, now), int((capacity - tokens) / refill) + 1)
+        return allowed, 0 if allowed else (1 - tokens) / refill
+
+    def clear(self):
+        pass
+
+
+def _build_backend():
+    backend = getattr(settings, 'THROTTLE_BACKEND', None)
+    return import_string(backend)() if backend else LocalBucketBackend()
+
+
+backend = _build_backend()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    One bucket per ``scope`` and ``get_ident_key()``; the rate is
+    THROTTLE_RATES[scope]. THROTTLE_ENABLED=False turns all of them off.
+    """
+
+    scope = None
+
+    def get_ident_key(self, request, view):
+        """What to count requests by; None skips the throttle."""
+        return self.get_ident(request)
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        if not getattr(settings, 'THROTTLE_ENABLED', True):
+            return True
+        rate = getattr(settings, 'THROTTLE_RATES', {}).get(self.scope)
+        ident = self.get_ident_key(request, view)
+        if rate is None or ident is None:
+            return True
+        digest = hashlib.sha256(str(ident).encode()).hexdigest()[:32]
+        allowed, wait = backend.take(f'{self.scope}:{digest}', *parse_rate(rate))
+        if not allowed:
+            self.wait_seconds = wait
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = 'login-ip'
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    """Per account, so stuffing one account from many IPs is limited too."""
+
+    scope = 'login-username'
+
+    def get_ident_key(self, request, view):
+        username = request.data.get('username')
+        return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+class RegisterIPThrottle(TokenBucketThrottle):
+    scope = 'register-ip'
+
+
+class AnonCommentThrottle(TokenBucketThrottle):
+    scope = 'comment-anon-ip'
+
+    def get_ident_key(self, request, view):
+        if request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
@@ -0,0 +1,191 @@
+"""
+Refresh token blacklist checks without a query per check. Each process
+keeps the jtis of the unexpired blacklisted tokens in a set, loaded from
+the database; every blacklisting after commit is published through a
+numbered cache entry, which the other processes apply before their next
+check. When they can't (an entry was evicted, or too many to catch up on)
+they reload the set. Only correct with a cache shared by all processes,
+so it is off (JWT_BLACKLIST_INDEX=False) unless REDIS_URL is set.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+GENERATION_KEY = 'blog:jwt-blacklist:gen'
+# More new entries than this since the last check: reload instead
+MAX_CATCH_UP = 500
+
+
+def is_enabled():
+    return getattr(settings, 'JWT_BLACKLIST_INDEX', False)
+
+
+def rebuild_seconds():
+    return getattr(settings, 'JWT_BLACKLIST_REBUILD_SECONDS', 3600)
+
+
+def _entry_key(generation):
+    return f'blog:jwt-blacklist:{generation}'
+
+
+def _entry_timeout():
+    # Long enough for every process to catch up before the token expires
+    return int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+
+
+def get_generation():
+    # Seeded from the clock, like the response cache generations, so an
+    # evicted counter never comes back with a value a process already saw
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def publish(jti):
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.incr(GENERATION_KEY)
+    cache.set(_entry_key(generation), jti, _entry_timeout())
+    index.add(jti, generation)
+
+
+class BlacklistIndex:
+    """The blacklisted jtis this process knows of, and the generation they are current to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jtis = set()
+        self._generation = None
+        self._built_at = None
+        self.rebuilds = 0
+
+    def contains(self, jti):
+        generation = get_generation()
+        with self._lock:
+            stale = self._built_at is None or time.monotonic() - self._built_at > rebuild_seconds()
+            if stale or not self._catch_up(generation):
+                self._rebuild(generation)
+            return jti in self._jtis
+
+    def add(self, jti, generation):
+        with self._lock:
+            self._jtis.add(jti)
+            if self._generation is not None and generation == self._generation + 1:
+                self._generation = generation
+
+    def clear(self):
+        with self._lock:
+            self._jtis = set()
+            self._generation = self._built_at = None
+            self.rebuilds = 0
+
+    def _catch_up(self, generation):
+        """Apply the published entries up to ``generation``; False if that isn't possible."""
+        if generation == self._generation:
+            return True
+        if self._generation is None or not 0 < generation - self._generation <= MAX_CATCH_UP:
+            return False
+        keys = [_entry_key(g) for g in range(self._generation + 1, generation + 1)]
+        entries = cache.get_many(keys)
+        if len(entries) < len(keys):  # evicted, or published a moment ago
+            return False
+        self._jtis.update(entries.values())
+        self._generation = generation
+        return True
+
+    def _rebuild(self, generation):
+        # Read the generation before the rows: anything blacklisted in
+        # between is applied again on the next check, which is harmless
+        self._jtis = set(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .values_list('token__jti', flat=True)
+            .iterator(chunk_size=10_000)
+        )
+        self._generation = generation
+        self._built_at = time.monotonic()
+        self.rebuilds += 1
+
+
+index = BlacklistIndex()
+
+
+class IndexedRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check uses ``index`` when JWT_BLACKLIST_INDEX
+    is on. Rotation (blacklist, then outstand the new jti) looks the user
+    up once instead of twice.
+    """
+
+    def check_blacklist(self):
+        if not is_enabled():
+            return super().check_blacklist()
+        if index.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def token_user(self):
+        if not hasattr(self, '_token_user'):
+            user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+            self._token_user = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        return self._token_user
+
+    def outstand(self):
+        return OutstandingToken.objects.get_or_create(
+            jti=self.payload[api_settings.JTI_CLAIM],
+            defaults={
+                'user': self.token_user(),
+                'created_at': self.current_time,
+                'token': str(self),
+                'expires_at': datetime_from_epoch(self.payload['exp']),
+            },
+        )
+
+    def blacklist(self):
+        result = BlacklistedToken.objects.get_or_create(token=self.outstand()[0])
+        if is_enabled():
+            jti = self.payload[api_settings.JTI_CLAIM]
+            transaction.on_commit(lambda: publish(jti))
+        return result
+
+
+class IndexedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = IndexedRefreshToken
+
+
+def prune_expired(chunk_size=1000, pause=0.0):
+    """
+    Delete expired outstanding tokens and their blacklist rows,
+    ``chunk_size`` per transaction so no lock is held for long. Yields
+    (outstanding, blacklisted) deleted per chunk.
+    """
+    cutoff = timezone.now()
+    last_id = 0
+    while True:
+        # Expired tokens are the oldest, so walking by id finds them first
+        ids = list(
+            OutstandingToken.objects.filter(id__gt=last_id, expires_at__lte=cutoff)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        with transaction.atomic():
+            deleted = OutstandingToken.objects.filter(id__in=ids).delete()[1]
+        last_id = ids[-1]
+        yield deleted.get(OutstandingToken._meta.label, 0), deleted.get(BlacklistedToken._meta.label, 0)
+        if pause:
+            time.sleep(pause)
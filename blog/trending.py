@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import response_cache
+from .models import Post, PostRanking, PostViewBucket
+from .signals import views_flushed
+
+# window -> (length, score half-life)
+WINDOWS = {
+    '24h': (timedelta(hours=24), timedelta(hours=6)),
+    '7d': (timedelta(days=7), timedelta(days=1)),
+    '30d': (timedelta(days=30), timedelta(days=5)),
+}
+DEFAULT_WINDOW = '24h'
+POPULAR_WINDOW = getattr(settings, 'POPULAR_POSTS_WINDOW', '7d')
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+@receiver(views_flushed)
+def record_view_buckets(sender, counts, **kwargs):
+    """Add flushed views to this hour's bucket for each post."""
+    hour = current_hour()
+    # Posts deleted since their views were buffered would fail the foreign
+    # key check at commit, and with it the whole flush's buckets
+    existing = set(Post.objects.filter(pk__in=counts).values_list('pk', flat=True))
+    counts = {pk: n for pk, n in counts.items() if pk in existing}
+    with transaction.atomic():
+        # Create missing rows first and always add with F(), so concurrent
+        # flushes never overwrite each other.
+        PostViewBucket.objects.bulk_create(
+            [PostViewBucket(post_id=pk, hour=hour) for pk in counts],
+            ignore_conflicts=True,
+        )
+        by_increment = defaultdict(list)
+        for pk, n in counts.items():
+            by_increment[n].append(pk)
+        for n, pks in by_increment.items():
+            PostViewBucket.objects.filter(hour=hour, post_id__in=pks).update(views=F('views') + n)
+
+
+def decay(now, since, half_life):
+    """
+    The weight of each hourly bucket since ``since`` as a SQL expression,
+    halving every ``half_life``; 0 for older buckets.
+    """
+    hours = []
+    hour = current_hour(now)
+    while hour >= since:
+        hours.append(hour)
+        hour -= timedelta(hours=1)
+    return Case(
+        *(When(hour=hour, then=Value(0.5 ** ((now - hour) / half_life))) for hour in hours),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+
+def refresh_rankings(now=None):
+    """
+    Recompute PostRanking for every window from the hourly buckets, replacing
+    the rows in place, and drop buckets older than the longest window.
+    Returns {window: number of ranked posts}.
+    """
+    now = now or timezone.now()
+    longest = max(length for length, _ in WINDOWS.values())
+    # One row per post with its score in every window, summed by the database
+    scores = list(
+        PostViewBucket.objects.filter(hour__gte=now - longest, post__published=True)
+        .order_by().values('post')
+        .annotate(**{
+            window: Sum(F('views') * decay(now, now - length, half_life))
+            for window, (length, half_life) in WINDOWS.items()
+        })
+    )
+
+    ranked = {}
+    with transaction.atomic():
+        for window in WINDOWS:
+            # Posts with views in the window; the others score 0
+            rankings = [
+                PostRanking(post_id=row['post'], window=window, score=row[window], computed_at=now)
+                for row in scores if row[window]
+            ]
+            PostRanking.objects.bulk_create(
+                rankings,
+                update_conflicts=True,
+                unique_fields=['post', 'window'],
+                update_fields=['score', 'computed_at'],
+            )
+            PostRanking.objects.filter(window=window, computed_at__lt=now).delete()
+            ranked[window] = len(rankings)
+
+        PostViewBucket.objects.filter(hour__lt=now - longest).delete()
+    response_cache.bump('ranking')
+    return ranked
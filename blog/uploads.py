@@ -0,0 +1,209 @@
+"""
+Image uploads off the request path. The API stages the file on local disk
+(UPLOAD_STAGING_ROOT) and queues a PendingUpload; the upload worker stores
+the original in the field's storage (Cloudinary in production) and adds
+resized WebP variants (IMAGE_VARIANT_WIDTHS) for srcset. The worker runs
+as ``manage.py process_uploads --loop``, or as a thread in each web process
+with UPLOAD_WORKER_THREAD.
+"""
+import io
+import logging
+import os
+import threading
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import PendingUpload, Post, UserProfile
+from .response_cache import bump
+
+logger = logging.getLogger(__name__)
+
+# name: (model, image field, variants field, response cache scopes)
+TARGETS = {
+    'post.image': (Post, 'image', 'image_variants', ('post',)),
+    'profile.avatar': (UserProfile, 'avatar', 'avatar_variants', ()),
+}
+MAX_ATTEMPTS = 3
+# A claim older than this belongs to a worker that died
+STALE_CLAIM = timedelta(minutes=10)
+
+
+def staging_storage():
+    return FileSystemStorage(location=settings.UPLOAD_STAGING_ROOT)
+
+
+def target_for(instance, field_name):
+    for name, (model, image_field, _, _) in TARGETS.items():
+        if isinstance(instance, model) and image_field == field_name:
+            return name
+    raise ValueError(f'No upload target for {type(instance).__name__}.{field_name}')
+
+
+def stage(instance, field_name, file):
+    """Queue ``file`` for ``instance.<field_name>``, replacing an upload still waiting."""
+    target = target_for(instance, field_name)
+    storage = staging_storage()
+    extension = os.path.splitext(file.name)[1].lower()
+    staged_name = storage.save(f'{target}/{instance.pk}/{uuid.uuid4().hex}{extension}', file)
+    cancel(instance, field_name)
+    upload = PendingUpload.objects.create(
+        target=target, object_id=instance.pk, staged_name=staged_name,
+        original_name=os.path.basename(file.name),
+    )
+    transaction.on_commit(worker.wake)
+    return upload
+
+
+def cancel(instance, field_name):
+    """
+    Drop the uploads waiting or in progress for ``instance.<field_name>``,
+    when it's cleared or replaced. A worker busy with one of them discards
+    its result (see ``process``).
+    """
+    storage = staging_storage()
+    uploads = PendingUpload.objects.filter(
+        target=target_for(instance, field_name), object_id=instance.pk, status__in=('pending', 'processing'),
+    )
+    for upload in uploads:
+        if upload.status == 'pending':  # a processing one is the worker's to delete
+            storage.delete(upload.staged_name)
+        upload.delete()
+
+
+def make_variants(file, widths):
+    """[(width, WebP ContentFile)] no wider than the image itself."""
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        transparent = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent else 'RGB')
+        variants = []
+        for width in sorted({min(width, image.width) for width in widths}):
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, 'WEBP', quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+            variants.append((width, ContentFile(buffer.getvalue())))
+        return variants
+
+
+def process(upload):
+    model, field_name, variants_field, scopes = TARGETS[upload.target]
+    instance = model.objects.filter(pk=upload.object_id).first()
+    staging = staging_storage()
+    if instance is None:  # deleted in the meantime
+        staging.delete(upload.staged_name)
+        return
+    field = model._meta.get_field(field_name)
+    storage = getattr(instance, field_name).storage
+    old_names = [getattr(instance, field_name).name, *getattr(instance, variants_field).values()]
+
+    with staging.open(upload.staged_name) as staged:
+        name = storage.save(field.generate_filename(instance, upload.original_name), staged)
+        staged.seek(0)
+        stem = os.path.splitext(name)[0]
+        variants = {
+            str(width): storage.save(f'{stem}-{width}w.webp', content)
+            for width, content in make_variants(staged, settings.IMAGE_VARIANT_WIDTHS)
+        }
+    with transaction.atomic():
+        # Only while the upload is still wanted: cancel() deletes it when the
+        # image is cleared or replaced in the meantime
+        wanted = PendingUpload.objects.select_for_update().filter(pk=upload.pk).exists()
+        if wanted:
+            # A queryset update, so fields edited since the instance was loaded stay
+            model.objects.filter(pk=instance.pk).update(**{field_name: name, variants_field: variants})
+    staging.delete(upload.staged_name)
+    if not wanted:
+        for stored_name in [name, *variants.values()]:
+            storage.delete(stored_name)
+        return
+    if scopes:
+        bump(*scopes)
+    for old_name in filter(None, old_names):
+        storage.delete(old_name)
+
+
+def claim_next(exclude=()):
+    """The oldest waiting upload, marked as processing, or None."""
+    claimable = Q(status='pending') | Q(status='processing', updated_at__lt=timezone.now() - STALE_CLAIM)
+    candidates = PendingUpload.objects.filter(claimable).exclude(pk__in=exclude)
+    for pk in candidates.values_list('pk', flat=True)[:10]:
+        # Conditional, so two workers never take the same upload
+        claimed = PendingUpload.objects.filter(claimable, pk=pk).update(
+            status='processing', attempts=F('attempts') + 1, updated_at=timezone.now(),
+        )
+        if claimed:
+            return PendingUpload.objects.get(pk=pk)
+    return None
+
+
+def process_pending(limit=None):
+    """Process waiting uploads, each at most once; returns (done, failed)."""
+    done = failed = 0
+    seen = []  # failed uploads are retried on the next run
+    while limit is None or done + failed < limit:
+        upload = claim_next(exclude=seen)
+        if upload is None:
+            break
+        seen.append(upload.pk)
+        try:
+            process(upload)
+        except Exception as error:
+            logger.exception('Upload %s failed', upload.pk)
+            given_up = upload.attempts >= MAX_ATTEMPTS
+            if not finish(upload, 'failed' if given_up else 'pending', repr(error)) or given_up:
+                # Nothing will retry it
+                staging_storage().delete(upload.staged_name)
+            failed += 1
+        else:
+            finish(upload, 'done')
+            done += 1
+    return done, failed
+
+
+def finish(upload, status, error=''):
+    """Record the outcome of a claimed upload; False if it was cancelled meanwhile."""
+    # A queryset update: cancel() may have deleted the row
+    return bool(PendingUpload.objects.filter(pk=upload.pk).update(
+        status=status, error=error, updated_at=timezone.now(),
+    ))
+
+
+class UploadWorker:
+    """Processes uploads in a daemon thread of the web process, woken after each staged upload."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def wake(self):
+        if not getattr(settings, 'UPLOAD_WORKER_THREAD', False):
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='blog-upload-worker', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                process_pending()
+            except Exception:
+                logger.exception('Upload worker failed')
+            finally:
+                close_old_connections()
+
+
+worker = UploadWorker()
@@ -10,7 +10,9 @@ from .views import (
     logout,
     UserProfileView,
     ChangePasswordView,
-    health_check
+    HomeView,
+    health_check,
+    metrics
 )
 
 router = DefaultRouter()
@@ -20,6 +22,7 @@ router.register(r'comments', CommentViewSet, basename='comment')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('home/', HomeView.as_view(), name='home'),
     
     # Auth endpoints
     path('auth/register/', register, name='register'),
@@ -31,5 +34,6 @@ urlpatterns = [
     # Profile
     path('profile/', UserProfileView.as_view(), name='profile'),
     
-    path('health/', health_check, name='health_check')
+    path('health/', health_check, name='health_check'),
+    path('metrics/', metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,171 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .signals import views_flushed
+
+logger = logging.getLogger(__name__)
+
+
+class LocalViewCountBackend:
+    """Buffers increments in this process. Anything not flushed is lost if the process dies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def add(self, post_id, n=1):
+        with self._lock:
+            self._counts[post_id] += n
+            return self._counts[post_id]
+
+    def drain(self, post_ids=None):
+        with self._lock:
+            if post_ids is None:
+                counts, self._counts = self._counts, Counter()
+                return dict(counts)
+            return {pk: self._counts.pop(pk) for pk in post_ids if pk in self._counts}
+
+
+class CacheViewCountBackend:
+    """
+    Buffers increments in a shared Django cache (Redis / Memcached) so several
+    workers add to the same counters and a worker restart doesn't drop them.
+
+    Each process only remembers the posts it has touched itself; draining the
+    whole cache (``flush_view_counts --all``) needs the candidate post ids.
+    """
+
+    key_prefix = 'blog:views:'
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+        self._lock = threading.Lock()
+        self._dirty = set()
+
+    def _key(self, post_id):
+        return f'{self.key_prefix}{post_id}'
+
+    def add(self, post_id, n=1):
+        key = self._key(post_id)
+        if self.cache.add(key, n, timeout=None):
+            value = n
+        else:
+            value = self.cache.incr(key, n)
+        with self._lock:
+            self._dirty.add(post_id)
+        return value
+
+    def _claim(self, key, value):
+        # There is no atomic get-and-reset in the cache API, so take what we
+        # read with decr() and hand back anything another drainer got first.
+        remaining = self.cache.decr(key, value)
+        if remaining < 0:
+            self.cache.incr(key, -remaining)
+            return value + remaining
+        return value
+
+    def drain(self, post_ids=None):
+        if post_ids is None:
+            with self._lock:
+                post_ids, self._dirty = self._dirty, set()
+        keys = {self._key(pk): pk for pk in post_ids}
+        counts = {}
+        for key, value in self.cache.get_many(list(keys)).items():
+            if value and value > 0:
+                claimed = self._claim(key, value)
+                if claimed > 0:
+                    counts[keys[key]] = claimed
+        return counts
+
+
+class ViewCounter:
+    """
+    Collects post views and writes them in batches: one
+    ``UPDATE ... SET views = views + n`` per distinct increment, instead of a
+    read-modify-write per request.
+    """
+
+    def __init__(self, backend=None, flush_interval=None):
+        self.backend = backend if backend is not None else LocalViewCountBackend()
+        self.flush_interval = flush_interval
+        self._flush_lock = threading.Lock()
+        self._next_flush = self._schedule()
+
+    def _schedule(self):
+        if self.flush_interval is None:
+            return None
+        return time.monotonic() + self.flush_interval
+
+    def record(self, post_id, n=1):
+        """Buffer ``n`` views for a post and return the buffered total for it."""
+        pending = self.backend.add(post_id, n)
+        if self._next_flush is not None and time.monotonic() >= self._next_flush:
+            # On the reader's request: a failed write (e.g. "database is
+            # locked") must not fail it. flush() has put the counts back.
+            try:
+                self.flush(blocking=False)
+            except Exception:
+                logger.exception('Flushing view counts failed; retrying on the next flush')
+        return pending
+
+    def flush(self, post_ids=None, blocking=True):
+        """Write buffered counts to the database and return them."""
+        if not self._flush_lock.acquire(blocking=blocking):
+            return {}
+        try:
+            self._next_flush = self._schedule()
+            counts = self.backend.drain(post_ids)
+            if not counts:
+                return {}
+
+            by_increment = defaultdict(list)
+            for pk, n in counts.items():
+                by_increment[n].append(pk)
+
+            try:
+                with transaction.atomic():
+                    for n, pks in by_increment.items():
+                        Post.objects.filter(pk__in=pks).update(views=F('views') + n)
+            except Exception:
+                for pk, n in counts.items():
+                    self.backend.add(pk, n)
+                raise
+
+            # The counts are written: a failing receiver (author stats,
+            # trending buckets) is logged rather than raised, since putting
+            # them back would count them twice
+            for receiver, result in views_flushed.send_robust(sender=Post, counts=counts):
+                if isinstance(result, Exception):
+                    logger.error('views_flushed receiver %r failed', receiver, exc_info=result)
+            return counts
+        finally:
+            self._flush_lock.release()
+
+
+def _build_view_counter():
+    backend = getattr(settings, 'VIEW_COUNT_BACKEND', None)
+    return ViewCounter(
+        backend=import_string(backend)() if backend else None,
+        flush_interval=getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10),
+    )
+
+
+view_counter = _build_view_counter()
+
+
+@atexit.register
+def flush_at_exit():
+    try:
+        view_counter.flush()
+    except Exception:
+        pass
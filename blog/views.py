@@ -1,12 +1,31 @@
 from rest_framework import viewsets, filters, status, permissions, generics
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.urls import reverse
+from django.views.decorators.http import require_GET
 from django.db.models import Count, Q
 from .models import Post, Category, Comment, UserProfile
+from .authentication import user_role
+from .throttling import AnonCommentThrottle, LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle
+from .token_blacklist import IndexedRefreshToken
+from . import metrics as request_metrics, response_cache
+from .fast_serializers import FastListViewMixin
+from .pagination import KeysetPagination, PageSizePagination, PostPagination
+from .response_cache import CATEGORY_SCOPES, POST_SCOPES, RANKING_SCOPES, cache_response
+from .trending import DEFAULT_WINDOW, POPULAR_WINDOW, WINDOWS
+from .search import FullTextSearchFilter
+from .sparse_fields import SparseFieldsViewMixin
+from .view_counts import view_counter
 from .serializers import (
     PostListSerializer, 
     PostDetailSerializer, 
@@ -28,11 +47,12 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
 
 class IsAuthorRole(permissions.BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.profile.role == 'author'
+        return request.user.is_authenticated and user_role(request.user) == 'author'
 
 # Authentication Views
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterIPThrottle])
 def register(request):
     serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
@@ -51,6 +71,7 @@ def register(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([LoginIPThrottle, LoginUsernameThrottle])
 def login(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -74,7 +95,7 @@ def login(request):
 def logout(request):
     try:
         refresh_token = request.data.get('refresh_token')
-        token = RefreshToken(refresh_token)
+        token = IndexedRefreshToken(refresh_token)
         token.blacklist()
         return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
     except Exception:
@@ -95,7 +116,8 @@ class ChangePasswordView(generics.UpdateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        user = request.user
+        # Not request.user: that may come from the auth cache, without the password hash
+        user = User.objects.get(pk=request.user.pk)
         if not user.check_password(serializer.data.get('old_password')):
             return Response({'error': 'Wrong password'}, status=status.HTTP_400_BAD_REQUEST)
         
@@ -104,12 +126,13 @@ class ChangePasswordView(generics.UpdateAPIView):
         
         return Response({'message': 'Password updated successfully'}, status=status.HTTP_200_OK)
 
-class PostViewSet(viewsets.ModelViewSet):
-    queryset = Post.objects.filter(published=True).select_related('author', 'category')
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+class PostViewSet(FastListViewMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Post.objects.filter(published=True).with_counts()
+    filter_backends = [FullTextSearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'content', 'excerpt']
     ordering_fields = ['created_at', 'title', 'views']
     lookup_field = 'slug'
+    pagination_class = PostPagination
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -132,30 +155,67 @@ class PostViewSet(viewsets.ModelViewSet):
         if self.request.user.is_authenticated:
             queryset = Post.objects.filter(
                 Q(published=True) | Q(author=self.request.user)
-            ).select_related('author', 'category')
+            ).with_counts()
         
+        if self.request.method == 'GET':
+            queryset = self.sparse_queryset(queryset)
         return queryset
     
+    def published_posts(self):
+        # Public posts, loading only the columns the response needs
+        return self.sparse_queryset(self.queryset.all())
+    
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
     
+    @cache_response(*POST_SCOPES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        # Only increment views for non-authors
-        if not request.user.is_authenticated or instance.author != request.user:
-            instance.views += 1
-            instance.save(update_fields=['views'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        # Only count views for non-authors; buffered and written in batches
+        counted = 0
+        if not request.user.is_authenticated or instance.author_id != request.user.id:
+            counted = view_counter.record(instance.pk)
+        # The validators leave out views (patched in below), so a 304 is
+        # still counted above without changing the ETag
+        name = f'post-detail:{instance.pk}'
+        key = response_cache.make_key(request, name, POST_SCOPES)
+        validators = response_cache.Validators(key, POST_SCOPES)
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        # Only the serialized body is cached, so views are still counted
+        data = response_cache.get_or_set(
+            request, name, POST_SCOPES,
+            lambda: self.get_serializer(instance).data,
+            key=key,
+        )
+        if 'views' in data:  # not when left out by ?fields=
+            data['views'] = instance.views + counted
+        return validators.apply(Response(data))
+    
+    @action(detail=True, methods=['get'])
+    def comments(self, request, slug=None):
+        # Approved comments of one post, newest first, cursor-paginated
+        post = self.get_object()
+        comments = self.as_rows(self.sparse_queryset(
+            post.comments.filter(approved=True).select_related('user'), CommentSerializer
+        ), CommentSerializer)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(comments, request, self)
+        serializer = self.get_list_serializer(page, CommentSerializer)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def my_posts(self, request):
         if not request.user.is_authenticated:
             return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
         
-        posts = Post.objects.filter(author=request.user).select_related('category')
+        posts = self.sparse_queryset(Post.objects.filter(author=request.user).with_counts())
         page = self.paginate_queryset(posts)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -164,16 +224,18 @@ class PostViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response(*POST_SCOPES)
     def featured(self, request):
-        featured_posts = self.queryset.filter(featured=True)[:5]
+        featured_posts = self.as_rows(self.published_posts().filter(featured=True))[:5]
         serializer = self.get_serializer(featured_posts, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response(*POST_SCOPES)
     def by_category(self, request):
         category_slug = request.query_params.get('category')
         if category_slug:
-            posts = self.queryset.filter(category__slug=category_slug)
+            posts = self.published_posts().filter(category__slug=category_slug)
             page = self.paginate_queryset(posts)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
@@ -182,30 +244,77 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
         return Response({'error': 'Category parameter required'}, status=status.HTTP_400_BAD_REQUEST)
     
+    def ranked_querysets(self, window):
+        # The precomputed ranking (refresh_trending), and the unranked posts
+        # by lifetime views to fill up the rest, e.g. before the first refresh
+        published = self.as_rows(self.published_posts())
+        return (
+            published.filter(rankings__window=window).order_by('-rankings__score'),
+            published.exclude(rankings__window=window).order_by('-views'),
+        )
+    
+    def ranked_posts(self, window, limit):
+        ranked, fallback = self.ranked_querysets(window)
+        posts = list(ranked[:limit])
+        if len(posts) < limit:
+            posts += fallback[:limit - len(posts)]
+        return posts
+    
     @action(detail=False, methods=['get'])
+    @cache_response(*RANKING_SCOPES)
     def popular(self, request):
-        popular_posts = self.queryset.order_by('-views')[:5]
+        popular_posts = self.ranked_posts(POPULAR_WINDOW, 5)
         serializer = self.get_serializer(popular_posts, many=True)
         return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    @cache_response(*RANKING_SCOPES)
+    def trending(self, request):
+        window = request.query_params.get('window', DEFAULT_WINDOW)
+        if window not in WINDOWS:
+            return Response(
+                {'error': f"window must be one of: {', '.join(WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = self.get_serializer(self.ranked_posts(window, 10), many=True)
+        return Response(serializer.data)
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.annotate(
         post_count=Count('posts', filter=Q(posts__published=True))
-    )
+    ).order_by('name')
     serializer_class = CategorySerializer
+    pagination_class = PageSizePagination
     lookup_field = 'slug'
+    
+    @cache_response(*CATEGORY_SCOPES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cache_response(*CATEGORY_SCOPES)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.filter(approved=True)
+class CommentViewSet(FastListViewMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.filter(approved=True).select_related('user')
     serializer_class = CommentSerializer
     permission_classes = [AllowAny]
     http_method_names = ['get', 'post']
+    pagination_class = PostPagination
+    
+    def get_throttles(self):
+        # Anonymous comments are limited per IP before anything is written
+        if self.action == 'create':
+            return [AnonCommentThrottle()]
+        return super().get_throttles()
     
     def get_queryset(self):
         queryset = super().get_queryset()
         post_slug = self.request.query_params.get('post')
         if post_slug:
             queryset = queryset.filter(post__slug=post_slug)
+        if self.request.method == 'GET':
+            queryset = self.sparse_queryset(queryset)
         return queryset
     
     def perform_create(self, serializer):
@@ -227,6 +336,61 @@ class CommentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+class HomeView(APIView):
+    """
+    Everything the homepage shows, in one request: featured, popular and the
+    latest published posts, and the first page of categories. Posts refer to
+    their author and category by id; each is serialized once, under
+    ``included``. ``latest`` has no count (``next`` is page 2 of
+    /api/posts/), which saves the COUNT query.
+    """
+    permission_classes = [AllowAny]
+    FEATURED_SIZE = 5
+    POPULAR_SIZE = 5
+
+    @cache_response(*RANKING_SCOPES)
+    def get(self, request):
+        posts = PostViewSet(request=request, action='list', args=(), kwargs={}, format_kwarg=None)
+        published = posts.published_posts()
+        page_size = PageSizePagination().get_page_size(request)
+        latest = list(posts.as_rows(published)[:page_size + 1])
+        sections = {
+            'featured': posts.as_rows(published.filter(featured=True))[:self.FEATURED_SIZE],
+            'popular': posts.ranked_posts(POPULAR_WINDOW, self.POPULAR_SIZE),
+            'latest': latest[:page_size],
+        }
+        authors, categories = {}, {}
+        data = {
+            name: self.normalize(posts.get_list_serializer(items).data, authors, categories)
+            for name, items in sections.items()
+        }
+        next_url = None
+        if len(latest) > page_size:
+            next_url = replace_query_param(request.build_absolute_uri(reverse('post-list')), 'page', 2)
+            if request.query_params.get('page_size'):
+                next_url = replace_query_param(next_url, 'page_size', page_size)
+        data['latest'] = {'next': next_url, 'results': data['latest']}
+
+        category_list = CategorySerializer(
+            CategoryViewSet.queryset.all()[:api_settings.PAGE_SIZE], many=True, context={'request': request}
+        ).data
+        for category in category_list:
+            categories.setdefault(str(category['id']), category)
+        data['categories'] = [category['id'] for category in category_list]
+        data['included'] = {'authors': authors, 'categories': categories}
+        return Response(data)
+
+    @staticmethod
+    def normalize(posts, authors, categories):
+        """Move each post's nested author and category into ``authors`` / ``categories``, keyed by id."""
+        for post in posts:
+            for field, included in (('author', authors), ('category', categories)):
+                nested = post.get(field)
+                if isinstance(nested, dict):
+                    included.setdefault(str(nested['id']), nested)
+                    post[field] = nested['id']
+        return posts
+
 # Add this at the very end of backend/blog/views.py
 
 @api_view(['GET'])
@@ -236,5 +400,27 @@ def health_check(request):
     return Response({
         'status': 'ok', 
         'message': 'DevScribe is alive',
-        'timestamp': str(timezone.now())
-    })
\ No newline at end of file
+        'timestamp': str(timezone.now()),
+        'response_cache': response_cache.stats(),
+    })
+
+@require_GET
+def metrics(request):
+    """Request metrics of this process in the Prometheus text format"""
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    if not token and not settings.DEBUG:
+        raise Http404  # traffic and latency data is only public in development
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    cache_stats = response_cache.stats()
+    body = (
+        request_metrics.registry.render()
+        + request_metrics.render_counter(
+            'devscribe_response_cache_hits_total', 'Response cache hits.', cache_stats['hits'])
+        + request_metrics.render_counter(
+            'devscribe_response_cache_misses_total', 'Response cache misses.', cache_stats['misses'])
+        + request_metrics.render_pool_stats(request_metrics.pool_stats())
+    )
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')